@@ -94,6 +94,7 @@ class CLIEventTestTest(ScriptedLoadableModuleTest):
     self.test_CLIStatusEventOnErrorTestSynchronous()
     self.test_CLIStatusEventOnErrorTestAsynchronous()
     self.test_SubjectHierarchyReference()
+    self.test_CLIBatchRun()
 
   # Testing a the status event on a normal execution
   def test_CLIStatusEventTestSynchronous(self):
@@ -244,3 +245,35 @@ class CLIEventTestTest(ScriptedLoadableModuleTest):
     # After pending events are processed, the output volume must be in the same subject hierarchy folder
     slicer.app.processEvents()
     self.assertEqual(shNode.GetItemParent(shNode.GetItemByDataNode(outputVolume)), shNode.GetItemParent(shNode.GetItemByDataNode(inputVolume)))
+
+  def test_CLIBatchRun(self):
+    self.delayDisplay('Testing running a CLI on a batch of numpy arrays')
+    import numpy as np
+    inputArrays = [np.random.randint(0, 200, size=(5, 6, 7)).astype(np.int16) for i in range(3)]
+    parametersList = [{'InputVolume': inputArray, 'ThresholdValue': 100, 'ThresholdType': 'Above'}
+                      for inputArray in inputArrays]
+    numberOfVolumeNodes = slicer.mrmlScene.GetNumberOfNodesByClass('vtkMRMLScalarVolumeNode')
+    logic = slicer.modules.thresholdscalarvolume.logic()
+    logic.SetDeleteTemporaryFiles(0)
+    logic.SetAllowInMemoryTransfer(0)
+    outputArrays = [results['OutputVolume'] for results in slicer.cli.runBatch(slicer.modules.thresholdscalarvolume, parametersList)]
+    self.assertEqual(len(outputArrays), len(inputArrays))
+    for inputArray, outputArray in zip(inputArrays, outputArrays):
+      np.testing.assert_array_equal(outputArray, np.where(inputArray > 100, 0, inputArray))
+    # temporary volume nodes are removed and logic settings are restored after the batch is completed
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodesByClass('vtkMRMLScalarVolumeNode'), numberOfVolumeNodes)
+    self.assertEqual(logic.GetDeleteTemporaryFiles(), 0)
+    self.assertEqual(logic.GetAllowInMemoryTransfer(), 0)
+    logic.SetDeleteTemporaryFiles(1)
+    logic.SetAllowInMemoryTransfer(1)
+
+    # settings are restored when the batch is stopped early
+    for results in slicer.cli.runBatch(slicer.modules.thresholdscalarvolume, parametersList, delete_temporary_files=False):
+      self.assertEqual(logic.GetDeleteTemporaryFiles(), 0)
+      break
+    self.assertEqual(logic.GetDeleteTemporaryFiles(), 1)
+
+    # failure to create the parameter node is reported
+    with self.assertRaises(RuntimeError):
+      next(slicer.cli.runBatch(None, parametersList))
+    self.delayDisplay('Test passed')
@@ -5,7 +5,7 @@ import os
 import unittest
 import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
-from DICOMLib import DICOMUtils
+from DICOMLib import DICOMUtils, DICOMLoadableCache
 
 #
 # DICOMReaders
@@ -58,6 +58,8 @@ class DICOMReadersTest(ScriptedLoadableModuleTest):
     self.test_AlternateReaders()
     self.setUp()
     self.test_MissingSlices()
+    self.setUp()
+    self.test_ConcurrentExamination()
 
   def test_AlternateReaders(self):
     """ Test the DICOM loading of sample testing data
@@ -292,3 +294,55 @@ reloadScriptedModule('DICOMReaders'); import DICOMReaders; tester = DICOMReaders
     mainWindow.moduleSelector().selectModule('DICOMReaders')
 
     return testPass
+
+  def test_ConcurrentExamination(self):
+    """ Test that examination with plugins running in worker threads
+    results in the same loadables as examination with a single worker
+    """
+    self.delayDisplay("Starting the DICOM concurrent examination test")
+
+    import SampleData
+    dicomFilesDirectory = SampleData.downloadFromURL(
+      fileNames='deidentifiedMRHead-dcm-one-series.zip',
+      uris='http://slicer.kitware.com/midas3/download?items=294857')[0]
+    seriesUID = "1.3.6.1.4.1.5962.99.1.3814087073.479799962.1489872804257.270.0"
+
+    originalDatabaseDirectory = DICOMUtils.openTemporaryDatabase('tempDICOMDatabase')
+    settings = qt.QSettings()
+    originalNumberOfWorkers = settings.value('DICOM/numberOfExaminationWorkers')
+    try:
+      indexer = ctk.ctkDICOMIndexer()
+      indexer.addDirectory(slicer.dicomDatabase, dicomFilesDirectory, None)
+      indexer.waitForImportFinished()
+
+      detailsPopup = slicer.modules.DICOMWidget.detailsPopup
+      fileLists = detailsPopup.getFileListsForRole(seriesUID, 'Series')
+
+      def examine(numberOfWorkers):
+        settings.setValue('DICOM/numberOfExaminationWorkers', numberOfWorkers)
+        # make sure that plugins examine the files instead of returning cached loadables
+        detailsPopup.pluginInstances.clear()
+        persistentCache = DICOMLoadableCache.instance()
+        if persistentCache:
+          persistentCache.clear()
+        loadablesByPlugin, loadEnabled = detailsPopup.getLoadablesFromFileLists(fileLists)
+        self.assertTrue(loadEnabled)
+        loadablesByPluginName = {}
+        for plugin, loadables in loadablesByPlugin.items():
+          loadablesByPluginName[plugin.loadType] = sorted(
+            [(loadable.name, list(loadable.files), loadable.selected, loadable.confidence, loadable.warning)
+             for loadable in loadables])
+        return loadablesByPluginName
+
+      serialLoadables = examine(1)
+      concurrentLoadables = examine(4)
+      self.assertTrue(len(serialLoadables) > 0)
+      self.assertEqual(serialLoadables, concurrentLoadables)
+    finally:
+      if originalNumberOfWorkers is None:
+        settings.remove('DICOM/numberOfExaminationWorkers')
+      else:
+        settings.setValue('DICOM/numberOfExaminationWorkers', originalNumberOfWorkers)
+      DICOMUtils.closeTemporaryDatabase(originalDatabaseDirectory)
+
+    self.delayDisplay('test_ConcurrentExamination passed!')
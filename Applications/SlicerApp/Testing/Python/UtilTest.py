@@ -80,8 +80,10 @@ class UtilTestTest(ScriptedLoadableModuleTest):
     self.test_findChild()
     self.test_arrayFromVolume()
     self.test_updateVolumeFromArray()
+    self.test_arrayFromVolumeSamples()
     self.test_updateTableFromArray()
     self.test_arrayFromModelPoints()
+    self.test_updateModelFromArrays()
     self.test_array()
 
   def test_setSliceViewerLayers(self):
@@ -240,8 +242,72 @@ class UtilTestTest(ScriptedLoadableModuleTest):
     voxelValueVtk = volumeNode.GetImageData().GetScalarComponentAsDouble(voxelPos[0], voxelPos[1], voxelPos[2], 0)
     self.assertEqual(voxelValueVtk, voxelValueNumpy)
 
+    self.delayDisplay('Test update allocating new voxel buffer')
+    narray = slicer.util.arrayFromVolume(volumeNode)
+    slicer.util.updateVolumeFromArray(volumeNode, f * 3)
+    voxelValueVtk = volumeNode.GetImageData().GetScalarComponentAsDouble(voxelPos[0], voxelPos[1], voxelPos[2], 0)
+    self.assertEqual(voxelValueVtk, voxelValueNumpy * 3)
+    # previously retrieved array still contains the old voxel values
+    self.assertEqual(narray[voxelPos[2], voxelPos[1], voxelPos[0]], voxelValueNumpy)
+
+    self.delayDisplay('Test update reusing voxel buffer')
+    scalars = volumeNode.GetImageData().GetPointData().GetScalars()
+    slicer.util.updateVolumeFromArray(volumeNode, f * 2, reuseBuffer=True)
+    self.assertEqual(volumeNode.GetImageData().GetPointData().GetScalars(), scalars)
+    voxelValueVtk = volumeNode.GetImageData().GetScalarComponentAsDouble(voxelPos[0], voxelPos[1], voxelPos[2], 0)
+    self.assertEqual(voxelValueVtk, voxelValueNumpy * 2)
+
+    self.delayDisplay('Test sub-extent update')
+    slicer.util.updateVolumeFromArray(volumeNode, np.zeros((2, 3, 4)), ijkOrigin=(10, 11, 3))
+    voxelValueVtk = volumeNode.GetImageData().GetScalarComponentAsDouble(voxelPos[0], voxelPos[1], voxelPos[2], 0)
+    self.assertEqual(voxelValueVtk, 0)
+    self.assertEqual(volumeNode.GetImageData().GetDimensions(), (15, 20, 30))
+    with self.assertRaises(ValueError):
+      slicer.util.updateVolumeFromArray(volumeNode, np.zeros((2, 3, 4)), ijkOrigin=(14, 11, 3))
+
+    self.delayDisplay('Test tensor volume update')
+    tensorVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLDiffusionTensorVolumeNode')
+    tensors = np.random.rand(3, 4, 5, 3, 3)
+    slicer.util.updateVolumeFromArray(tensorVolumeNode, tensors)
+    np.testing.assert_array_equal(slicer.util.arrayFromVolume(tensorVolumeNode), tensors)
+
     self.delayDisplay('Testing slicer.util.test_updateVolumeFromArray passed')
 
+  def test_arrayFromVolumeSamples(self):
+    # Test if sampling voxels at RAS positions works
+
+    self.delayDisplay('Download sample data')
+    import SampleData
+    volumeNode = SampleData.downloadSample("MRHead")
+
+    import numpy as np
+
+    self.delayDisplay('Test sampling at voxel centers')
+    voxelPositions = np.array([[120,135,89], [0,0,0], [10,200,50]])
+    ijkToRAS = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRAS)
+    rasPositions = [ijkToRAS.MultiplyPoint(list(voxelPos)+[1])[:3] for voxelPos in voxelPositions]
+    voxelValuesVtk = [volumeNode.GetImageData().GetScalarComponentAsDouble(i, j, k, 0) for i, j, k in voxelPositions]
+    nearestValues = slicer.util.arrayFromVolumeSamples(volumeNode, rasPositions)
+    np.testing.assert_array_equal(nearestValues, voxelValuesVtk)
+    linearValues = slicer.util.arrayFromVolumeSamples(volumeNode, rasPositions, interpolation='linear')
+    np.testing.assert_allclose(linearValues, voxelValuesVtk)
+
+    self.delayDisplay('Test sampling outside of the volume')
+    outsideValues = slicer.util.arrayFromVolumeSamples(volumeNode, [[1e4, 1e4, 1e4]], outsideValue=-1)
+    self.assertEqual(outsideValues[0], -1)
+
+    self.delayDisplay('Test sampling transformed volume')
+    transformNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLinearTransformNode')
+    transformMatrix = vtk.vtkMatrix4x4()
+    transformMatrix.SetElement(0, 3, 20.0)
+    transformNode.SetMatrixTransformToParent(transformMatrix)
+    volumeNode.SetAndObserveTransformNodeID(transformNode.GetID())
+    shiftedPositions = np.array(rasPositions) + [20.0, 0.0, 0.0]
+    np.testing.assert_array_equal(slicer.util.arrayFromVolumeSamples(volumeNode, shiftedPositions), voxelValuesVtk)
+
+    self.delayDisplay('Testing slicer.util.test_arrayFromVolumeSamples passed')
+
   def test_updateTableFromArray(self):
     # Test if updating table values from a numpy array works
     import numpy as np
@@ -286,6 +352,54 @@ class UtilTestTest(ScriptedLoadableModuleTest):
 
     self.delayDisplay('Testing slicer.util.test_arrayFromModelPoints passed')
 
+  def test_updateModelFromArrays(self):
+    # Test if setting model points and cells from numpy arrays and retrieving them works
+    import numpy as np
+
+    self.delayDisplay('Create a tetrahedron model')
+    points = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 10]], dtype=float)
+    triangles = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]])
+    modelNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLModelNode')
+    slicer.util.updateModelFromArrays(modelNode, points, polys=triangles)
+    modelNode.CreateDefaultDisplayNodes()
+    self.assertEqual(modelNode.GetPolyData().GetNumberOfPoints(), 4)
+    self.assertEqual(modelNode.GetPolyData().GetNumberOfPolys(), 4)
+
+    self.delayDisplay('Test cell array access')
+    polys = slicer.util.arrayFromModelPolys(modelNode)
+    np.testing.assert_array_equal(polys.reshape(-1, 4)[:, 1:], triangles)
+    connectivity, offsets = slicer.util.connectivityAndOffsetsFromCellArray(polys)
+    np.testing.assert_array_equal(connectivity, triangles.ravel())
+    np.testing.assert_array_equal(offsets, [0, 3, 6, 9, 12])
+
+    self.delayDisplay('Test cells of different sizes')
+    slicer.util.updateModelFromArrays(modelNode, points, lines=([0, 1, 2, 3, 0], [0, 2, 5]))
+    self.assertEqual(modelNode.GetPolyData().GetNumberOfPolys(), 0)
+    self.assertEqual(modelNode.GetPolyData().GetNumberOfLines(), 2)
+    np.testing.assert_array_equal(slicer.util.arrayFromModelLines(modelNode), [2, 0, 1, 3, 2, 3, 0])
+
+    # many cells of mixed sizes, in cell array format
+    randomState = np.random.RandomState(0)
+    cellSizes = randomState.randint(1, 6, 100)
+    cellPointIndices = [randomState.randint(0, 4, cellSize) for cellSize in cellSizes]
+    cellArray = np.concatenate([np.concatenate([[len(pointIndices)], pointIndices]) for pointIndices in cellPointIndices])
+    connectivity, offsets = slicer.util.connectivityAndOffsetsFromCellArray(cellArray)
+    np.testing.assert_array_equal(np.diff(offsets), cellSizes)
+    np.testing.assert_array_equal(connectivity, np.concatenate(cellPointIndices))
+    slicer.util.updateModelFromArrays(modelNode, points, lines=cellArray)
+    self.assertEqual(modelNode.GetPolyData().GetNumberOfLines(), 100)
+    np.testing.assert_array_equal(slicer.util.arrayFromModelLines(modelNode), cellArray)
+
+    self.delayDisplay('Test normals access')
+    self.assertIsNone(slicer.util.arrayFromModelNormals(modelNode))
+    sphere = vtk.vtkSphereSource()
+    sphere.Update()
+    modelNode.SetAndObservePolyData(sphere.GetOutput())
+    normals = slicer.util.arrayFromModelNormals(modelNode)
+    self.assertEqual(normals.shape, (modelNode.GetPolyData().GetNumberOfPoints(), 3))
+
+    self.delayDisplay('Testing slicer.util.test_updateModelFromArrays passed')
+
   def test_array(self):
     # Test if convenience function of getting numpy array from various nodes works
 
@@ -6,37 +6,89 @@ import warnings
 
 __sitk__MRMLIDImageIO_Registered__ = False
 
-def PushVolumeToSlicer(sitkimage, targetNode=None, name=None, className='vtkMRMLScalarVolumeNode'):
+def PushVolumeToSlicer(sitkimage, targetNode=None, name=None, className='vtkMRMLScalarVolumeNode', useArrayBridge=False):
     """ Given a SimpleITK image, push it back to slicer for viewing
 
     :param targetNode: Target node that will store the image. If None then a new node will be created.
     :param className: if a new target node is created then this parameter determines node class. For label volumes, set it to vtkMRMLLabelMapVolumeNode.
     :param name: if a new target node is created then this parameter will be used as basis of node name.
       If an existing node is specified as targetNode then this value will not be used.
+    :param useArrayBridge: if True then voxels are copied directly from the SimpleITK image buffer
+      into the volume's image data (reusing the existing buffer if size and type match)
+      instead of writing the image through the MRMLIDImageIO file IO layer.
     """
 
-    EnsureRegistration()
-
     # Create new node if needed
     if not targetNode:
         targetNode = slicer.mrmlScene.AddNewNodeByClass(className, slicer.mrmlScene.GetUniqueNameByString(name))
         targetNode.CreateDefaultDisplayNodes()
 
+    if useArrayBridge:
+        _PushVolumeToSlicerUsingArray(sitkimage, targetNode)
+        return targetNode
+
+    EnsureRegistration()
     myNodeFullITKAddress = GetSlicerITKReadWriteAddress(targetNode)
     sitk.WriteImage(sitkimage, myNodeFullITKAddress)
 
     return targetNode
 
 
-def PullVolumeFromSlicer(nodeObjectOrName):
+def PullVolumeFromSlicer(nodeObjectOrName, useArrayBridge=False):
     """ Given a slicer MRML image node or name, return the SimpleITK
         image object.
+
+    :param useArrayBridge: if True then the SimpleITK image is created by a single copy
+      of the volume's voxel array instead of reading the image through the MRMLIDImageIO file IO layer.
     """
+    if useArrayBridge:
+        volumeNode = nodeObjectOrName if isinstance(nodeObjectOrName, slicer.vtkMRMLNode) else slicer.util.getNode(nodeObjectOrName)
+        return _PullVolumeFromSlicerUsingArray(volumeNode)
+
     EnsureRegistration()
     myNodeFullITKAddress = GetSlicerITKReadWriteAddress(nodeObjectOrName)
     sitkimage = sitk.ReadImage(myNodeFullITKAddress)
     return sitkimage
 
+def _PullVolumeFromSlicerUsingArray(volumeNode):
+    """ Create SimpleITK image from the voxel array of a volume node.
+        Geometry is converted from Slicer's RAS to ITK's LPS coordinate system.
+    """
+    narray = slicer.util.arrayFromVolume(volumeNode)
+    isVector = narray.ndim == 4
+    sitkimage = sitk.GetImageFromArray(narray, isVector=isVector)
+
+    ijkToRASDirections = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASDirectionMatrix(ijkToRASDirections)
+    rasToLPS = (-1.0, -1.0, 1.0)
+    direction = [rasToLPS[row] * ijkToRASDirections.GetElement(row, column) for row in range(3) for column in range(3)]
+    origin = [rasToLPS[axis] * volumeNode.GetOrigin()[axis] for axis in range(3)]
+    sitkimage.SetOrigin(origin)
+    sitkimage.SetSpacing(volumeNode.GetSpacing())
+    sitkimage.SetDirection(direction)
+    return sitkimage
+
+def _PushVolumeToSlicerUsingArray(sitkimage, targetNode):
+    """ Set voxels and geometry of a volume node from a SimpleITK image.
+        Voxels are read through a view of the SimpleITK image buffer, therefore they are copied only once.
+        If size, number of components, and scalar type match then the existing voxel buffer of the volume is reused.
+    """
+    narray = sitk.GetArrayViewFromImage(sitkimage)
+
+    ijkToRASDirections = vtk.vtkMatrix4x4()
+    direction = sitkimage.GetDirection()
+    lpsToRAS = (-1.0, -1.0, 1.0)
+    for row in range(3):
+        for column in range(3):
+            ijkToRASDirections.SetElement(row, column, lpsToRAS[row] * direction[row * 3 + column])
+    origin = sitkimage.GetOrigin()
+    wasModifying = targetNode.StartModify()
+    targetNode.SetIJKToRASDirectionMatrix(ijkToRASDirections)
+    targetNode.SetOrigin([lpsToRAS[axis] * origin[axis] for axis in range(3)])
+    targetNode.SetSpacing(sitkimage.GetSpacing())
+    slicer.util.updateVolumeFromArray(targetNode, narray, reuseBuffer=True)
+    targetNode.EndModify(wasModifying)
+
 def GetSlicerITKReadWriteAddress(nodeObjectOrName):
     """ This function will return the ITK FileIO formatted text address
             so that the image can be read directly from the MRML scene
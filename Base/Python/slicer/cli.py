@@ -17,9 +17,9 @@ def createNode(cliModule, parameters = None):
 def setNodeParameters(node, parameters):
   """Sets parameters for a vtkMRMLCommandLineModuleNode given a dictionary
   of (parameterName, parameterValue) pairs
-  For vectors: provide a list, tuple or comma-separated string
+  For vectors: provide a list, tuple, 1D numpy array or comma-separated string
   For enumerations, provide the single enumeration value
-  For files and directories, provide a string
+  For files and directories, provide a string or a path object (such as pathlib.Path)
   For images, geometry, points and regions, provide a vtkMRMLNode
   """
   import slicer
@@ -28,6 +28,9 @@ def setNodeParameters(node, parameters):
   if not parameters:
     return None
   for key, value in parameters.items():
+    if hasattr(value, 'item') and getattr(value, 'shape', None) == ():
+      # numpy scalar
+      value = value.item()
     if isinstance(value, str):
       node.SetParameterAsString(key, value)
     elif isinstance(value, bool):
@@ -38,14 +41,25 @@ def setNodeParameters(node, parameters):
       node.SetParameterAsDouble(key, value)
     elif isinstance(value, slicer.vtkMRMLNode):
       node.SetParameterAsNode(key, value)
-    elif isinstance(value, list) or isinstance(value, tuple):
-      commaSeparatedString = str(value)
-      commaSeparatedString = commaSeparatedString[1:len(commaSeparatedString)-1]
+    elif isinstance(value, list) or isinstance(value, tuple) or (hasattr(value, 'tolist') and getattr(value, 'ndim', None) == 1):
+      commaSeparatedString = ",".join([str(item) for item in list(value)])
       node.SetParameterAsString(key, commaSeparatedString)
-    #TODO: file support
+    elif hasattr(value, '__fspath__'):
+      node.SetParameterAsString(key, value.__fspath__())
     else:
       print("parameter ", key, " has unsupported type ", value.__class__.__name__)
 
+def getParameterDescriptions(node):
+  """Return a dictionary that maps parameter names of a vtkMRMLCommandLineModuleNode to
+  (tag, type, channel) tuples, for example ``('image', 'scalar', 'input')``.
+  """
+  descriptions = {}
+  for group in range(node.GetNumberOfParameterGroups()):
+    for param in range(node.GetNumberOfParametersInGroup(group)):
+      descriptions[node.GetParameterName(group, param)] = (
+        node.GetParameterTag(group, param), node.GetParameterType(group, param), node.GetParameterChannel(group, param))
+  return descriptions
+
 def runSync(module, node=None, parameters=None, delete_temporary_files=True, update_display=True):
   """Run a CLI synchronously, optionally given a node with optional parameters,
   returning the node (or the new one if created)
@@ -89,5 +103,91 @@ def run(module, node = None, parameters = None, wait_for_completion = False, del
   #widget.apply()
   return node
 
+def runBatch(module, parametersList, node=None, referenceVolumeNode=None, delete_temporary_files=True, update_display=False):
+  """Runs a CLI synchronously for each parameter dictionary of ``parametersList``,
+  reusing a single parameter node. This is a generator, which yields a dictionary of
+  output parameter values after each execution, so that results can be processed
+  while the following executions are not started yet.
+  node: existing parameter node (None by default)
+  referenceVolumeNode: volume that defines the geometry (origin, spacing, axis directions)
+    of images that are specified as numpy arrays (None by default)
+  delete_temporary_files: remove temp files created during execution (True by default)
+  update_display: show output nodes after completion (False by default)
+
+  Image parameters can be specified as numpy arrays. Arrays are copied into volume nodes that
+  are created at the first execution and reused in all following executions, therefore
+  for shared library CLIs, images are transferred to the CLI in memory.
+  Output image parameters that are not specified are written into similar reusable volume nodes.
+  Output images are returned as numpy arrays (copies), other output parameters as strings.
+  Raises RuntimeError if the parameter node cannot be created or an execution completes with errors.
+  Temporary file deletion and in-memory transfer settings of the module logic are restored
+  when the batch is completed.
+
+  Example:
+
+      for results in slicer.cli.runBatch(slicer.modules.thresholdscalarvolume,
+          [{'InputVolume': volumeArray, 'ThresholdValue': threshold, 'ThresholdType': 'Below'}
+           for volumeArray in timepointArrays], referenceVolumeNode=referenceNode):
+        thresholdedArrays.append(results['OutputVolume'])
+
+  """
+  import slicer, slicer.util
+  if node is None:
+    node = createNode(module)
+    if not node:
+      raise RuntimeError("Failed to create parameter node for CLI module %s" % (module.name if module else module))
+  logic = module.logic()
+  originalDeleteTemporaryFiles = logic.GetDeleteTemporaryFiles()
+  originalAllowInMemoryTransfer = logic.GetAllowInMemoryTransfer()
+
+  descriptions = getParameterDescriptions(node)
+  volumeNodes = {}
+
+  def _getVolumeNode(name):
+    if name not in volumeNodes:
+      tag, type, channel = descriptions[name]
+      className = 'vtkMRMLLabelMapVolumeNode' if type == 'label' else 'vtkMRMLScalarVolumeNode'
+      volumeNode = slicer.mrmlScene.AddNewNodeByClass(className, slicer.mrmlScene.GetUniqueNameByString(name))
+      volumeNode.SetHideFromEditors(True)
+      volumeNodes[name] = volumeNode
+    return volumeNodes[name]
+
+  try:
+    logic.SetDeleteTemporaryFiles(1 if delete_temporary_files else 0)
+    logic.SetAllowInMemoryTransfer(1)
+    for parameters in parametersList:
+      nodeParameters = {}
+      for key, value in parameters.items():
+        if hasattr(value, 'ndim') and value.ndim >= 3 and descriptions.get(key, ('',))[0] == 'image':
+          volumeNode = _getVolumeNode(key)
+          if referenceVolumeNode:
+            volumeNode.CopyOrientation(referenceVolumeNode)
+          slicer.util.updateVolumeFromArray(volumeNode, value, reuseBuffer=True)
+          value = volumeNode
+        nodeParameters[key] = value
+      for name, (tag, type, channel) in descriptions.items():
+        if tag == 'image' and channel == 'output' and name not in parameters and not node.GetParameterAsString(name):
+          nodeParameters[name] = _getVolumeNode(name)
+      setNodeParameters(node, nodeParameters)
+
+      logic.ApplyAndWait(node, update_display)
+      if node.GetStatus() & node.ErrorsMask:
+        raise RuntimeError("CLI execution failed for %s: %s" % (module.name, node.GetErrorText()))
+
+      results = {}
+      for name, (tag, type, channel) in descriptions.items():
+        if channel != 'output':
+          continue
+        if tag == 'image' and name in volumeNodes:
+          results[name] = slicer.util.arrayFromVolume(volumeNodes[name]).copy()
+        else:
+          results[name] = node.GetParameterAsString(name)
+      yield results
+  finally:
+    logic.SetDeleteTemporaryFiles(originalDeleteTemporaryFiles)
+    logic.SetAllowInMemoryTransfer(originalAllowInMemoryTransfer)
+    for volumeNode in volumeNodes.values():
+      slicer.mrmlScene.RemoveNode(volumeNode)
+
 def cancel(node):
   print("Not yet implemented")
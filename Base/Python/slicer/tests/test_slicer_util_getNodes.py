@@ -61,3 +61,36 @@ class SlicerUtilTest(unittest.TestCase):
         self.assertIsInstance(slicer.util.getNodes("Volume")["Volume"], vtk.vtkObject)
         self.assertEqual(list(slicer.util.getNodes("Volume",useLists=True).keys()), ["Volume"])
         self.assertIsInstance(slicer.util.getNodes("Volume",useLists=True)["Volume"], list)
+
+    def test_getNodeIndexUpdate(self):
+        # Lookup of nodes in the main scene uses an index, check that it follows scene changes
+        self.assertEqual(slicer.util.getNode("Volume2"), self.nodes[1])
+        self.assertEqual(slicer.util.getNode(self.nodes[1].GetID()), self.nodes[1])
+
+        self.nodes[1].SetName("RenamedVolume")
+        self.assertEqual(slicer.util.getNodes("Volume2"), {})
+        self.assertEqual(slicer.util.getNode("RenamedVolume"), self.nodes[1])
+        self.assertEqual(list(slicer.util.getNodes("Renamed*").keys()), ["RenamedVolume"])
+
+        newNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", "Volume2")
+        self.assertEqual(slicer.util.getNode("Volume2"), newNode)
+
+        slicer.mrmlScene.RemoveNode(newNode)
+        with self.assertRaises(slicer.util.MRMLNodeNotFoundException):
+          slicer.util.getNode("Volume2")
+
+        # Renaming to the name of other nodes
+        self.nodes[0].SetName("Volume")
+        self.assertEqual(slicer.util.getNodes("Volume", useLists=True)["Volume"], [self.nodes[0], self.nodes[2], self.nodes[3]])
+        self.assertEqual(slicer.util.getNodes("Volume1"), {})
+
+        # Nodes removed during batch processing
+        slicer.mrmlScene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+        slicer.mrmlScene.RemoveNode(self.nodes[2])
+        slicer.mrmlScene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+        slicer.mrmlScene.RemoveNode(self.nodes[3])
+        self.assertEqual(slicer.util.getNodes("Volume", useLists=True)["Volume"], [self.nodes[0]])
+
+        slicer.mrmlScene.Clear(0)
+        with self.assertRaises(slicer.util.MRMLNodeNotFoundException):
+          slicer.util.getNode("RenamedVolume")
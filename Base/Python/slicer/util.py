@@ -674,6 +674,125 @@ class MRMLNodeNotFoundException(Exception):
   """
   pass
 
+class _MRMLSceneNodeIndex(object):
+  """Lookup table of the nodes of a scene by ID, in scene order.
+  The table is kept up to date by observing node added/removed events of the scene.
+  It is cleared after batch processing (scene close, import, restore) and rebuilt
+  at the next lookup, or if the number of nodes of the scene does not match the number
+  of indexed nodes. Node names are not indexed, as nodes may be renamed any time
+  without notifying the scene: names are always read from the nodes at lookup time.
+  """
+
+  def __init__(self, scene):
+    import vtk, slicer
+    self.scene = scene
+    self.valid = False
+    self.nodesByID = {}
+    self.nodeSequenceNumbers = {}
+    self.nextSequenceNumber = 0
+
+    @vtk.calldata_type(vtk.VTK_OBJECT)
+    def onNodeAdded(caller, event, node):
+      if self.valid:
+        self.addNode(node)
+
+    @vtk.calldata_type(vtk.VTK_OBJECT)
+    def onNodeRemoved(caller, event, node):
+      self.removeNode(node)
+
+    def onEndBatchProcess(caller, event):
+      self.invalidate()
+
+    self.sceneObserverTags = [
+      scene.AddObserver(slicer.vtkMRMLScene.NodeAddedEvent, onNodeAdded),
+      scene.AddObserver(slicer.vtkMRMLScene.NodeRemovedEvent, onNodeRemoved),
+      scene.AddObserver(slicer.vtkMRMLScene.EndBatchProcessEvent, onEndBatchProcess)]
+
+  def addNode(self, node):
+    nodeID = node.GetID()
+    if nodeID is None or nodeID in self.nodesByID:
+      return
+    self.nodesByID[nodeID] = node
+    self.nodeSequenceNumbers[nodeID] = self.nextSequenceNumber
+    self.nextSequenceNumber += 1
+
+  def removeNode(self, node):
+    nodeID = node.GetID()
+    if self.nodesByID.get(nodeID) is not node:
+      if self.valid:
+        # node ID has been changed without notification
+        self.invalidate()
+      return
+    del self.nodesByID[nodeID]
+    del self.nodeSequenceNumbers[nodeID]
+
+  def invalidate(self):
+    self.valid = False
+    self.nodesByID = {}
+    self.nodeSequenceNumbers = {}
+    self.nextSequenceNumber = 0
+
+  def rebuild(self):
+    self.invalidate()
+    for index in range(self.scene.GetNumberOfNodes()):
+      self.addNode(self.scene.GetNthNode(index))
+    self.valid = True
+
+  def findNodes(self, pattern):
+    """Return list of nodes where the name or id matches ``pattern``, in scene order.
+    Glob matching is only performed if the pattern contains wildcard characters.
+    """
+    import fnmatch
+    rebuilt = False
+    if not self.valid or len(self.nodesByID) != self.scene.GetNumberOfNodes():
+      self.rebuild()
+      rebuilt = True
+    if pattern == "*":
+      nodeIDs = list(self.nodesByID.keys())
+    elif any(character in pattern for character in "*?["):
+      nodeIDs = [nodeID for nodeID, node in self.nodesByID.items()
+        if (node.GetName() is not None and fnmatch.fnmatchcase(node.GetName(), pattern))
+          or fnmatch.fnmatchcase(nodeID, pattern)]
+    else:
+      # Exact name match is performed by the scene, without iterating through the nodes in Python
+      nodes = self.scene.GetNodesByName(pattern)
+      nodes.UnRegister(self.scene)
+      nodeIDs = [nodes.GetItemAsObject(index).GetID() for index in range(nodes.GetNumberOfItems())]
+      # Exact ID match is performed by the scene, too
+      if self.scene.GetNodeByID(pattern) and pattern not in nodeIDs:
+        nodeIDs.append(pattern)
+    if not rebuilt and any(nodeID not in self.nodesByID or self.nodesByID[nodeID].GetID() != nodeID for nodeID in nodeIDs):
+      # node ID has been changed without notification, find nodes in the rebuilt index
+      self.valid = False
+      return self.findNodes(pattern)
+    nodeIDs = [nodeID for nodeID in nodeIDs if nodeID in self.nodesByID]
+    nodeIDs.sort(key=self.nodeSequenceNumbers.get)
+    return [self.nodesByID[nodeID] for nodeID in nodeIDs]
+
+_mrmlSceneNodeIndex = None
+
+def _findNodes(pattern, scene):
+  """Return list of nodes of the scene where the name or id matches ``pattern``.
+  Nodes of the main application scene are looked up using a persistent index,
+  other scenes are searched by iterating through all nodes.
+  """
+  import slicer, fnmatch
+  global _mrmlSceneNodeIndex
+  if isinstance(pattern, str) and scene == slicer.mrmlScene:
+    if _mrmlSceneNodeIndex is None:
+      _mrmlSceneNodeIndex = _MRMLSceneNodeIndex(scene)
+    return _mrmlSceneNodeIndex.findNodes(pattern)
+  nodes = []
+  count = scene.GetNumberOfNodes()
+  for idx in range(count):
+    node = scene.GetNthNode(idx)
+    name = node.GetName()
+    id = node.GetID()
+    if (fnmatch.fnmatchcase(name, pattern) or
+        fnmatch.fnmatchcase(id, pattern)):
+      nodes.append(node)
+  return nodes
+
 def getNodes(pattern="*", scene=None, useLists=False):
   """Return a dictionary of nodes where the name or id matches the ``pattern``.
   By default, ``pattern`` is a wildcard and it returns all nodes associated
@@ -681,22 +800,18 @@ def getNodes(pattern="*", scene=None, useLists=False):
   If multiple node share the same name, using ``useLists=False`` (default behavior)
   returns only the last node with that name. If ``useLists=True``, it returns
   a dictionary of lists of nodes.
+  Nodes of ``slicer.mrmlScene`` are looked up in an index, therefore patterns without
+  wildcard characters (exact name or ID) are found without iterating through the nodes in Python.
   """
-  import slicer, collections, fnmatch
+  import slicer, collections
   nodes = collections.OrderedDict()
   if scene is None:
     scene = slicer.mrmlScene
-  count = scene.GetNumberOfNodes()
-  for idx in range(count):
-    node = scene.GetNthNode(idx)
-    name = node.GetName()
-    id = node.GetID()
-    if (fnmatch.fnmatchcase(name, pattern) or
-        fnmatch.fnmatchcase(id, pattern)):
-      if useLists:
-        nodes.setdefault(node.GetName(), []).append(node)
-      else:
-        nodes[node.GetName()] = node
+  for node in _findNodes(pattern, scene):
+    if useLists:
+      nodes.setdefault(node.GetName(), []).append(node)
+    else:
+      nodes[node.GetName()] = node
   return nodes
 
 def getNode(pattern="*", index=0, scene=None):
@@ -717,8 +832,8 @@ def getNodesByClass(className, scene=None):
   import slicer
   if scene is None:
     scene = slicer.mrmlScene
-  nodes = slicer.mrmlScene.GetNodesByClass(className)
-  nodes.UnRegister(slicer.mrmlScene)
+  nodes = scene.GetNodesByClass(className)
+  nodes.UnRegister(scene)
   nodeList = []
   nodes.InitTraversal()
   node = nodes.GetNextItemAsObject()
@@ -856,6 +971,205 @@ def arrayFromModelPointData(modelNode, arrayName):
   narray = vtk.util.numpy_support.vtk_to_numpy(arrayVtk)
   return narray
 
+def arrayFromModelCellData(modelNode, arrayName):
+  """Return cell data array of a model node as numpy array.
+
+  .. warning:: Important: memory area of the returned array is managed by VTK,
+    therefore values in the array may be changed, but the array must not be reallocated.
+    See :py:meth:`arrayFromVolume` for details.
+  """
+  import vtk.util.numpy_support
+  arrayVtk = modelNode.GetPolyData().GetCellData().GetArray(arrayName)
+  narray = vtk.util.numpy_support.vtk_to_numpy(arrayVtk)
+  return narray
+
+def arrayFromModelNormals(modelNode):
+  """Return point normals of a model node as numpy array.
+  Returns None if the model does not contain point normals (they can be computed
+  using vtkPolyDataNormals filter).
+
+  .. warning:: Important: memory area of the returned array is managed by VTK,
+    therefore values in the array may be changed, but the array must not be reallocated.
+    See :py:meth:`arrayFromVolume` for details.
+  """
+  import vtk.util.numpy_support
+  normals = modelNode.GetPolyData().GetPointData().GetNormals()
+  if not normals:
+    return None
+  narray = vtk.util.numpy_support.vtk_to_numpy(normals)
+  return narray
+
+def _arrayFromCellArray(cellArray):
+  import vtk.util.numpy_support
+  if cellArray.GetNumberOfCells() == 0:
+    import numpy as np
+    return np.zeros(0, dtype=vtk.util.numpy_support.ID_TYPE_CODE)
+  return vtk.util.numpy_support.vtk_to_numpy(cellArray.GetData())
+
+def arrayFromModelPolys(modelNode):
+  """Return polygon cell array of a model node as numpy array.
+  The array contains, for each cell, the number of points followed by the point indices
+  (n0, id0_0, id0_1, ..., n1, id1_0, ...). For triangle meshes, point indices of each triangle
+  can be accessed without copying as ``arrayFromModelPolys(modelNode).reshape(-1, 4)[:, 1:]``.
+  Use :py:meth:`connectivityAndOffsetsFromCellArray` to get point indices of
+  cells of arbitrary size.
+  After all modifications has been completed, call ``modelNode.GetPolyData().Modified()``.
+
+  .. warning:: Important: memory area of the returned array is managed by VTK,
+    therefore values in the array may be changed, but the array must not be reallocated.
+    See :py:meth:`arrayFromVolume` for details.
+  """
+  return _arrayFromCellArray(modelNode.GetPolyData().GetPolys())
+
+def arrayFromModelLines(modelNode):
+  """Return line cell array of a model node as numpy array.
+  See :py:meth:`arrayFromModelPolys` for a description of the array layout.
+
+  .. warning:: Important: memory area of the returned array is managed by VTK,
+    therefore values in the array may be changed, but the array must not be reallocated.
+    See :py:meth:`arrayFromVolume` for details.
+  """
+  return _arrayFromCellArray(modelNode.GetPolyData().GetLines())
+
+def arrayFromModelStrips(modelNode):
+  """Return triangle strip cell array of a model node as numpy array.
+  See :py:meth:`arrayFromModelPolys` for a description of the array layout.
+
+  .. warning:: Important: memory area of the returned array is managed by VTK,
+    therefore values in the array may be changed, but the array must not be reallocated.
+    See :py:meth:`arrayFromVolume` for details.
+  """
+  return _arrayFromCellArray(modelNode.GetPolyData().GetStrips())
+
+def _cellStartsFromCellArray(cellArray):
+  """Return positions of the cell sizes in a cell array in the format returned by
+  :py:meth:`arrayFromModelPolys`.
+  """
+  import numpy as np
+  numberOfValues = len(cellArray)
+  if numberOfValues == 0:
+    return np.zeros(0, dtype=np.int64)
+  # fast path: all cells have the same number of points (e.g., triangle mesh)
+  cellSize = int(cellArray[0])
+  if cellSize >= 0 and numberOfValues % (cellSize + 1) == 0:
+    if np.all(cellArray[::cellSize + 1] == cellSize):
+      return np.arange(0, numberOfValues, cellSize + 1, dtype=np.int64)
+  # Position of the next cell for each position, assuming that a cell starts there
+  # (numberOfValues if it is after the end of the array).
+  positionType = np.int32 if numberOfValues < np.iinfo(np.int32).max else np.int64
+  nextPositions = np.empty(numberOfValues + 1, dtype=positionType)
+  np.minimum(np.arange(1, numberOfValues + 1, dtype=positionType) + np.maximum(cellArray, 0).astype(positionType),
+    numberOfValues, out=nextPositions[:-1])
+  nextPositions[-1] = numberOfValues
+  # Position of the 2^k-th next cell for each position (pointer doubling)
+  numberOfDoublings = 4
+  jumps = [nextPositions]
+  for doubling in range(numberOfDoublings):
+    jumps.append(jumps[-1][jumps[-1]])
+  # Only every 16th cell is visited in Python, the cells between them are found in numpy
+  coarseJump = jumps[-1]
+  coarseCellStarts = []
+  position = 0
+  while position < numberOfValues:
+    coarseCellStarts.append(position)
+    position = coarseJump[position]
+  cellStarts = np.array(coarseCellStarts, dtype=positionType)
+  for jump in reversed(jumps[:-1]):
+    cellStarts = np.stack([cellStarts, jump[cellStarts]], axis=1).ravel()
+  # positions after the end of the array are dropped
+  return cellStarts[cellStarts < numberOfValues].astype(np.int64)
+
+def connectivityAndOffsetsFromCellArray(cellArray):
+  """Split a cell array returned by :py:meth:`arrayFromModelPolys`, :py:meth:`arrayFromModelLines`,
+  or :py:meth:`arrayFromModelStrips` into point indices and cell offsets.
+  Returns a tuple (connectivity, offsets): point indices of the i-th cell are
+  ``connectivity[offsets[i]:offsets[i+1]]``. Values are copied.
+  """
+  import numpy as np
+  cellArray = np.asarray(cellArray)
+  if len(cellArray) == 0:
+    return np.zeros(0, dtype=cellArray.dtype), np.zeros(1, dtype=np.int64)
+  # fast path: all cells have the same number of points (e.g., triangle mesh)
+  cellSize = int(cellArray[0])
+  if cellSize >= 0 and len(cellArray) % (cellSize + 1) == 0:
+    cells = cellArray.reshape(-1, cellSize + 1)
+    if np.all(cells[:, 0] == cellSize):
+      return cells[:, 1:].ravel(), np.arange(cells.shape[0] + 1, dtype=np.int64) * cellSize
+  cellStarts = _cellStartsFromCellArray(cellArray)
+  sizes = cellArray[cellStarts].astype(np.int64)
+  isPointIndex = np.ones(len(cellArray), dtype=bool)
+  isPointIndex[cellStarts] = False
+  offsets = np.zeros(len(cellStarts) + 1, dtype=np.int64)
+  np.cumsum(sizes, out=offsets[1:])
+  return cellArray[isPointIndex], offsets
+
+def _cellArrayFromArray(cells):
+  """Create vtkCellArray from a 2D array of point indices (one row per cell),
+  a (connectivity, offsets) tuple, or a cell array in the format returned by
+  :py:meth:`arrayFromModelPolys`."""
+  import numpy as np
+  import vtk
+  import vtk.util.numpy_support
+  if isinstance(cells, tuple):
+    connectivity, offsets = cells
+    connectivity = np.asarray(connectivity)
+    offsets = np.asarray(offsets)
+    numberOfCells = len(offsets) - 1
+    legacyArray = np.insert(connectivity, offsets[:-1], np.diff(offsets))
+  else:
+    cells = np.asarray(cells)
+    if cells.ndim == 2:
+      numberOfCells = cells.shape[0]
+      legacyArray = np.hstack([np.full((numberOfCells, 1), cells.shape[1], dtype=cells.dtype), cells]).ravel()
+    elif cells.ndim == 1:
+      legacyArray = cells
+      numberOfCells = len(_cellStartsFromCellArray(cells))
+    else:
+      raise ValueError("Unsupported cell array shape: "+str(cells.shape))
+  legacyArray = np.ascontiguousarray(legacyArray, dtype=vtk.util.numpy_support.ID_TYPE_CODE)
+  cellArray = vtk.vtkCellArray()
+  cellArray.SetCells(numberOfCells, vtk.util.numpy_support.numpy_to_vtkIdTypeArray(legacyArray, deep=True))
+  return cellArray
+
+def updateModelFromArrays(modelNode, points, polys=None, lines=None, strips=None):
+  """Sets points and topology of a model node from numpy arrays.
+  points is an array of shape (N, 3). Cells (polys, lines, strips) can be specified as
+  a 2D array of point indices (one row per cell, e.g., shape (M, 3) for triangles),
+  a (connectivity, offsets) tuple as returned by :py:meth:`connectivityAndOffsetsFromCellArray`,
+  or a cell array in the format returned by :py:meth:`arrayFromModelPolys`.
+  Cells that are not specified are removed.
+  Values are deep-copied, therefore if the numpy arrays are modified after calling this method,
+  the model node will not change. All previous point and cell data arrays are removed.
+
+  Example:
+
+      import numpy as np
+      points = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 10]], dtype=float)
+      triangles = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]])
+      modelNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLModelNode')
+      updateModelFromArrays(modelNode, points, polys=triangles)
+      modelNode.CreateDefaultDisplayNodes()
+
+  """
+  import numpy as np
+  import vtk
+  import vtk.util.numpy_support
+  points = np.ascontiguousarray(points)
+  if points.ndim != 2 or points.shape[1] != 3:
+    raise ValueError("Expected points array of shape (N, 3), got %s instead" % str(points.shape))
+  vpoints = vtk.vtkPoints()
+  vpoints.SetData(vtk.util.numpy_support.numpy_to_vtk(points, deep=True))
+
+  polyData = vtk.vtkPolyData()
+  polyData.SetPoints(vpoints)
+  if polys is not None:
+    polyData.SetPolys(_cellArrayFromArray(polys))
+  if lines is not None:
+    polyData.SetLines(_cellArrayFromArray(lines))
+  if strips is not None:
+    polyData.SetStrips(_cellArrayFromArray(strips))
+  modelNode.SetAndObservePolyData(polyData)
+
 def arrayFromGridTransform(gridTransformNode):
   """Return voxel array from transform node as numpy array.
   Vector values are not copied. Values in the transform node can be modified
@@ -898,42 +1212,184 @@ def arrayFromSegment(segmentationNode, segmentId):
   narray = vtk.util.numpy_support.vtk_to_numpy(vimage.GetPointData().GetScalars()).reshape(nshape)
   return narray
 
-def updateVolumeFromArray(volumeNode, narray):
+def arrayFromVolumeSamples(volumeNode, rasPoints, interpolation='nearest', outsideValue=0):
+  """Return voxel values of a volume node sampled at a list of RAS positions as numpy array.
+  rasPoints is an array-like of shape (N, 3) containing world RAS coordinates.
+  If the volume is under a transform then the points are transformed into the volume's
+  coordinate system before sampling, therefore values are the same as the ones displayed
+  in slice views (and Data Probe) at the same positions.
+  interpolation can be 'nearest' (voxel values are returned with the volume's scalar type)
+  or 'linear' (trilinear interpolation, values are returned as float64).
+  Points outside the volume are set to outsideValue.
+  Voxel values are read from the array returned by :py:meth:`arrayFromVolume` without copying the volume.
+
+  Example:
+
+      # sample intensity along a line profile
+      import numpy as np
+      points = np.linspace([-50.0, 0.0, 0.0], [50.0, 0.0, 0.0], 200)
+      profile = arrayFromVolumeSamples(getNode('MRHead'), points, interpolation='linear')
+
+  """
+  import numpy as np
+  import vtk
+  if interpolation not in ('nearest', 'linear'):
+    raise ValueError("Unsupported interpolation: %s (expected 'nearest' or 'linear')" % interpolation)
+  voxels = arrayFromVolume(volumeNode)
+  rasPoints = np.asarray(rasPoints, dtype=np.float64).reshape(-1, 3)
+
+  # World to volume RAS
+  transformNode = volumeNode.GetParentTransformNode()
+  if transformNode:
+    if transformNode.IsTransformToWorldLinear():
+      worldToVolume = vtk.vtkMatrix4x4()
+      transformNode.GetMatrixTransformFromWorld(worldToVolume)
+      worldToVolume = np.array([[worldToVolume.GetElement(row, column) for column in range(4)] for row in range(4)])
+      rasPoints = rasPoints.dot(worldToVolume[:3, :3].T) + worldToVolume[:3, 3]
+    else:
+      worldToVolume = vtk.vtkGeneralTransform()
+      transformNode.GetTransformFromWorld(worldToVolume)
+      rasPoints = np.array([worldToVolume.TransformDoublePoint(point) for point in rasPoints]).reshape(-1, 3)
+
+  # Volume RAS to IJK
+  rasToIJK = vtk.vtkMatrix4x4()
+  volumeNode.GetRASToIJKMatrix(rasToIJK)
+  rasToIJK = np.array([[rasToIJK.GetElement(row, column) for column in range(4)] for row in range(4)])
+  ijkPoints = rasPoints.dot(rasToIJK[:3, :3].T) + rasToIJK[:3, 3]
+
+  # voxel array is indexed as [k, j, i, (components)]
+  dims = np.array(voxels.shape[2::-1])
+  componentShape = voxels.shape[3:]
+  numberOfPoints = ijkPoints.shape[0]
+
+  if interpolation == 'nearest':
+    ijk = np.floor(ijkPoints + 0.5).astype(np.int64)
+    inside = np.all((ijk >= 0) & (ijk < dims), axis=1)
+    samples = np.empty((numberOfPoints,) + componentShape, dtype=voxels.dtype)
+    samples[~inside] = outsideValue
+    ijk = ijk[inside]
+    samples[inside] = voxels[ijk[:, 2], ijk[:, 1], ijk[:, 0]]
+    return samples
+
+  inside = np.all((ijkPoints >= 0) & (ijkPoints <= dims - 1), axis=1)
+  samples = np.empty((numberOfPoints,) + componentShape, dtype=np.float64)
+  samples[~inside] = outsideValue
+  ijkPoints = ijkPoints[inside]
+  ijk0 = np.minimum(np.floor(ijkPoints).astype(np.int64), np.maximum(dims - 2, 0))
+  ijk1 = np.minimum(ijk0 + 1, dims - 1)
+  weight1 = ijkPoints - ijk0
+  weight0 = 1.0 - weight1
+  if componentShape:
+    # broadcast weights over components
+    weight0 = weight0.reshape(weight0.shape + (1,) * len(componentShape))
+    weight1 = weight1.reshape(weight1.shape + (1,) * len(componentShape))
+  values = 0.0
+  for corner in range(8):
+    ci, cj, ck = corner & 1, (corner >> 1) & 1, (corner >> 2) & 1
+    i = ijk1[:, 0] if ci else ijk0[:, 0]
+    j = ijk1[:, 1] if cj else ijk0[:, 1]
+    k = ijk1[:, 2] if ck else ijk0[:, 2]
+    weight = ((weight1 if ci else weight0)[:, 0] * (weight1 if cj else weight0)[:, 1]
+      * (weight1 if ck else weight0)[:, 2])
+    values = values + weight * voxels[k, j, i]
+  samples[inside] = values
+  return samples
+
+def labelNamesFromValues(volumeNode, labelValues):
+  """Return list of label names (from the color node of the volume's display node)
+  corresponding to label values, for example ones returned by :py:meth:`arrayFromVolumeSamples`.
+  Names of values that are not defined in the color node are empty strings.
+  """
+  import numpy as np
+  labelValues = np.asarray(labelValues).astype(np.int64).ravel()
+  displayNode = volumeNode.GetDisplayNode()
+  colorNode = displayNode.GetColorNode() if displayNode else None
+  if not colorNode:
+    return [''] * len(labelValues)
+  # look up each distinct label value only once
+  uniqueValues, inverse = np.unique(labelValues, return_inverse=True)
+  uniqueNames = [colorNode.GetColorName(int(value)) if 0 <= value < colorNode.GetNumberOfColors() else ''
+    for value in uniqueValues]
+  return [uniqueNames[index] for index in inverse]
+
+def updateVolumeFromArray(volumeNode, narray, ijkOrigin=None, reuseBuffer=False):
   """Sets voxels of a volume node from a numpy array.
   Voxels values are deep-copied, therefore if the numpy array
   is modified after calling this method, voxel values in the volume node will not change.
   Dimensions and data size of the source numpy array does not have to match the current
-  content of the volume node.
+  content of the volume node. By default, a new voxel buffer is allocated.
+  If ``reuseBuffer`` is True and dimensions, number of components, and scalar type match,
+  then voxels are copied into the existing voxel buffer and no memory is reallocated.
+  In this case arrays that were previously obtained by :py:meth:`arrayFromVolume`
+  share memory with the volume and therefore see the new voxel values.
+  If ``ijkOrigin`` (i, j, k) is specified then only the sub-extent of the volume starting at
+  ``ijkOrigin`` is overwritten by the array (the volume must already have image data
+  that contains the sub-extent), which allows updating large volumes slab by slab.
+  Tensor volumes are set from arrays of shape (K, J, I, 3, 3).
   """
+  import numpy as np
+  import vtk.util.numpy_support
 
-  vshape = tuple(reversed(narray.shape))
-  if len(vshape) == 3:
-    # Scalar volume
-    vcomponents = 1
-  elif len(vshape) == 4:
-    # Vector volume
-    vcomponents = vshape[0]
-    vshape = vshape[1:4]
+  if volumeNode.IsA('vtkMRMLDiffusionTensorVolumeNode'):
+    if len(narray.shape) != 5 or narray.shape[3:] != (3, 3):
+      raise RuntimeError("Unsupported numpy array shape for tensor volume: "+str(narray.shape))
+    vshape = tuple(reversed(narray.shape[:3]))
+    vcomponents = 9
   else:
-    # TODO: add support for tensor volumes
-    raise RuntimeError("Unsupported numpy array shape: "+str(narray.shape))
+    vshape = tuple(reversed(narray.shape))
+    if len(vshape) == 3:
+      # Scalar volume
+      vcomponents = 1
+    elif len(vshape) == 4:
+      # Vector volume
+      vcomponents = vshape[0]
+      vshape = vshape[1:4]
+    else:
+      raise RuntimeError("Unsupported numpy array shape: "+str(narray.shape))
 
   vimage = volumeNode.GetImageData()
-  if not vimage:
-    import vtk
-    vimage = vtk.vtkImageData()
-    volumeNode.SetAndObserveImageData(vimage)
-  import vtk.util.numpy_support
-  vtype = vtk.util.numpy_support.get_vtk_array_type(narray.dtype)
-  vimage.SetDimensions(vshape)
-  vimage.AllocateScalars(vtype, vcomponents)
-
-  narrayTarget = arrayFromVolume(volumeNode)
-  narrayTarget[:] = narray
+  if ijkOrigin is not None:
+    if not vimage:
+      raise RuntimeError("Volume node has no image data, sub-extent cannot be updated")
+    narrayTarget = arrayFromVolume(volumeNode)
+    i, j, k = [int(value) for value in ijkOrigin]
+    narrayRegion = narrayTarget[max(k, 0):k+vshape[2], max(j, 0):j+vshape[1], max(i, 0):i+vshape[0]]
+    if min(i, j, k) < 0 or narrayRegion.size != narray.size:
+      raise ValueError("Array of shape %s does not fit into the volume at IJK position %s" % (str(narray.shape), str(ijkOrigin)))
+    narrayRegion[:] = narray.reshape(narrayRegion.shape)
+  else:
+    vtype = vtk.util.numpy_support.get_vtk_array_type(narray.dtype)
+    if not vimage:
+      vimage = vtk.vtkImageData()
+      volumeNode.SetAndObserveImageData(vimage)
+    if vcomponents == 9:
+      varray = vimage.GetPointData().GetTensors()
+    else:
+      varray = vimage.GetPointData().GetScalars()
+    canReuseBuffer = (reuseBuffer and varray is not None and tuple(vimage.GetDimensions()) == vshape
+      and varray.GetNumberOfComponents() == vcomponents and varray.GetDataType() == vtype
+      and varray.GetNumberOfTuples() == vshape[0]*vshape[1]*vshape[2])
+    if not canReuseBuffer:
+      vimage.SetDimensions(vshape)
+      if vcomponents == 9:
+        tensors = vtk.vtkDataArray.CreateDataArray(vtype)
+        tensors.SetNumberOfComponents(9)
+        tensors.SetNumberOfTuples(vshape[0]*vshape[1]*vshape[2])
+        vimage.GetPointData().SetTensors(tensors)
+      else:
+        vimage.AllocateScalars(vtype, vcomponents)
+    narrayTarget = arrayFromVolume(volumeNode)
+    narrayTarget[:] = narray.reshape(narrayTarget.shape)
 
   # Notify the application that image data is changed
   # (same notifications as in vtkMRMLVolumeNode.SetImageDataConnection)
   import slicer
+  pointData = vimage.GetPointData()
+  if pointData.GetScalars():
+    pointData.GetScalars().Modified()
+  if pointData.GetTensors():
+    pointData.GetTensors().Modified()
+  vimage.Modified()
   volumeNode.StorableModified()
   volumeNode.Modified()
   volumeNode.InvokeEvent(slicer.vtkMRMLVolumeNode.ImageDataModifiedEvent, volumeNode)
@@ -980,6 +1436,37 @@ def updateTableFromArray(tableNode, narrays, columnNames=None):
     tableNode.AddColumn(vcolumn)
   return tableNode
 
+def histogramBinning(narray):
+  """Get bin origin and spacing that vtkImageHistogramStatistics uses by default
+  for an image that contains the values of the numpy array.
+  Bins cover the value range extended to include 0. Bin spacing is 1 for integer
+  arrays if at most 65536 bins are needed, otherwise the range is divided into 65536 bins.
+  Returns (binOrigin, binSpacing).
+  """
+  import numpy as np
+  maximumNumberOfBins = 65536
+  if narray.size == 0:
+    return 0.0, 1.0
+  binRangeMin = min(0.0, float(narray.min()))
+  binRangeMax = max(0.0, float(narray.max()))
+  if np.issubdtype(narray.dtype, np.integer) and binRangeMax - binRangeMin + 1 <= maximumNumberOfBins:
+    return binRangeMin, 1.0
+  if binRangeMax <= binRangeMin:
+    return binRangeMin, 1.0
+  return binRangeMin, (binRangeMax - binRangeMin) / (maximumNumberOfBins - 1)
+
+def histogramMedian(middleValues, binOrigin, binSpacing):
+  """Get the median that vtkImageHistogramStatistics computes from histogram bins
+  (see :py:meth:`histogramBinning`), without computing the histogram.
+  ``middleValues`` is the value at index ``count // 2`` of the sorted voxel values,
+  it can be a single value or a numpy array of values of several regions.
+  vtkImageHistogramStatistics reports the lower edge of the bin preceding the first bin
+  where the cumulative count exceeds half of the voxels, so the same value is returned here.
+  """
+  import numpy as np
+  middleBins = np.floor((np.asarray(middleValues) - binOrigin) / binSpacing + 0.5)
+  return binOrigin + binSpacing * np.maximum(middleBins - 1, 0)
+
 #
 # VTK
 #
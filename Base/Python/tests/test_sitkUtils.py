@@ -1,6 +1,7 @@
 from __future__ import print_function
 import slicer
 import sitkUtils as su
+import vtk
 
 import unittest
 
@@ -81,6 +82,52 @@ class SitkUtilsTests(unittest.TestCase):
         slicer.mrmlScene.Clear(0)
 
 
+    def test_SimpleITK_SlicerPushPull_ArrayBridge(self):
+
+        """ Download the MRHead node
+        """
+        import SampleData
+        import SimpleITK as sitk
+        volumeNode1 = SampleData.downloadSample("MRHead")
+
+        """ Verify that pulling through the array bridge gives the same image as
+        reading through MRMLIDImageIO.
+        """
+        volumeNode1.SetOrigin(10.0, 20.0, 30.0)
+        sitkimageIO = su.PullVolumeFromSlicer(volumeNode1)
+        sitkimageArray = su.PullVolumeFromSlicer(volumeNode1, useArrayBridge=True)
+        self.assertEqual(sitkimageIO.GetSize(), sitkimageArray.GetSize())
+        self.assertEqual(sitkimageIO.GetPixelID(), sitkimageArray.GetPixelID())
+        for axis in range(3):
+            self.assertAlmostEqual(sitkimageIO.GetOrigin()[axis], sitkimageArray.GetOrigin()[axis])
+            self.assertAlmostEqual(sitkimageIO.GetSpacing()[axis], sitkimageArray.GetSpacing()[axis])
+        for index in range(9):
+            self.assertAlmostEqual(sitkimageIO.GetDirection()[index], sitkimageArray.GetDirection()[index])
+        self.assertTrue((sitk.GetArrayViewFromImage(sitkimageIO) == sitk.GetArrayViewFromImage(sitkimageArray)).all())
+
+        """ Verify that pushing through the array bridge creates the same volume as
+        writing through MRMLIDImageIO, also when reusing an existing node.
+        """
+        sitkimageArray.SetDirection((0.0, 1.0, 0.0, 0.0, 0.0, -1.0, 1.0, 0.0, 0.0))
+        sitkimageArray.SetOrigin((100.0, 100.0, 100.0))
+        volumeNodeIO = su.PushVolumeToSlicer(sitkimageArray, name="ImageIO")
+        volumeNodeArray = su.PushVolumeToSlicer(sitkimageArray, name="ImageArray", useArrayBridge=True)
+        voxelsBeforeUpdate = slicer.util.arrayFromVolume(volumeNodeArray)
+        volumeNodeArray = su.PushVolumeToSlicer(sitkimageArray, targetNode=volumeNodeArray, useArrayBridge=True)
+        # size and type did not change, therefore the existing voxel buffer is reused
+        self.assertEqual(voxelsBeforeUpdate.ctypes.data, slicer.util.arrayFromVolume(volumeNodeArray).ctypes.data)
+        matrixIO = vtk.vtkMatrix4x4()
+        volumeNodeIO.GetIJKToRASMatrix(matrixIO)
+        matrixArray = vtk.vtkMatrix4x4()
+        volumeNodeArray.GetIJKToRASMatrix(matrixArray)
+        for row in range(4):
+            for column in range(4):
+                self.assertAlmostEqual(matrixIO.GetElement(row, column), matrixArray.GetElement(row, column))
+        self.assertTrue((slicer.util.arrayFromVolume(volumeNodeIO) == slicer.util.arrayFromVolume(volumeNodeArray)).all())
+
+        slicer.mrmlScene.Clear(0)
+
+
     def test_SimpleITK_SlicerPushPull_Deprecated(self):
 
         """ Test with deprecated API to ensure backward compatibility """
@@ -1,3 +1,6 @@
+import os
+import json
+import time
 import slicer
 import logging
 
@@ -61,6 +64,134 @@ class DICOMLoadable(object):
       self.selected = qLoadable.selected
       self.confidence = qLoadable.confidence
 
+#
+# DICOMLoadableCache
+#
+
+class DICOMLoadableCache(object):
+  """Persistent storage of DICOM plugin examination results.
+  Loadables are stored in an SQLite database file next to the DICOM database,
+  so that examining previously seen series is fast even after application restart.
+  Entries are keyed by a hash of the examining plugin, the file list, and the size and
+  modification time of each file, therefore modified files are always re-examined.
+  Only DICOMLoadable instances with JSON-serializable attributes are stored.
+  Least recently used entries are evicted when the number of entries exceeds maximumNumberOfEntries.
+  The cache must only be accessed from the main thread.
+  """
+
+  cacheFileName = "DICOMLoadableCache.sqlite"
+  maximumNumberOfEntries = 10000
+
+  _instance = None
+
+  @staticmethod
+  def instance():
+    """Get cache stored next to the current DICOM database. Returns None if there is no open database."""
+    if not hasattr(slicer, 'dicomDatabase') or not slicer.dicomDatabase or not slicer.dicomDatabase.isOpen:
+      return None
+    databaseFilename = slicer.dicomDatabase.databaseFilename
+    if not databaseFilename or databaseFilename == ":memory:":
+      return None
+    cacheFilePath = os.path.join(os.path.dirname(databaseFilename), DICOMLoadableCache.cacheFileName)
+    if DICOMLoadableCache._instance is None or DICOMLoadableCache._instance.filePath != cacheFilePath:
+      if DICOMLoadableCache._instance:
+        DICOMLoadableCache._instance.close()
+      DICOMLoadableCache._instance = DICOMLoadableCache(cacheFilePath)
+    return DICOMLoadableCache._instance
+
+  def __init__(self, filePath):
+    self.filePath = filePath
+    self.connection = None
+
+  def _getConnection(self):
+    if self.connection is None:
+      import sqlite3
+      self.connection = sqlite3.connect(self.filePath)
+      self.connection.execute("CREATE TABLE IF NOT EXISTS Loadables "
+        "(Key TEXT PRIMARY KEY, Loadables TEXT NOT NULL, LastAccessTime REAL NOT NULL)")
+      self.connection.commit()
+    return self.connection
+
+  def close(self):
+    if self.connection:
+      self.connection.close()
+      self.connection = None
+
+  @staticmethod
+  def hashFiles(files, pluginName, parameters=""):
+    """Create a hash key for a list of files that changes if any of the files are modified"""
+    import hashlib
+    m = hashlib.md5()
+    m.update(pluginName.encode('UTF-8', 'ignore'))
+    m.update(parameters.encode('UTF-8', 'ignore'))
+    for f in files:
+      try:
+        fileStat = os.stat(f)
+        fileState = "|%d|%d" % (fileStat.st_size, fileStat.st_mtime_ns)
+      except OSError:
+        # file is not accessible, never reuse results computed for it
+        return None
+      # Unicode-objects must be encoded before hashing
+      m.update((f + fileState + "\n").encode('UTF-8', 'ignore'))
+    return m.hexdigest()
+
+  def getLoadables(self, key):
+    """Get list of loadables stored for the key, returns None if not found"""
+    import sqlite3
+    try:
+      connection = self._getConnection()
+      row = connection.execute("SELECT Loadables FROM Loadables WHERE Key=?", (key,)).fetchone()
+      if row is None:
+        return None
+      connection.execute("UPDATE Loadables SET LastAccessTime=? WHERE Key=?", (time.time(), key))
+      connection.commit()
+      loadables = []
+      for attributes in json.loads(row[0]):
+        loadable = DICOMLoadable()
+        loadable.__dict__.update(attributes)
+        loadables.append(loadable)
+      return loadables
+    except (sqlite3.Error, ValueError) as e:
+      logging.warning("Failed to read DICOM loadable cache: " + str(e))
+      return None
+
+  def setLoadables(self, key, loadables):
+    """Store list of loadables for the key. Loadables that cannot be serialized are not stored."""
+    import sqlite3
+    if any([type(loadable) is not DICOMLoadable for loadable in loadables]):
+      return False
+    try:
+      serializedLoadables = json.dumps([loadable.__dict__ for loadable in loadables])
+    except (TypeError, ValueError):
+      logging.debug("DICOM loadables are not stored in persistent cache: loadables cannot be serialized")
+      return False
+    try:
+      connection = self._getConnection()
+      connection.execute("INSERT OR REPLACE INTO Loadables (Key, Loadables, LastAccessTime) VALUES (?,?,?)",
+        (key, serializedLoadables, time.time()))
+      self.evict()
+      connection.commit()
+    except sqlite3.Error as e:
+      logging.warning("Failed to write DICOM loadable cache: " + str(e))
+      return False
+    return True
+
+  def evict(self):
+    """Remove least recently used entries if the cache is larger than maximumNumberOfEntries"""
+    connection = self._getConnection()
+    numberOfEntries = connection.execute("SELECT COUNT(*) FROM Loadables").fetchone()[0]
+    if numberOfEntries <= self.maximumNumberOfEntries:
+      return
+    connection.execute("DELETE FROM Loadables WHERE Key IN "
+      "(SELECT Key FROM Loadables ORDER BY LastAccessTime ASC LIMIT ?)",
+      (numberOfEntries - self.maximumNumberOfEntries,))
+
+  def clear(self):
+    """Remove all entries from the cache"""
+    connection = self._getConnection()
+    connection.execute("DELETE FROM Loadables")
+    connection.commit()
+
 #
 # DICOMPlugin
 #
@@ -99,10 +230,20 @@ class DICOMPlugin(object):
 
   def getCachedLoadables(self,files):
     """ Helper method to access the results of a previous
-    examination of a list of files"""
+    examination of a list of files. Results of examinations in
+    previous application sessions are retrieved from the persistent
+    cache if the files have not been modified since then."""
     key = self.hashFiles(files)
     if key in self.loadableCache:
       return self.loadableCache[key]
+    persistentCache = DICOMLoadableCache.instance()
+    if persistentCache:
+      persistentKey = DICOMLoadableCache.hashFiles(files, self.__class__.__name__, self.loadableCacheParameters())
+      if persistentKey:
+        loadables = persistentCache.getLoadables(persistentKey)
+        if loadables is not None:
+          self.loadableCache[key] = loadables
+          return loadables
     return None
 
   def cacheLoadables(self,files,loadables):
@@ -110,6 +251,18 @@ class DICOMPlugin(object):
     of files for later quick access"""
     key = self.hashFiles(files)
     self.loadableCache[key] = loadables
+    persistentCache = DICOMLoadableCache.instance()
+    if persistentCache:
+      persistentKey = DICOMLoadableCache.hashFiles(files, self.__class__.__name__, self.loadableCacheParameters())
+      if persistentKey:
+        persistentCache.setLoadables(persistentKey, loadables)
+
+  def loadableCacheParameters(self):
+    """Return a string that describes all settings that affect examination results.
+    Persistently cached loadables are only reused if these settings are unchanged.
+    Virtual: should be overridden by subclasses that have such settings.
+    """
+    return ""
 
   def examineForImport(self,fileList):
     """Look at the list of lists of filenames and return
@@ -124,6 +277,35 @@ class DICOMPlugin(object):
     """
     return self.examineForImport(fileList)
 
+  def getExaminationInputs(self,fileLists):
+    """Optional first step of examining the list of lists of filenames
+    in three steps, so that the DICOM browser can run the second step in
+    a worker thread, concurrently with other plugins.
+    This step is called on the main thread and collects everything that
+    is needed from the DICOM database, the scene, and the settings.
+    Returns None if the plugin does not support examination in steps,
+    in which case examineForImport is called on the main thread instead.
+    Virtual: may be overridden by the subclass
+    """
+    return None
+
+  def examineInputs(self,inputs):
+    """Second step of examination: compute examination results
+    from the object returned by getExaminationInputs.
+    It may be called from a worker thread, therefore it must not
+    access the DICOM database, the scene, Qt, or the application log.
+    Virtual: must be overridden if getExaminationInputs is overridden
+    """
+    return None
+
+  def getLoadablesFromExaminationResults(self,inputs,results):
+    """Third step of examination: return the list of DICOMLoadables
+    created from the results of examineInputs. It is called on the
+    main thread, therefore it may cache or log the results.
+    Virtual: may be overridden by the subclass
+    """
+    return results
+
   def load(self,loadable):
     """Accept a DICOMLoadable and perform the operation to convert
     the referenced data into MRML nodes
@@ -388,9 +388,78 @@ class LoadDICOMFilesToDatabase(object):
     pass
 
 #------------------------------------------------------------------------------
-# TODO: more consistency checks:
-# - is there gantry tilt?
-# - are the orientations the same for all slices?
+def getTagValuesForFiles(filePaths, tags, dicomDatabase=None):
+  """ Get values of multiple DICOM tags for a list of files
+
+  Values are retrieved from the tag cache of the DICOM database using a single
+  query for many files, instead of calling fileValue for each file and tag.
+  Tags that are set by setDatabasePrecacheTags are normally already in the cache.
+  Values that are not found in the cache are read using fileValue.
+
+  Returns a dictionary that maps each tag to a list of values, which contains
+  one value for each file, in the same order as in filePaths.
+  """
+  if dicomDatabase is None:
+    dicomDatabase = slicer.dicomDatabase
+  tags = list(tags)
+  cachedValues = _getCachedTagValuesForFiles(filePaths, tags, dicomDatabase)
+  tagValues = {}
+  for tag in tags:
+    if tag in tagValues:
+      continue
+    values = []
+    for filePath in filePaths:
+      value = cachedValues.get((filePath, tag))
+      if value is None:
+        value = dicomDatabase.fileValue(filePath, tag)
+      values.append(value)
+    tagValues[tag] = values
+  return tagValues
+
+def _getCachedTagValuesForFiles(filePaths, tags, dicomDatabase, filesPerQuery=400):
+  """ Query tag values of files from the tag cache of a DICOM database.
+  Returns a dictionary that maps (filePath, tag) to value. Files or tags that are not
+  in the cache are not included. Returns an empty dictionary if the cache is not accessible.
+  """
+  import sqlite3
+  try:
+    from urllib.request import pathname2url
+  except ImportError:
+    from urllib import pathname2url
+
+  # Tag values that the database uses to indicate an empty value
+  emptyValues = ["__TAG_NOT_IN_INSTANCE__", "__VALUE_IS_EMPTY_STRING__", None]
+
+  databaseFilename = dicomDatabase.databaseFilename
+  if not filePaths or not tags or not databaseFilename or not os.path.isfile(databaseFilename):
+    return {}
+  tagCacheFilename = os.path.join(os.path.dirname(databaseFilename), "ctkDICOMTagCache.sql")
+  if not os.path.isfile(tagCacheFilename):
+    return {}
+
+  cachedValues = {}
+  try:
+    # Open read-only connections, the database is still managed by the DICOM database object
+    connection = sqlite3.connect("file:%s?mode=ro" % pathname2url(databaseFilename), uri=True)
+    try:
+      connection.execute("ATTACH DATABASE ? AS TagCacheDatabase", ("file:%s?mode=ro" % pathname2url(tagCacheFilename),))
+      tagPlaceholders = ",".join("?" * len(tags))
+      for startIndex in range(0, len(filePaths), filesPerQuery):
+        filePathsInQuery = filePaths[startIndex:startIndex+filesPerQuery]
+        query = ("SELECT Images.Filename, TagCache.Tag, TagCache.Value FROM Images"
+          " JOIN TagCacheDatabase.TagCache AS TagCache ON Images.SOPInstanceUID = TagCache.SOPInstanceUID"
+          " WHERE Images.Filename IN (%s) AND TagCache.Tag IN (%s)"
+          % (",".join("?" * len(filePathsInQuery)), tagPlaceholders))
+        for filePath, tag, value in connection.execute(query, list(filePathsInQuery) + tags):
+          cachedValues[filePath, tag] = "" if value in emptyValues else value
+    finally:
+      connection.close()
+  except sqlite3.Error as e:
+    logging.debug("DICOM tag cache cannot be queried directly, tag values are retrieved file by file: " + str(e))
+    return {}
+  return cachedValues
+
+#------------------------------------------------------------------------------
 def getSortedImageFiles(filePaths, epsilon=0.01):
   """ Sort DICOM image files in increasing slice order (IS direction) corresponding to a series
 
@@ -399,101 +468,205 @@ def getSortedImageFiles(filePaths, epsilon=0.01):
       to the acquisition plane)
 
       epsilon: Maximum difference in distance between slices to consider spacing uniform
+
+      See getImageGeometry for a more detailed description of the series geometry.
+  """
+  geometry = getImageGeometry(filePaths, epsilon)
+  return geometry['files'], geometry['distances'], geometry['warningText']
+
+#------------------------------------------------------------------------------
+def _parseVectors(valueStrings, numberOfComponents):
+  """ Parse backslash separated DICOM multi-value strings into an array of shape (len(valueStrings), numberOfComponents).
+  Returns None if any of the strings is empty or does not contain the expected number of numbers.
+  """
+  import numpy as np
+  if not all(valueStrings):
+    return None
+  try:
+    values = np.array('\\'.join(valueStrings).split('\\'), dtype=float)
+  except ValueError:
+    return None
+  if values.size != len(valueStrings) * numberOfComponents:
+    return None
+  return values.reshape(len(valueStrings), numberOfComponents)
+
+#------------------------------------------------------------------------------
+def getImageGeometry(filePaths, epsilon=0.01, orientationEpsilon=1e-3, tiltEpsilon=0.1):
+  """ Sort DICOM image files of a series by slice position and analyze the acquisition geometry
+
+      Position and orientation of all files are retrieved from the DICOM database
+      in one query and evaluated at once by computeImageGeometry.
+
+      epsilon: Maximum difference in distance between slices (in mm) to consider spacing uniform
+      orientationEpsilon: Maximum difference in direction cosines to consider orientation consistent
+      tiltEpsilon: Maximum angle (in degrees) between the scan axis and the line connecting
+        consecutive slice positions to consider the acquisition not tilted
+
+      Returns a dictionary that plugins can use instead of recomputing geometry,
+      see computeImageGeometry for a description of its content.
   """
-  warningText = ''
   if len(filePaths) == 0:
-    return filePaths, [], warningText
+    return computeImageGeometry(filePaths, [], [])
 
   # Define DICOM tags used in this function
   tags = {}
   tags['position'] = "0020,0032"
   tags['orientation'] = "0020,0037"
   tags['numberOfFrames'] = "0028,0008"
-  tags['seriesUID'] = "0020,000E"
+  tags['pixelSpacing'] = "0028,0030"
+
+  multiFrame = slicer.dicomDatabase.fileValue(filePaths[0], tags['numberOfFrames']) != ""
+  tagValues = getTagValuesForFiles(filePaths, [tags['position'], tags['orientation'], tags['pixelSpacing']])
+  settings = qt.QSettings()
+  regularizationEnabled = (settings.value("DICOM/ScalarVolume/AcquisitionGeometryRegularization", "default") == "transform")
 
-  seriesUID = slicer.dicomDatabase.fileValue(filePaths[0], tags['seriesUID'])
+  geometry = computeImageGeometry(filePaths, tagValues[tags['position']], tagValues[tags['orientation']],
+    multiFrame, regularizationEnabled, epsilon, orientationEpsilon, tiltEpsilon, tagValues[tags['pixelSpacing']])
+  if not geometry['spacingUniform']:
+    logging.warning("Geometric issues were found with the series. Please use caution.\n")
+  return geometry
 
-  if slicer.dicomDatabase.fileValue(filePaths[0], tags['numberOfFrames']) != "":
+#------------------------------------------------------------------------------
+def computeImageGeometry(filePaths, positionValues, orientationValues, multiFrame=False,
+    regularizationEnabled=False, epsilon=0.01, orientationEpsilon=1e-3, tiltEpsilon=0.1, pixelSpacingValues=None):
+  """ Sort DICOM image files of a series by slice position and analyze the acquisition geometry
+
+      Unlike getImageGeometry, this function does not access the DICOM database,
+      the application settings, or the application log, therefore it can be called from any thread.
+
+      positionValues, orientationValues: ImagePositionPatient and ImageOrientationPatient
+        tag values, one for each file in filePaths
+      multiFrame: True if the first file is a multi-frame image
+      regularizationEnabled: True if acquisition geometry regularization is enabled (only affects warningText)
+      epsilon: Maximum difference in distance between slices (in mm) to consider spacing uniform
+      orientationEpsilon: Maximum difference in direction cosines to consider orientation consistent
+      tiltEpsilon: Maximum angle (in degrees) between the scan axis and the line connecting
+        consecutive slice positions to consider the acquisition not tilted
+      pixelSpacingValues: optional PixelSpacing tag values, one for each file in filePaths
+
+      Returns a dictionary that plugins can use instead of recomputing geometry:
+        files: file paths sorted by distance along the scan axis
+        distances: dictionary of distance along the scan axis by file path
+        geometryAvailable: False if any of the files is missing position or orientation
+        positions: ImagePositionPatient of each sorted file (in LPS)
+        orientations: ImageOrientationPatient of each sorted file (in LPS)
+        pixelSpacings: PixelSpacing (row spacing, column spacing) of each sorted file,
+          None if pixelSpacingValues is not specified or any of the values is missing
+        multiFrame: True if the first file is a multi-frame image
+        scanAxis: slice normal computed from the orientation of the first file
+        sliceSpacing: distance between the first two sorted slices
+        maximumSpacingError: largest difference between slice spacings and sliceSpacing
+        spacingUniform: True if maximumSpacingError is within epsilon
+        gantryTilt: angle (in degrees) between the scan axis and the line connecting the first and last slice positions
+        maximumTiltAngle: largest angle (in degrees) between the scan axis and the line connecting consecutive slice positions
+        tilted: True if maximumTiltAngle is larger than tiltEpsilon
+        orientationConsistent: True if all files have the same orientation within orientationEpsilon
+        warningText: description of geometric issues found
+  """
+  geometry = {
+    'files': filePaths,
+    'distances': [],
+    'geometryAvailable': False,
+    'positions': None,
+    'orientations': None,
+    'pixelSpacings': None,
+    'multiFrame': False,
+    'scanAxis': None,
+    'sliceSpacing': None,
+    'maximumSpacingError': 0.0,
+    'spacingUniform': True,
+    'gantryTilt': 0.0,
+    'maximumTiltAngle': 0.0,
+    'tilted': False,
+    'orientationConsistent': True,
+    'warningText': '',
+    }
+  if len(filePaths) == 0:
+    return geometry
+
+  warningText = ''
+  if multiFrame:
+    geometry['multiFrame'] = True
     warningText += "Multi-frame image. If slice orientation or spacing is non-uniform then the image may be displayed incorrectly. Use with caution.\n"
 
   # Make sure first file contains valid geometry
-  ref = {}
-  for tag in [tags['position'], tags['orientation']]:
-    value = slicer.dicomDatabase.fileValue(filePaths[0], tag)
-    if not value or value == "":
-      warningText += "Reference image in series does not contain geometry information. Please use caution.\n"
-      return filePaths, [], warningText
-    ref[tag] = value
-
-  # Determine out-of-plane direction for first slice
+  if not positionValues[0] or not orientationValues[0]:
+    warningText += "Reference image in series does not contain geometry information. Please use caution.\n"
+    geometry['warningText'] = warningText
+    return geometry
+
   import numpy as np
-  sliceAxes = [float(zz) for zz in ref[tags['orientation']].split('\\')]
-  x = np.array(sliceAxes[:3])
-  y = np.array(sliceAxes[3:])
-  scanAxis = np.cross(x,y)
-  scanOrigin = np.array([float(zz) for zz in ref[tags['position']].split('\\')])
-
-  # For each file in series, calculate the distance along the scan axis, sort files by this
-  sortList = []
-  missingGeometry = False
-  for file in filePaths:
-    positionStr = slicer.dicomDatabase.fileValue(file,tags['position'])
-    orientationStr = slicer.dicomDatabase.fileValue(file,tags['orientation'])
-    if not positionStr or positionStr == "" or not orientationStr or orientationStr == "":
-      missingGeometry = True
-      break
-    position = np.array([float(zz) for zz in positionStr.split('\\')])
-    vec = position - scanOrigin
-    dist = vec.dot(scanAxis)
-    sortList.append((file, dist))
-
-  if missingGeometry:
+  positions = _parseVectors(positionValues, 3)
+  orientations = _parseVectors(orientationValues, 6)
+  if positions is None or orientations is None:
     warningText += "One or more images is missing geometry information in series. Please use caution.\n"
-    return filePaths, [], warningText
-
-  # Sort files names by distance from reference slice
-  sortedFiles = sorted(sortList, key=lambda x: x[1])
-  files = []
-  distances = {}
-  for file,dist in sortedFiles:
-    files.append(file)
-    distances[file] = dist
+    geometry['warningText'] = warningText
+    return geometry
+  geometry['geometryAvailable'] = True
+
+  # Determine out-of-plane direction for first slice and the distance of each file along it
+  scanAxis = np.cross(orientations[0][:3], orientations[0][3:])
+  geometry['scanAxis'] = scanAxis.tolist()
+  distances = (positions - positions[0]).dot(scanAxis)
+
+  # Sort files names by distance from reference slice (stable sort, to keep order of files at the same position)
+  sortedIndices = np.argsort(distances, kind='mergesort')
+  distances = distances[sortedIndices]
+  positions = positions[sortedIndices]
+  files = [filePaths[index] for index in sortedIndices]
+  geometry['files'] = files
+  geometry['distances'] = dict(zip(files, distances.tolist()))
+  geometry['positions'] = positions.tolist()
+  geometry['orientations'] = orientations[sortedIndices].tolist()
+  pixelSpacings = _parseVectors(pixelSpacingValues, 2) if pixelSpacingValues is not None else None
+  if pixelSpacings is not None:
+    geometry['pixelSpacings'] = pixelSpacings[sortedIndices].tolist()
+
+  if regularizationEnabled:
+    regularizationText = "  Slicer will apply a transform to this series trying to regularize the volume. Please use caution.\n"
+  else:
+    regularizationText = ("  If loaded image appears distorted, enable 'Acquisition geometry regularization'"
+      " in Application settings / DICOM / DICOMScalarVolumePlugin. Please use caution.\n")
 
-  # Get acquisition geometry regularization setting value
-  settings = qt.QSettings()
-  acquisitionGeometryRegularizationEnabled = (settings.value("DICOM/ScalarVolume/AcquisitionGeometryRegularization", "default") == "transform")
+  # Confirm consistent orientation of all slices
+  if np.abs(orientations - orientations[0]).max() > orientationEpsilon:
+    geometry['orientationConsistent'] = False
+    warningText += "Images do not have the same orientation." + regularizationText
 
-  # Confirm equal spacing between slices
-  # - use variable 'epsilon' to determine the tolerance
-  spaceWarnings = 0
   if len(files) > 1:
-    file0 = files[0]
-    file1 = files[1]
-    dist0 = distances[file0]
-    dist1 = distances[file1]
-    spacing0 = dist1 - dist0
-    n = 1
-    for fileN in files[1:]:
-      fileNminus1 = files[n-1]
-      distN = distances[fileN]
-      distNminus1 = distances[fileNminus1]
-      spacingN = distN - distNminus1
-      spaceError = spacingN - spacing0
-      if abs(spaceError) > epsilon:
-        spaceWarnings += 1
-        warningText += "Images are not equally spaced (a difference of %g vs %g in spacings was detected)." % (spaceError, spacing0)
-        if acquisitionGeometryRegularizationEnabled:
-          warningText += "  Slicer will apply a transform to this series trying to regularize the volume. Please use caution.\n"
-        else:
-          warningText += ("  If loaded image appears distorted, enable 'Acquisition geometry regularization'"
-            " in Application settings / DICOM / DICOMScalarVolumePlugin. Please use caution.\n")
-        break
-      n += 1
-
-  if spaceWarnings != 0:
-    logging.warning("Geometric issues were found with %d of the series. Please use caution.\n" % spaceWarnings)
-
-  return files, distances, warningText
+    # Confirm equal spacing between slices
+    # - use variable 'epsilon' to determine the tolerance
+    spacings = np.diff(distances)
+    spaceErrors = spacings - spacings[0]
+    geometry['sliceSpacing'] = float(spacings[0])
+    geometry['maximumSpacingError'] = float(np.abs(spaceErrors).max())
+    nonUniformSpacingIndices = np.flatnonzero(np.abs(spaceErrors) > epsilon)
+    if len(nonUniformSpacingIndices) > 0:
+      geometry['spacingUniform'] = False
+      warningText += ("Images are not equally spaced (a difference of %g vs %g in spacings was detected)."
+        % (spaceErrors[nonUniformSpacingIndices[0]], spacings[0]))
+      warningText += regularizationText
+
+    # Check gantry tilt: slice positions should move along the scan axis, without in-plane shift
+    offsets = positions - positions[0]
+    inPlaneOffsets = offsets - np.outer(offsets.dot(scanAxis), scanAxis)
+    inPlaneShifts = np.linalg.norm(np.diff(inPlaneOffsets, axis=0), axis=1)
+    seriesDirection = offsets[-1]
+    seriesLength = np.linalg.norm(seriesDirection)
+    if seriesLength > 0:
+      cosine = min(1.0, abs(seriesDirection.dot(scanAxis)) / (seriesLength * np.linalg.norm(scanAxis)))
+      geometry['gantryTilt'] = float(np.degrees(np.arccos(cosine)))
+    # - use variable 'tiltEpsilon' to determine the tolerance, as an angle, so that it does not depend on slice spacing
+    tiltAngles = np.degrees(np.arctan2(inPlaneShifts, np.abs(spacings)))
+    geometry['maximumTiltAngle'] = float(tiltAngles.max())
+    if geometry['maximumTiltAngle'] > tiltEpsilon:
+      geometry['tilted'] = True
+      warningText += ("Images are acquired with a tilted gantry or sheared geometry (tilt angle of %g degrees was detected)."
+        % geometry['gantryTilt'])
+      warningText += regularizationText
+
+  geometry['warningText'] = warningText
+  return geometry
 
 #------------------------------------------------------------------------------
 def refreshDICOMWidget():
@@ -102,6 +102,9 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
     self.horizontalTables = settingsValue('DICOM/horizontalTables', 0, converter=int)
 
     self.pluginInstances = {}
+    # time (in seconds) between progress updates while waiting for examination worker threads
+    self.examinationPollInterval = 0.05
+    self.loadingQueue = None
     self.fileLists = []
 
     setDatabasePrecacheTags(self.dicomBrowser)
@@ -698,51 +701,146 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
       logging.error('File lists must contain a non-empty list of tuples/lists')
       return loadablesByPlugin, loadEnabled
 
-    allFileCount = missingFileCount = 0
-    for fileList in self.fileLists:
-      for filePath in fileList:
-        allFileCount += 1
-        if not os.path.exists(filePath):
-          missingFileCount += 1
+    import concurrent.futures
+    filePaths = [filePath for fileList in fileLists for filePath in fileList]
+    allFileCount = len(filePaths)
+    plugins = self.pluginSelector.selectedPlugins()
 
-    if missingFileCount > 0:
-      slicer.util.warningDisplay("Warning: %d of %d selected files listed in the database cannot be found on disk."
-                                 % (missingFileCount, allFileCount), windowTitle="DICOM")
+    progress = slicer.util.createProgressDialog(parent=self, value=0, maximum=allFileCount)
+    progress.labelText = '\nChecking files'
+    slicer.app.processEvents()
 
-    if missingFileCount == allFileCount:
-      return loadablesByPlugin, loadEnabled
+    # Worker threads only run functions that do not access the DICOM database or the scene.
+    # Threads that are still running when the user cancels are not waited for, their results are ignored.
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.getNumberOfExaminationWorkers())
+    try:
+      fileExistsFutures = [executor.submit(self.readFileHeader, filePath) for filePath in filePaths]
+      if not self.waitForFutures(fileExistsFutures, progress):
+        return loadablesByPlugin, loadEnabled
+      missingFileCount = [future.result() for future in fileExistsFutures].count(False)
+
+      if missingFileCount > 0:
+        slicer.util.warningDisplay("Warning: %d of %d selected files listed in the database cannot be found on disk."
+                                   % (missingFileCount, allFileCount), windowTitle="DICOM")
+
+      if missingFileCount == allFileCount:
+        return loadablesByPlugin, loadEnabled
+
+      progress.maximum = len(plugins)
+      progress.setValue(0)
+
+      # Plugins that support examination in steps get their inputs on the main thread and
+      # are examined in worker threads, while the other plugins are examined on the main thread.
+      examinationFutures = {}
+      examinationInputs = {}
+      loadablesByPluginClass = {}
+      for pluginClass in plugins:
+        plugin = self.getPluginInstance(pluginClass)
+        if progress.wasCanceled:
+          break
+        progress.labelText = '\nChecking %s' % pluginClass
+        slicer.app.processEvents()
+        try:
+          inputs = plugin.getExaminationInputs(fileLists)
+          if inputs is not None:
+            examinationInputs[pluginClass] = inputs
+            examinationFutures[pluginClass] = executor.submit(plugin.examineInputs, inputs)
+          else:
+            loadablesByPluginClass[pluginClass] = self.examinePlugin(plugin, fileLists)
+        except Exception as e:
+          import traceback
+          traceback.print_exc()
+          self.reportPluginFailure(pluginClass, e)
+        if pluginClass not in examinationFutures:
+          progress.setValue(progress.value + 1)
+        slicer.app.processEvents()
+
+      if examinationFutures:
+        progress.labelText = '\nChecking %s' % ', '.join(examinationFutures.keys())
+        self.waitForFutures(list(examinationFutures.values()), progress, progress.value)
+
+      for pluginClass in examinationFutures:
+        future = examinationFutures[pluginClass]
+        if future.cancelled() or not future.done():
+          continue
+        plugin = self.getPluginInstance(pluginClass)
+        try:
+          loadablesByPluginClass[pluginClass] = plugin.getLoadablesFromExaminationResults(
+            examinationInputs[pluginClass], future.result())
+        except Exception as e:
+          import traceback
+          traceback.print_exc()
+          self.reportPluginFailure(pluginClass, e)
+
+      # Merge results in the order of the selected plugins
+      for pluginClass in plugins:
+        if pluginClass in loadablesByPluginClass:
+          plugin = self.getPluginInstance(pluginClass)
+          loadablesByPlugin[plugin] = loadablesByPluginClass[pluginClass]
+          loadEnabled = loadEnabled or loadablesByPlugin[plugin] != []
+    finally:
+      executor.shutdown(wait=False)
+      progress.close()
 
-    plugins = self.pluginSelector.selectedPlugins()
+    return loadablesByPlugin, loadEnabled
 
-    progress = slicer.util.createProgressDialog(parent=self, value=0, maximum=len(plugins))
+  def getNumberOfExaminationWorkers(self):
+    """Number of threads that check the selected files and run the plugins that support examination in steps.
+    Worker threads read the file headers, which gets them into the file system cache and makes
+    examination faster when files are on slow (e.g., network) storage.
+    The default is the number of processor cores, it can be changed by setting DICOM/numberOfExaminationWorkers.
+    """
+    return max(1, settingsValue('DICOM/numberOfExaminationWorkers', os.cpu_count() or 1, converter=int))
 
-    for step, pluginClass in enumerate(plugins):
-      if pluginClass not in self.pluginInstances:
-        self.pluginInstances[pluginClass] = slicer.modules.dicomPlugins[pluginClass]()
-      plugin = self.pluginInstances[pluginClass]
-      if progress.wasCanceled:
-        break
-      progress.labelText = '\nChecking %s' % pluginClass
-      slicer.app.processEvents()
-      progress.setValue(step)
+  def waitForFutures(self, futures, progress, progressOffset=0):
+    """Process events and update the progress dialog until all futures are done.
+    Returns False if the user canceled the progress dialog.
+    Futures that are not started yet are canceled, running futures are not waited for.
+    """
+    import concurrent.futures
+    pending = set(futures)
+    while pending:
+      done, pending = concurrent.futures.wait(pending, timeout=self.examinationPollInterval,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+      progress.setValue(progressOffset + len(futures) - len(pending))
       slicer.app.processEvents()
-      try:
-        loadablesByPlugin[plugin] = plugin.examineForImport(fileLists)
-        # If regular method is not overridden (so returns empty list), try old function
-        # Ensuring backwards compatibility: examineForImport used to be called examine
-        if not loadablesByPlugin[plugin]:
-          loadablesByPlugin[plugin] = plugin.examine(fileLists)
-        loadEnabled = loadEnabled or loadablesByPlugin[plugin] != []
-      except Exception as e:
-        import traceback
-        traceback.print_exc()
-        slicer.util.warningDisplay("Warning: Plugin failed: %s\n\nSee python console for error message." % pluginClass,
-                                   windowTitle="DICOM", parent=self)
-        print("DICOM Plugin failed: %s" % str(e))
+      if progress.wasCanceled:
+        for future in pending:
+          future.cancel()
+        return False
+    return True
 
-    progress.close()
+  @staticmethod
+  def readFileHeader(filePath, headerSize=64*1024):
+    """Read the beginning of the file (where the DICOM header is) and return True if the file exists.
+    Only accesses the file system, therefore it can be called from any thread.
+    """
+    try:
+      with open(filePath, 'rb') as file:
+        file.read(headerSize)
+    except (IOError, OSError):
+      return os.path.exists(filePath)
+    return True
 
-    return loadablesByPlugin, loadEnabled
+  def getPluginInstance(self, pluginClass):
+    if pluginClass not in self.pluginInstances:
+      self.pluginInstances[pluginClass] = slicer.modules.dicomPlugins[pluginClass]()
+    return self.pluginInstances[pluginClass]
+
+  @staticmethod
+  def examinePlugin(plugin, fileLists):
+    """Return loadables that the plugin can create from the file lists"""
+    loadables = plugin.examineForImport(fileLists)
+    # If regular method is not overridden (so returns empty list), try old function
+    # Ensuring backwards compatibility: examineForImport used to be called examine
+    if not loadables:
+      loadables = plugin.examine(fileLists)
+    return loadables
+
+  def reportPluginFailure(self, pluginClass, exception):
+    slicer.util.warningDisplay("Warning: Plugin failed: %s\n\nSee python console for error message." % pluginClass,
+                               windowTitle="DICOM", parent=self)
+    print("DICOM Plugin failed: %s" % str(exception))
 
   def isFileListInCheckedLoadables(self, fileList):
     for plugin in self.loadablesByPlugin:
@@ -836,6 +934,11 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
       return
 
     selectedLoadables = self.getAllSelectedLoadables()
+
+    if settingsValue('DICOM/backgroundLoading', False, converter=toBool):
+      self.loadLoadablesInBackground(selectedLoadables)
+      return
+
     progress = slicer.util.createProgressDialog(parent=self, value=0, maximum=len(selectedLoadables))
     loadingResult = ''
 
@@ -860,24 +963,7 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
       if progress.wasCanceled:
         break
       updateProgress(value=step, text='\nLoading %s' % loadable.name)
-      try:
-        loadSuccess = plugin.load(loadable)
-      except:
-        loadSuccess = False
-        import traceback
-        logging.error("DICOM plugin failed to load '"
-          + loadable.name + "' as a '" + plugin.loadType + "'.\n"
-          + traceback.format_exc())
-      if not loadSuccess:
-        loadingResult = '%s\nCould not load: %s as a %s' % (loadingResult, loadable.name, plugin.loadType)
-      try:
-        for derivedItem in loadable.derivedItems:
-          indexer = ctkDICOMIndexer()
-          updateProgress(text='\nIndexing %s' % derivedItem)
-          indexer.addFile(slicer.dicomDatabase, derivedItem)
-      except AttributeError:
-        # no derived items or some other attribute error
-        pass
+      loadingResult += self.loadLoadable(loadable, plugin, updateProgress)
 
     self.removeObserver(slicer.mrmlScene, slicer.vtkMRMLScene.NodeAddedEvent, onNodeAdded)
 
@@ -891,6 +977,54 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
 
     self.onLoadingFinished()
 
+  def loadLoadable(self, loadable, plugin, updateProgress):
+    """Load a single loadable with the plugin and index its derived items.
+    Returns error message, or empty string if loading was successful.
+    """
+    loadingResult = ''
+    try:
+      loadSuccess = plugin.load(loadable)
+    except:
+      loadSuccess = False
+      import traceback
+      logging.error("DICOM plugin failed to load '"
+        + loadable.name + "' as a '" + plugin.loadType + "'.\n"
+        + traceback.format_exc())
+    if not loadSuccess:
+      loadingResult = '\nCould not load: %s as a %s' % (loadable.name, plugin.loadType)
+    try:
+      for derivedItem in loadable.derivedItems:
+        indexer = ctkDICOMIndexer()
+        updateProgress(text='\nIndexing %s' % derivedItem)
+        indexer.addFile(slicer.dicomDatabase, derivedItem)
+    except AttributeError:
+      # no derived items or some other attribute error
+      pass
+    return loadingResult
+
+  def loadLoadablesInBackground(self, selectedLoadables):
+    """Load loadables without blocking the application.
+    Loadables are loaded one by one from the event loop, so that the application remains responsive
+    and already loaded series can be viewed while the rest is loading. Files of the next loadable
+    are read by a background worker while the current loadable is added to the scene.
+    Enabled by setting DICOM/backgroundLoading to true.
+    """
+    if self.loadingQueue and self.loadingQueue.isRunning():
+      slicer.util.warningDisplay("Loading of previously selected data is still in progress.",
+                                 windowTitle='DICOM loading', parent=self)
+      return
+    progress = slicer.util.createProgressDialog(parent=self, value=0, maximum=len(selectedLoadables),
+                                                windowModality=qt.Qt.NonModal)
+    self.loadingQueue = DICOMLoadingQueue(list(selectedLoadables.items()), self.loadLoadable,
+                                          completionCallback=self.onBackgroundLoadingFinished, progress=progress)
+    self.loadingQueue.start()
+
+  def onBackgroundLoadingFinished(self, loadedNodeIDs, loadingResult):
+    self.loadingQueue = None
+    if loadingResult:
+      slicer.util.warningDisplay(loadingResult, windowTitle='DICOM loading')
+    self.onLoadingFinished()
+
   def warnUserIfLoadableWarningsAndProceed(self):
     warningsInSelectedLoadables = False
     for plugin in self.loadablesByPlugin:
@@ -918,6 +1052,117 @@ class DICOMDetailsBase(VTKObservationMixin, SizePositionSettingsMixin):
       self.close()
 
 
+class DICOMLoadingQueue(VTKObservationMixin):
+  """Load a list of DICOM loadables one by one from the Qt event loop.
+
+  While a loadable is loaded on the main thread, files of the next loadable are read
+  by a background worker, so that they are already in the file system cache when the plugin needs them.
+  Loading can be interrupted by cancel() or by the cancel button of the progress dialog.
+  completionCallback is called with the list of loaded volume node IDs and the loading errors.
+  """
+
+  def __init__(self, loadablesAndPlugins, loadFunction, completionCallback=None, progress=None):
+    VTKObservationMixin.__init__(self)
+    self.loadablesAndPlugins = loadablesAndPlugins
+    self.loadFunction = loadFunction
+    self.completionCallback = completionCallback
+    self.progress = progress
+    self.loadedNodeIDs = []
+    self.loadingResult = ''
+    self.nextLoadableIndex = 0
+    self.canceled = False
+    self.running = False
+    self.executor = None
+    self.prefetchFuture = None
+    # maximum time (in seconds) to wait for reading of files without processing application events
+    self.prefetchWaitTimeout = 0.05
+
+  def isRunning(self):
+    return self.running
+
+  def start(self):
+    import concurrent.futures
+    self.running = True
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self.addObserver(slicer.mrmlScene, slicer.vtkMRMLScene.NodeAddedEvent, self.onNodeAdded)
+    self.prefetch(0)
+    qt.QTimer.singleShot(0, self.loadNextLoadable)
+
+  def cancel(self):
+    self.canceled = True
+
+  @vtk.calldata_type(vtk.VTK_OBJECT)
+  def onNodeAdded(self, caller, event, calldata):
+    node = calldata
+    if isinstance(node, slicer.vtkMRMLVolumeNode):
+      self.loadedNodeIDs.append(node.GetID())
+
+  @staticmethod
+  def readFiles(filePaths, blockSize=1024*1024):
+    """Read content of the files to get them into the file system cache"""
+    for filePath in filePaths:
+      try:
+        with open(filePath, 'rb') as file:
+          while file.read(blockSize):
+            pass
+      except (IOError, OSError):
+        # missing files are reported by the plugin when loading
+        pass
+
+  def prefetch(self, loadableIndex):
+    if loadableIndex >= len(self.loadablesAndPlugins):
+      self.prefetchFuture = None
+      return
+    loadable = self.loadablesAndPlugins[loadableIndex][0]
+    self.prefetchFuture = self.executor.submit(self.readFiles, list(loadable.files))
+
+  def updateProgress(self, value=None, text=None):
+    if not self.progress:
+      return
+    if value is not None:
+      self.progress.setValue(value)
+    if text:
+      self.progress.labelText = text
+
+  def loadNextLoadable(self):
+    if self.progress and self.progress.wasCanceled:
+      self.canceled = True
+    if self.canceled or self.nextLoadableIndex >= len(self.loadablesAndPlugins):
+      self.finish()
+      return
+    loadable, plugin = self.loadablesAndPlugins[self.nextLoadableIndex]
+    self.updateProgress(value=self.nextLoadableIndex, text='\nLoading %s' % loadable.name)
+    if self.prefetchFuture:
+      # wait for reading of the files of this loadable to complete; if it takes long, return to
+      # the event loop to keep the application responsive and check again later
+      import concurrent.futures
+      concurrent.futures.wait([self.prefetchFuture], timeout=self.prefetchWaitTimeout)
+      if not self.prefetchFuture.done():
+        qt.QTimer.singleShot(0, self.loadNextLoadable)
+        return
+    self.prefetch(self.nextLoadableIndex + 1)
+    self.loadingResult += self.loadFunction(loadable, plugin, self.updateProgress)
+    self.nextLoadableIndex += 1
+    self.updateProgress(value=self.nextLoadableIndex)
+    qt.QTimer.singleShot(0, self.loadNextLoadable)
+
+  def finish(self):
+    self.removeObserver(slicer.mrmlScene, slicer.vtkMRMLScene.NodeAddedEvent, self.onNodeAdded)
+    if self.prefetchFuture:
+      self.prefetchFuture.cancel()
+    self.executor.shutdown(wait=False)
+    self.running = False
+
+    loadedFileParameters = {}
+    loadedFileParameters['nodeIDs'] = self.loadedNodeIDs
+    slicer.app.ioManager().emitNewFileLoaded(loadedFileParameters)
+
+    if self.progress:
+      self.progress.close()
+    if self.completionCallback:
+      self.completionCallback(self.loadedNodeIDs, self.loadingResult)
+
+
 class DICOMReferencesDialog(qt.QMessageBox):
 
   WINDOW_TITLE = "Referenced datasets found"
@@ -0,0 +1,64 @@
+import math
+import unittest
+from DICOMLib import DICOMUtils
+
+
+class DICOMImageGeometryTest(unittest.TestCase):
+  """Tests of series geometry analysis from DICOM position and orientation tag values."""
+
+  axialOrientation = '1\\0\\0\\0\\1\\0'
+
+  def computeGeometry(self, positions, **kwargs):
+    files = ['slice%d.dcm' % index for index in range(len(positions))]
+    positionValues = ['%.6f\\%.6f\\%.6f' % tuple(position) for position in positions]
+    orientationValues = [self.axialOrientation] * len(positions)
+    return DICOMUtils.computeImageGeometry(files, positionValues, orientationValues, **kwargs)
+
+  def tiltedPositions(self, numberOfSlices, sliceSpacing, tiltAngle):
+    shift = sliceSpacing * math.tan(math.radians(tiltAngle))
+    return [(0.0, index * shift, index * sliceSpacing) for index in range(numberOfSlices)]
+
+  def test_SortedUniform(self):
+    geometry = self.computeGeometry([(0, 0, 2.5), (0, 0, 0), (0, 0, 5), (0, 0, 7.5)])
+    self.assertEqual(geometry['files'], ['slice1.dcm', 'slice0.dcm', 'slice2.dcm', 'slice3.dcm'])
+    self.assertTrue(geometry['geometryAvailable'])
+    self.assertTrue(geometry['spacingUniform'])
+    self.assertAlmostEqual(geometry['sliceSpacing'], 2.5)
+    self.assertFalse(geometry['tilted'])
+    self.assertTrue(geometry['orientationConsistent'])
+    self.assertEqual(geometry['warningText'], '')
+
+  def test_NonUniformSpacing(self):
+    geometry = self.computeGeometry([(0, 0, 0), (0, 0, 1), (0, 0, 2), (0, 0, 4)])
+    self.assertFalse(geometry['spacingUniform'])
+    self.assertAlmostEqual(geometry['maximumSpacingError'], 1.0)
+    self.assertTrue(geometry['warningText'])
+
+  def test_MissingPosition(self):
+    geometry = DICOMUtils.computeImageGeometry(['slice0.dcm', 'slice1.dcm'],
+      ['0\\0\\0', ''], [self.axialOrientation] * 2)
+    self.assertFalse(geometry['geometryAvailable'])
+    self.assertTrue(geometry['warningText'])
+
+  def test_TiltIndependentOfSliceSpacing(self):
+    for sliceSpacing in [0.5, 1.0, 5.0]:
+      geometry = self.computeGeometry(self.tiltedPositions(10, sliceSpacing, 15.0))
+      self.assertTrue(geometry['tilted'])
+      self.assertAlmostEqual(geometry['gantryTilt'], 15.0, places=3)
+      self.assertAlmostEqual(geometry['maximumTiltAngle'], 15.0, places=3)
+      # spacing tolerance does not affect tilt detection
+      geometry = self.computeGeometry(self.tiltedPositions(10, sliceSpacing, 15.0), epsilon=100.0)
+      self.assertTrue(geometry['tilted'])
+      geometry = self.computeGeometry(self.tiltedPositions(10, sliceSpacing, 0.05))
+      self.assertFalse(geometry['tilted'])
+      geometry = self.computeGeometry(self.tiltedPositions(10, sliceSpacing, 0.05), tiltEpsilon=0.01)
+      self.assertTrue(geometry['tilted'])
+
+  def test_SortedSliceGeometry(self):
+    geometry = self.computeGeometry([(0, 0, 5), (0, 0, 0), (0, 0, 2.5)],
+      pixelSpacingValues=['0.5\\0.75', '0.5\\0.7', '0.5\\0.75'])
+    self.assertEqual(geometry['positions'], [[0, 0, 0], [0, 0, 2.5], [0, 0, 5]])
+    self.assertEqual(geometry['orientations'], [[1, 0, 0, 0, 1, 0]] * 3)
+    self.assertEqual(geometry['pixelSpacings'], [[0.5, 0.7], [0.5, 0.75], [0.5, 0.75]])
+    geometry = self.computeGeometry([(0, 0, 5), (0, 0, 0)], pixelSpacingValues=['0.5\\0.75', ''])
+    self.assertIsNone(geometry['pixelSpacings'])
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import slicer
+from DICOMLib.DICOMWidgets import DICOMLoadingQueue
+
+
+class DICOMLoadingQueueTest(unittest.TestCase):
+  """Tests of loading DICOM loadables one by one with prefetching of files."""
+
+  class Loadable(object):
+    def __init__(self, name, files):
+      self.name = name
+      self.files = files
+
+  def setUp(self):
+    slicer.mrmlScene.Clear(0)
+    self.tempDir = tempfile.mkdtemp()
+    self.loadables = []
+    for loadableIndex in range(4):
+      filePath = os.path.join(self.tempDir, 'loadable%d.dcm' % loadableIndex)
+      with open(filePath, 'wb') as f:
+        f.write(os.urandom(1000))
+      self.loadables.append(self.Loadable('Loadable%d' % loadableIndex, [filePath]))
+    self.loadedNames = []
+    self.prefetchedFiles = []
+    self.completionResults = []
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def loadFunction(self, loadable, plugin, updateProgress):
+    self.loadedNames.append(loadable.name)
+    slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode', loadable.name)
+    return ''
+
+  def onCompleted(self, loadedNodeIDs, loadingResult):
+    self.completionResults.append((loadedNodeIDs, loadingResult))
+
+  def createQueue(self, loadFunction=None):
+    queue = DICOMLoadingQueue([(loadable, None) for loadable in self.loadables],
+      loadFunction if loadFunction else self.loadFunction, self.onCompleted)
+    originalReadFiles = queue.readFiles
+    def readFiles(filePaths):
+      self.prefetchedFiles.append(filePaths)
+      originalReadFiles(filePaths)
+    queue.readFiles = readFiles
+    return queue
+
+  def waitForQueue(self, queue, timeout=10.0):
+    startTime = time.time()
+    while queue.isRunning():
+      self.assertLess(time.time() - startTime, timeout, 'Loading did not complete')
+      slicer.app.processEvents()
+      time.sleep(0.01)
+
+  def loadedNodeNames(self, loadedNodeIDs):
+    return [slicer.mrmlScene.GetNodeByID(nodeID).GetName() for nodeID in loadedNodeIDs]
+
+  def test_LoadingOrder(self):
+    queue = self.createQueue()
+    queue.start()
+    self.waitForQueue(queue)
+    expectedNames = [loadable.name for loadable in self.loadables]
+    self.assertEqual(self.loadedNames, expectedNames)
+    # files of each loadable are read before it is loaded, in the same order
+    self.assertEqual(self.prefetchedFiles, [loadable.files for loadable in self.loadables])
+    self.assertEqual(len(self.completionResults), 1)
+    loadedNodeIDs, loadingResult = self.completionResults[0]
+    self.assertEqual(self.loadedNodeNames(loadedNodeIDs), expectedNames)
+    self.assertEqual(loadingResult, '')
+
+  def test_CancelDuringLoading(self):
+    def loadFunction(loadable, plugin, updateProgress):
+      if loadable is self.loadables[1]:
+        queue.cancel()
+      return self.loadFunction(loadable, plugin, updateProgress)
+    queue = self.createQueue(loadFunction)
+    queue.start()
+    self.waitForQueue(queue)
+    # the loadable that is being loaded is completed, the following ones are skipped
+    self.assertEqual(self.loadedNames, ['Loadable0', 'Loadable1'])
+    self.assertEqual(len(self.completionResults), 1)
+    self.assertEqual(self.loadedNodeNames(self.completionResults[0][0]), ['Loadable0', 'Loadable1'])
+
+  def test_CancelWhileReadingFiles(self):
+    readingAllowed = threading.Event()
+    queue = self.createQueue()
+    originalReadFiles = queue.readFiles
+    def readFiles(filePaths):
+      if filePaths == self.loadables[1].files:
+        readingAllowed.wait(10.0)
+      originalReadFiles(filePaths)
+    queue.readFiles = readFiles
+    queue.start()
+    try:
+      # wait until the first loadable is loaded and the queue is waiting for reading the files of the second one
+      startTime = time.time()
+      while not self.loadedNames:
+        self.assertLess(time.time() - startTime, 10.0, 'Loading did not start')
+        slicer.app.processEvents()
+        time.sleep(0.01)
+      # application events are processed while waiting
+      for iteration in range(10):
+        slicer.app.processEvents()
+        time.sleep(0.01)
+      self.assertTrue(queue.isRunning())
+      queue.cancel()
+      self.waitForQueue(queue)
+    finally:
+      readingAllowed.set()
+    self.assertEqual(self.loadedNames, ['Loadable0'])
+    self.assertEqual(len(self.completionResults), 1)
+    self.assertEqual(self.loadedNodeNames(self.completionResults[0][0]), ['Loadable0'])
@@ -3,6 +3,7 @@ import unittest
 from __main__ import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
 import logging
+from DICOMPatcherLib import *
 
 #
 # DICOMPatcher
@@ -88,6 +89,15 @@ class DICOMPatcherWidget(ScriptedLoadableModuleWidget):
       " from the patched DICOM files. There are many fields that can identify a patient, this function does not remove all of them.")
     parametersFormLayout.addRow("Partially anonymize", self.anonymizeDicomCheckBox)
 
+    self.numberOfWorkersSpinBox = qt.QSpinBox()
+    self.numberOfWorkersSpinBox.minimum = 1
+    self.numberOfWorkersSpinBox.maximum = max(1, qt.QThread.idealThreadCount())
+    self.numberOfWorkersSpinBox.value = 1
+    self.numberOfWorkersSpinBox.setToolTip("Number of processes that patch files in parallel."
+      " Each directory is processed by a single process. Use more than one process to speed up patching of"
+      " large number of directories.")
+    parametersFormLayout.addRow("Number of worker processes", self.numberOfWorkersSpinBox)
+
     #
     # Patch Button
     #
@@ -139,6 +149,7 @@ class DICOMPatcherWidget(ScriptedLoadableModuleWidget):
       self.statusLabel.plainText = ''
 
       self.logic.clearRules()
+      self.logic.numberOfWorkers = self.numberOfWorkersSpinBox.value
       if self.forceSamePatientNameIdInEachDirectoryCheckBox.checked:
         self.logic.addRule("ForceSamePatientNameIdInEachDirectory")
       if self.generateMissingIdsCheckBox.checked:
@@ -180,292 +191,6 @@ class DICOMPatcherWidget(ScriptedLoadableModuleWidget):
     self.statusLabel.appendPlainText(text)
     slicer.app.processEvents() # force update
 
-#
-# Patcher rules
-#
-
-class DICOMPatcherRule(object):
-  def __init__(self):
-    self.logCallback = None
-  def addLog(self, text):
-    logging.info(text)
-    if self.logCallback:
-      self.logCallback(text)
-  def processStart(self, inputRootDir, outputRootDir):
-    pass
-  def processDirectory(self, currentSubDir):
-    pass
-  def skipFile(self, filepath):
-    return False
-  def processDataSet(self, ds):
-    pass
-  def generateOutputFilePath(self, ds, filepath):
-    return filepath
-
-#
-#
-#
-
-class ForceSamePatientNameIdInEachDirectory(DICOMPatcherRule):
-  def __init__(self):
-    self.requiredTags = ['PatientName', 'PatientID']
-    self.eachFileIsSeparateSeries = False
-  def processStart(self, inputRootDir, outputRootDir):
-    self.patientIndex = 0
-  def processDirectory(self, currentSubDir):
-    self.firstFileInDirectory = True
-    self.patientIndex += 1
-  def processDataSet(self, ds):
-    import dicom
-    if self.firstFileInDirectory:
-      # Get patient name and ID for this folder and save it
-      self.firstFileInDirectory = False
-      if ds.PatientName == '':
-        self.patientName = "Unspecified Patient " + str(self.patientIndex)
-      if ds.PatientID == '':
-        self.patientID = dicom.UID.generate_uid(None)
-    # Set the same patient name and ID as the first file in the directory
-    ds.PatientName = self.patientName
-    ds.PatientID = self.patientID
-
-class GenerateMissingIDs(DICOMPatcherRule):
-  def __init__(self):
-    self.requiredTags = ['PatientName', 'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SeriesNumber']
-    self.eachFileIsSeparateSeries = False
-  def processStart(self, inputRootDir, outputRootDir):
-    import dicom
-    self.patientIDToRandomIDMap = {}
-    self.studyUIDToRandomUIDMap = {}
-    self.seriesUIDToRandomUIDMap = {}
-    self.numberOfSeriesInStudyMap = {}
-    # All files without a patient ID will be assigned to the same patient
-    self.randomPatientID = dicom.UID.generate_uid(None)
-  def processDirectory(self, currentSubDir):
-    import dicom
-    # Assume that all files in a directory belongs to the same study
-    self.randomStudyUID = dicom.UID.generate_uid(None)
-    # Assume that all files in a directory belongs to the same series
-    self.randomSeriesInstanceUID = dicom.UID.generate_uid(None)
-  def processDataSet(self, ds):
-    import dicom
-
-    for tag in self.requiredTags:
-      if not hasattr(ds,tag):
-        setattr(ds,tag,'')
-
-    # Generate a new SOPInstanceUID to avoid different files having the same SOPInstanceUID
-    ds.SOPInstanceUID = dicom.UID.generate_uid(None)
-
-    if ds.PatientName == '':
-      ds.PatientName = "Unspecified Patient"
-    if ds.PatientID == '':
-      ds.PatientID = self.randomPatientID
-    if ds.StudyInstanceUID == '':
-      ds.StudyInstanceUID = self.randomStudyUID
-    if ds.SeriesInstanceUID == '':
-      if self.eachFileIsSeparateSeries:
-        ds.SeriesInstanceUID = dicom.UID.generate_uid(None)
-      else:
-        ds.SeriesInstanceUID = self.randomSeriesInstanceUID
-
-    # Generate series number to make it easier to identify a sequence within a study
-    if ds.SeriesNumber == '':
-      if ds.StudyInstanceUID not in self.numberOfSeriesInStudyMap:
-        self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] = 0
-      self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] = self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] + 1
-      ds.SeriesNumber = self.numberOfSeriesInStudyMap[ds.StudyInstanceUID]
-
-#
-#
-#
-
-class RemoveDICOMDIR(DICOMPatcherRule):
-  def skipFile(self, filepath):
-    if os.path.basename(filepath) != 'DICOMDIR':
-      return False
-    self.addLog('DICOMDIR file is ignored (its contents may be inconsistent with the contents of the indexed DICOM files, therefore it is safer not to use it)')
-    return True
-
-#
-#
-#
-
-class FixPrivateMediaStorageSOPClassUID(DICOMPatcherRule):
-  def processDataSet(self, ds):
-    # DCMTK uses a specific UID for if storage SOP class UID is not specified.
-    # GDCM refuses to load images with a private SOP class UID, so we change it to CT storage
-    # (as that is the most commonly used imaging modality).
-    # We could make things nicer by allowing the user to specify a modality.
-    import dicom
-    DCMTKPrivateMediaStorageSOPClassUID = "1.2.276.0.7230010.3.1.0.1"
-    CTImageStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
-    if not hasattr(ds.file_meta, 'MediaStorageSOPClassUID') or ds.file_meta.MediaStorageSOPClassUID == DCMTKPrivateMediaStorageSOPClassUID:
-      self.addLog("DCMTK private MediaStorageSOPClassUID found. Replace it with CT media storage SOP class UID.")
-      ds.file_meta.MediaStorageSOPClassUID = CTImageStorageSOPClassUID
-
-    if hasattr(ds, 'SOPClassUID') and ds.SOPClassUID == DCMTKPrivateMediaStorageSOPClassUID:
-      ds.SOPClassUID = CTImageStorageSOPClassUID
-#
-#
-#
-
-class AddMissingSliceSpacingToMultiframe(DICOMPatcherRule):
-  """Add missing slice spacing info to multiframe files"""
-  def processDataSet(self, ds):
-    import dicom
-
-    if not hasattr(ds,'NumberOfFrames'):
-      return
-    numberOfFrames = ds.NumberOfFrames
-    if numberOfFrames <= 1:
-      return
-
-    # Multi-frame sequence, we may need to add slice positions
-
-    # Error in Dolphin 3D CBCT scanners, they store multiple frames but they keep using CTImageStorage as storage class
-    if ds.SOPClassUID == '1.2.840.10008.5.1.4.1.1.2': # Computed Tomography Image IOD
-      ds.SOPClassUID = '1.2.840.10008.5.1.4.1.1.2.1' # Enhanced CT Image IOD
-
-    sliceStartPosition = ds.ImagePositionPatient if hasattr(ds,'ImagePositionPatient') else [0,0,0]
-    sliceAxes = ds.ImageOrientationPatient if hasattr(ds,'ImagePositionPatient') else [1,0,0,0,1,0]
-    x = sliceAxes[:3]
-    y = sliceAxes[3:]
-    z = [x[1] * y[2] - x[2] * y[1], x[2] * y[0] - x[0] * y[2], x[0] * y[1] - x[1] * y[0]] # cross(x,y)
-    sliceSpacing = ds.SliceThickness if hasattr(ds,'SliceThickness') else 1.0
-    pixelSpacing = ds.PixelSpacing if hasattr(ds,'PixelSpacing') else [1.0, 1.0]
-
-    if not (dicom.tag.Tag(0x5200,0x9229) in ds):
-
-      # (5200,9229) SQ (Sequence with undefined length #=1)     # u/l, 1 SharedFunctionalGroupsSequence
-      #   (0020,9116) SQ (Sequence with undefined length #=1)     # u/l, 1 PlaneOrientationSequence
-      #       (0020,0037) DS [1.00000\0.00000\0.00000\0.00000\1.00000\0.00000] #  48, 6 ImageOrientationPatient
-      #   (0028,9110) SQ (Sequence with undefined length #=1)     # u/l, 1 PixelMeasuresSequence
-      #       (0018,0050) DS [3.00000]                                #   8, 1 SliceThickness
-      #       (0028,0030) DS [0.597656\0.597656]                      #  18, 2 PixelSpacing
-
-      planeOrientationDataSet = dicom.dataset.Dataset()
-      planeOrientationDataSet.ImageOrientationPatient = sliceAxes
-      planeOrientationSequence = dicom.sequence.Sequence()
-      planeOrientationSequence.insert(dicom.tag.Tag(0x0020,0x9116),planeOrientationDataSet)
-
-      pixelMeasuresDataSet = dicom.dataset.Dataset()
-      pixelMeasuresDataSet.SliceThickness = sliceSpacing
-      pixelMeasuresDataSet.PixelSpacing = pixelSpacing
-      pixelMeasuresSequence = dicom.sequence.Sequence()
-      pixelMeasuresSequence.insert(dicom.tag.Tag(0x0028,0x9110),pixelMeasuresDataSet)
-
-      sharedFunctionalGroupsDataSet = dicom.dataset.Dataset()
-      sharedFunctionalGroupsDataSet.PlaneOrientationSequence = planeOrientationSequence
-      sharedFunctionalGroupsDataSet.PixelMeasuresSequence = pixelMeasuresSequence
-      sharedFunctionalGroupsSequence = dicom.sequence.Sequence()
-      sharedFunctionalGroupsSequence.insert(dicom.tag.Tag(0x5200,0x9229),sharedFunctionalGroupsDataSet)
-      ds.SharedFunctionalGroupsSequence = sharedFunctionalGroupsSequence
-
-    if not (dicom.tag.Tag(0x5200,0x9230) in ds):
-
-      #(5200,9230) SQ (Sequence with undefined length #=54)    # u/l, 1 PerFrameFunctionalGroupsSequence
-      #  (0020,9113) SQ (Sequence with undefined length #=1)     # u/l, 1 PlanePositionSequence
-      #    (0020,0032) DS [-94.7012\-312.701\-806.500]             #  26, 3 ImagePositionPatient
-      #  (0020,9113) SQ (Sequence with undefined length #=1)     # u/l, 1 PlanePositionSequence
-      #    (0020,0032) DS [-94.7012\-312.701\-809.500]             #  26, 3 ImagePositionPatient
-      #  ...
-
-      perFrameFunctionalGroupsSequence = dicom.sequence.Sequence()
-
-      for frameIndex in range(numberOfFrames):
-        planePositionDataSet = dicom.dataset.Dataset()
-        slicePosition = [
-          sliceStartPosition[0]+frameIndex*z[0]*sliceSpacing,
-          sliceStartPosition[1]+frameIndex*z[1]*sliceSpacing,
-          sliceStartPosition[2]+frameIndex*z[2]*sliceSpacing]
-        planePositionDataSet.ImagePositionPatient = slicePosition
-        planePositionSequence = dicom.sequence.Sequence()
-        planePositionSequence.insert(dicom.tag.Tag(0x0020,0x9113),planePositionDataSet)
-        perFrameFunctionalGroupsDataSet = dicom.dataset.Dataset()
-        perFrameFunctionalGroupsDataSet.PlanePositionSequence = planePositionSequence
-        perFrameFunctionalGroupsSequence.insert(dicom.tag.Tag(0x5200,0x9230),perFrameFunctionalGroupsDataSet)
-
-      ds.PerFrameFunctionalGroupsSequence = perFrameFunctionalGroupsSequence
-
-#
-#
-#
-
-class Anonymize(DICOMPatcherRule):
-  def __init__(self):
-    self.requiredTags = ['PatientName', 'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SeriesNumber']
-  def processStart(self, inputRootDir, outputRootDir):
-    import dicom
-    self.patientIDToRandomIDMap = {}
-    self.studyUIDToRandomUIDMap = {}
-    self.seriesUIDToRandomUIDMap = {}
-    self.numberOfSeriesInStudyMap = {}
-    # All files without a patient ID will be assigned to the same patient
-    self.randomPatientID = dicom.UID.generate_uid(None)
-  def processDirectory(self, currentSubDir):
-    import dicom
-    # Assume that all files in a directory belongs to the same study
-    self.randomStudyUID = dicom.UID.generate_uid(None)
-    # Assume that all files in a directory belongs to the same series
-    self.randomSeriesInstanceUID = dicom.UID.generate_uid(None)
-  def processDataSet(self, ds):
-    import dicom
-
-    ds.StudyDate = ''
-    ds.StudyTime = ''
-    ds.ContentDate = ''
-    ds.ContentTime = ''
-    ds.AccessionNumber = ''
-    ds.ReferringPhysiciansName = ''
-    ds.PatientsBirthDate = ''
-    ds.PatientsSex = ''
-    ds.StudyID = ''
-    ds.PatientName = "Unspecified Patient"
-
-    # replace ids with random values - re-use if we have seen them before
-    if ds.PatientID not in self.patientIDToRandomIDMap:
-      self.patientIDToRandomIDMap[ds.PatientID] = dicom.UID.generate_uid(None)
-    ds.PatientID = self.patientIDToRandomIDMap[ds.PatientID]
-    if ds.StudyInstanceUID not in self.studyUIDToRandomUIDMap:
-      self.studyUIDToRandomUIDMap[ds.StudyInstanceUID] = dicom.UID.generate_uid(None)
-    ds.StudyInstanceUID = self.studyUIDToRandomUIDMap[ds.StudyInstanceUID]
-    if ds.SeriesInstanceUID not in self.seriesUIDToRandomUIDMap:
-      self.seriesUIDToRandomUIDMap[ds.SeriesInstanceUID] = dicom.UID.generate_uid(None)
-    ds.SeriesInstanceUID = self.seriesUIDToRandomUIDMap[ds.SeriesInstanceUID]
-
-#
-#
-#
-
-class NormalizeFileNames(DICOMPatcherRule):
-  def processStart(self, inputRootDir, outputRootDir):
-    self.inputRootDir = inputRootDir
-    self.outputRootDir = outputRootDir
-    self.patientNameIDToFolderMap = {}
-    self.studyUIDToFolderMap = {}
-    self.seriesUIDToFolderMap = {}
-    # Number of files or folder in the specified folder
-    self.numberOfItemsInFolderMap = {}
-  def getNextItemName(self, prefix, root):
-    numberOfFilesInFolder = self.numberOfItemsInFolderMap[root] if root in self.numberOfItemsInFolderMap else 0
-    self.numberOfItemsInFolderMap[root] = numberOfFilesInFolder+1
-    return "{0}{1:03d}".format(prefix, numberOfFilesInFolder)
-  def generateOutputFilePath(self, ds, filepath):
-    folderName = ""
-    patientNameID = str(ds.PatientName)+"*"+ds.PatientID
-    if patientNameID not in self.patientNameIDToFolderMap:
-      self.patientNameIDToFolderMap[patientNameID] = self.getNextItemName("pa", folderName)
-    folderName += self.patientNameIDToFolderMap[patientNameID]
-    if ds.StudyInstanceUID not in self.studyUIDToFolderMap:
-      self.studyUIDToFolderMap[ds.StudyInstanceUID] = self.getNextItemName("st", folderName)
-    folderName += "/" + self.studyUIDToFolderMap[ds.StudyInstanceUID]
-    if ds.SeriesInstanceUID not in self.seriesUIDToFolderMap:
-      self.seriesUIDToFolderMap[ds.SeriesInstanceUID] = self.getNextItemName("se", folderName)
-    folderName += "/" +self.seriesUIDToFolderMap[ds.SeriesInstanceUID]
-    prefix = ds.Modality.lower() if hasattr(ds, 'Modality') else ""
-    filePath = self.outputRootDir + "/" + folderName + "/" + self.getNextItemName(prefix, folderName)+".dcm"
-    return filePath
-
 #
 # DICOMPatcherLogic
 #
@@ -484,6 +209,8 @@ class DICOMPatcherLogic(ScriptedLoadableModuleLogic):
     ScriptedLoadableModuleLogic.__init__(self)
     self.logCallback = None
     self.patchingRules = []
+    # Number of processes used for patching. If larger than 1 then files are patched in parallel.
+    self.numberOfWorkers = 1
 
   def clearRules(self):
     self.patchingRules = []
@@ -516,8 +243,6 @@ class DICOMPatcherLogic(ScriptedLoadableModuleLogic):
     [1] https://github.com/commontk/CTK/blob/16aa09540dcb59c6eafde4d9a88dfee1f0948edc/Libs/DICOM/Core/ctkDICOMDatabase.cpp#L1283-L1287
     """
 
-    import dicom
-
     self.addLog('DICOM patching started...')
     logging.debug('DICOM patch input directory: '+inputDirPath)
     logging.debug('DICOM patch output directory: '+outputDirPath)
@@ -526,6 +251,17 @@ class DICOMPatcherLogic(ScriptedLoadableModuleLogic):
       rule.logCallback = self.addLog
       rule.processStart(inputDirPath, outputDirPath)
 
+    pythonExecutable = self.getPythonExecutable() if self.numberOfWorkers > 1 else None
+    if self.numberOfWorkers > 1 and not pythonExecutable:
+      self.addLog('Python executable for worker processes is not found. Patching files sequentially.')
+    if pythonExecutable:
+      self.patchDicomDirParallel(inputDirPath, outputDirPath, pythonExecutable)
+    else:
+      self.patchDicomDirSequential(inputDirPath, outputDirPath)
+
+    self.addLog('DICOM patching completed. Patched files are written to:\n{0}'.format(outputDirPath))
+
+  def patchDicomDirSequential(self, inputDirPath, outputDirPath):
     for root, subFolders, files in os.walk(inputDirPath):
 
       currentSubDir = os.path.relpath(root, inputDirPath)
@@ -538,43 +274,157 @@ class DICOMPatcherLogic(ScriptedLoadableModuleLogic):
       for file in files:
         filePath = os.path.join(root,file)
         self.addLog('Examining %s...' % os.path.join(currentSubDir,file))
+        patchedFilePath = os.path.abspath(os.path.join(rootOutput,file))
+        patchedFilePath, ds = patchFile(self.patchingRules, filePath, patchedFilePath, self.addLog)
+        if patchedFilePath:
+          self.addLog('  Created DICOM file: %s' % patchedFilePath)
 
-        skipFileRequestingRule = None
-        for rule in self.patchingRules:
-          if rule.skipFile(currentSubDir):
-            skipFileRequestingRule = rule
-            break
-        if skipFileRequestingRule:
-          self.addLog('  Rule '+rule.__class__.__name__+' requested to skip this file.')
-          continue
-
-        try:
-          ds = dicom.read_file(filePath)
-        except (IOError, dicom.filereader.InvalidDicomError):
-          self.addLog('  Not DICOM file. Skipped.')
-          continue
+  def getPythonExecutable(self):
+    """Get Python interpreter that can run patching in worker processes.
+    Slicer application executable cannot be used for this, as it would start the full application.
+    """
+    import shutil
+    executableName = 'PythonSlicer.exe' if os.name == 'nt' else 'PythonSlicer'
+    executablePath = os.path.join(slicer.app.slicerHome, 'bin', executableName)
+    if os.path.isfile(executablePath):
+      return executablePath
+    return shutil.which('PythonSlicer')
+
+  def patchDicomDirParallel(self, inputDirPath, outputDirPath, pythonExecutable):
+    """Patch files in a pool of worker processes.
+    Work is distributed by directory, because rules may store state for each directory
+    (e.g., ForceSamePatientNameIdInEachDirectory). Output file path generation of rules that
+    depend on all previously processed files (e.g., NormalizeFileNames) is performed in this
+    process, in the same order as in sequential mode. Series numbers generated by GenerateMissingIDs
+    are only unique within the files processed by the same worker.
+    Log messages are added in batches, with the current throughput.
+    """
+    import collections
+    import multiprocessing
+    import pickle
+    import shutil
+    import tempfile
+    import time
 
-        self.addLog('  Patching...')
+    deferredRules = [rule for rule in self.patchingRules if rule.outputFilePathTags is not None]
+    if deferredRules:
+      if not os.path.exists(outputDirPath):
+        os.makedirs(outputDirPath)
+      # files are written to a temporary location and moved to their final location when the path is known
+      workerOutputDirPath = tempfile.mkdtemp(prefix=".DICOMPatcher-", dir=outputDirPath)
+    else:
+      workerOutputDirPath = outputDirPath
 
-        for rule in self.patchingRules:
-          rule.processDataSet(ds)
+    # Files written by the workers must not be patched again if output directory is inside the input directory
+    skipWorkerOutputDir = self.isSubdirectory(workerOutputDirPath, inputDirPath)
 
-        patchedFilePath = os.path.abspath(os.path.join(rootOutput,file))
+    for rule in self.patchingRules:
+      rule.logCallback = None
+    # Rules that generate output file path are run in this process, therefore only the state of
+    # the other rules has to be sent to the workers for each directory
+    workerRules = [rule for rule in self.patchingRules if rule.outputFilePathTags is None]
+
+    # Executable of spawned processes is an interpreter-wide setting, restore it when the pool is shut down
+    import multiprocessing.spawn
+    originalExecutable = multiprocessing.spawn.get_executable()
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(pythonExecutable)
+    pool = None
+
+    startTime = time.time()
+    lastLogTime = startTime
+    numberOfProcessedFiles = 0
+    numberOfPatchedFiles = 0
+    messages = []
+    # results are collected in the order of submission, to generate the same output file paths as in sequential mode
+    pendingResults = collections.deque()
+    try:
+      # All rules are serialized once, each worker process deserializes them in its initializer
+      pool = context.Pool(self.numberOfWorkers, initializePatchDirectoryFilesWorker,
+        (pickle.dumps(self.patchingRules),))
+      for root, subFolders, files in os.walk(inputDirPath):
+        if skipWorkerOutputDir and self.isSubdirectory(root, workerOutputDirPath, True):
+          continue
+        currentSubDir = os.path.relpath(root, inputDirPath)
         for rule in self.patchingRules:
-          patchedFilePath = rule.generateOutputFilePath(ds, patchedFilePath)
-
-        ######################################################
-        # Write
-
-        dirName = os.path.dirname(patchedFilePath)
-        if not os.path.exists(dirName):
-          os.makedirs(dirName)
-
-        self.addLog('  Writing DICOM...')
-        dicom.write_file(patchedFilePath, ds)
-        self.addLog('  Created DICOM file: %s' % patchedFilePath)
+          rule.processDirectory(currentSubDir)
+        # Rule states are serialized now to take a snapshot of their current directory state
+        ruleStates = pickle.dumps([rule.__dict__ for rule in workerRules])
+        task = (ruleStates, inputDirPath, workerOutputDirPath, currentSubDir, files)
+        pendingResults.append(pool.apply_async(patchDirectoryFilesTask, (task,)))
+
+        # Limit the number of queued directories, so that directory walk does not need to be completed before patching
+        while pendingResults and (len(pendingResults) > 2 * self.numberOfWorkers or pendingResults[0].ready()):
+          results = pendingResults.popleft().get()
+          numberOfProcessedFiles += len(results)
+          numberOfPatchedFiles += self.finalizePatchedFiles(results, deferredRules, messages)
+          currentTime = time.time()
+          if currentTime - lastLogTime > 1.0:
+            messages.append('Processed {0} files ({1:.1f} files/s)'.format(
+              numberOfProcessedFiles, numberOfProcessedFiles / (currentTime - startTime)))
+            self.addLog('\n'.join(messages))
+            messages = []
+            lastLogTime = currentTime
+
+      while pendingResults:
+        results = pendingResults.popleft().get()
+        numberOfProcessedFiles += len(results)
+        numberOfPatchedFiles += self.finalizePatchedFiles(results, deferredRules, messages)
+      pool.close()
+    finally:
+      if pool:
+        pool.terminate()
+        pool.join()
+      context.set_executable(originalExecutable)
+      for rule in self.patchingRules:
+        rule.logCallback = self.addLog
+      if deferredRules:
+        shutil.rmtree(workerOutputDirPath, ignore_errors=True)
+
+    elapsedTime = max(time.time() - startTime, 1e-6)
+    messages.append('Patched {0} of {1} files in {2:.1f}s ({3:.1f} files/s)'.format(
+      numberOfPatchedFiles, numberOfProcessedFiles, elapsedTime, numberOfProcessedFiles / elapsedTime))
+    self.addLog('\n'.join(messages))
+
+  @staticmethod
+  def isSubdirectory(path, parentPath, allowEqual=False):
+    """Returns True if path is inside parentPath directory. Paths are compared by components,
+    therefore /data/x2 is not inside /data/x. If allowEqual is True then True is returned
+    for the same path, too.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    parentPath = os.path.normcase(os.path.abspath(parentPath))
+    if path == parentPath:
+      return allowEqual
+    try:
+      return os.path.commonpath([path, parentPath]) == parentPath
+    except ValueError:
+      # paths on different drives
+      return False
 
-    self.addLog('DICOM patching completed. Patched files are written to:\n{0}'.format(outputDirPath))
+  def finalizePatchedFiles(self, results, deferredRules, messages):
+    """Generate output file path for files patched by worker processes using rules that could not
+    be run in worker processes and move the files there. Log messages are appended to messages.
+    Returns number of patched files.
+    """
+    import dicom
+    numberOfPatchedFiles = 0
+    for patchedFilePath, tagValues, fileMessages in results:
+      messages.extend(fileMessages)
+      if not patchedFilePath:
+        continue
+      if deferredRules:
+        ds = dicom.dataset.Dataset()
+        for tag, value in tagValues.items():
+          setattr(ds, tag, value)
+        finalFilePath = patchedFilePath
+        for rule in deferredRules:
+          finalFilePath = rule.generateOutputFilePath(ds, finalFilePath)
+        os.renames(patchedFilePath, finalFilePath)
+        patchedFilePath = finalFilePath
+      numberOfPatchedFiles += 1
+      messages.append('  Created DICOM file: %s' % patchedFilePath)
+    return numberOfPatchedFiles
 
   def importDicomDir(self, outputDirPath):
     """
@@ -608,6 +458,10 @@ class DICOMPatcherTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_DICOMPatcher1()
+    self.setUp()
+    self.test_DICOMPatcherSubdirectory()
+    self.setUp()
+    self.test_DICOMPatcherParallel()
 
   def test_DICOMPatcher1(self):
     """ Ideally you should have several levels of tests.  At the lowest level
@@ -681,3 +535,87 @@ class DICOMPatcherTest(ScriptedLoadableModuleTest):
 
     import shutil
     shutil.rmtree(testDir)
+
+  def writeTestDICOMFile(self, filePath, patientName, patientID):
+    import dicom
+    file_meta = dicom.dataset.Dataset()
+    file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'  # CT Image Storage
+    file_meta.MediaStorageSOPInstanceUID = "1.2.3"
+    file_meta.ImplementationClassUID = "1.2.3.4"
+    ds = dicom.dataset.FileDataset(filePath, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.PatientName = patientName
+    ds.PatientID = patientID
+    ds.is_little_endian = True
+    ds.is_implicit_VR = True
+    ds.save_as(filePath)
+
+  def getPatchedFiles(self, outputDirPath):
+    """Returns list of (relative file path, patient name) of all files in the output directory."""
+    import dicom
+    patchedFiles = []
+    for root, subFolders, files in os.walk(outputDirPath):
+      for file in files:
+        filePath = os.path.join(root, file)
+        ds = dicom.read_file(filePath)
+        patchedFiles.append((os.path.relpath(filePath, outputDirPath).replace('\\', '/'), str(ds.PatientName)))
+    return sorted(patchedFiles)
+
+  def test_DICOMPatcherSubdirectory(self):
+    self.delayDisplay("Test subdirectory check")
+    isSubdirectory = DICOMPatcherLogic.isSubdirectory
+    self.assertTrue(isSubdirectory('/data/x/y', '/data/x'))
+    self.assertTrue(isSubdirectory('/data/x/y/z', '/data/x'))
+    self.assertFalse(isSubdirectory('/data/x2', '/data/x'))
+    self.assertFalse(isSubdirectory('/data/x', '/data/x/y'))
+    self.assertFalse(isSubdirectory('/data/x', '/data/x'))
+    self.assertFalse(isSubdirectory('/data/x/', '/data/x'))
+    self.assertTrue(isSubdirectory('/data/x', '/data/x', True))
+    self.assertFalse(isSubdirectory('/data/x2', '/data/x', True))
+
+  def test_DICOMPatcherParallel(self):
+    """Patch files in worker processes and compare the result with sequential patching."""
+
+    logic = DICOMPatcherLogic()
+    if not logic.getPythonExecutable():
+      self.delayDisplay('Python executable for worker processes is not found. Parallel patching is not tested.')
+      return
+
+    import tempfile
+    testDir = tempfile.mkdtemp(prefix="DICOMPatcherTest-", dir=slicer.app.temporaryPath)
+    inputTestDir = testDir+"/input"
+
+    self.delayDisplay("Generate test files")
+    for patientIndex in range(3):
+      patientDir = inputTestDir+"/patient{0}".format(patientIndex)
+      os.makedirs(patientDir)
+      for fileIndex in range(4):
+        self.writeTestDICOMFile(patientDir+"/image{0}.dcm".format(fileIndex), "Test^Patient{0}".format(patientIndex), "")
+      with open(patientDir+"/NonDICOMFile.txt", "w") as testFileNonDICOM:
+        testFileNonDICOM.write("This is not a DICOM file")
+
+    patchedFiles = {}
+    # Output directory inside the input directory is tested in parallel mode,
+    # to make sure that files written by the workers are not patched again
+    for numberOfWorkers, outputTestDir in [(1, testDir+"/outputSequential"), (2, testDir+"/outputParallel"),
+        (2, inputTestDir+"/output")]:
+      self.delayDisplay("Patch input files using {0} worker(s) into {1}".format(numberOfWorkers, outputTestDir))
+      logic = DICOMPatcherLogic()
+      logic.numberOfWorkers = numberOfWorkers
+      logic.addRule("GenerateMissingIDs")
+      logic.addRule("RemoveDICOMDIR")
+      logic.addRule("FixPrivateMediaStorageSOPClassUID")
+      logic.addRule("NormalizeFileNames")
+      logic.patchDicomDir(inputTestDir, outputTestDir)
+      patchedFiles[outputTestDir] = self.getPatchedFiles(outputTestDir)
+
+    self.delayDisplay("Verify generated files")
+    sequentialFiles = patchedFiles[testDir+"/outputSequential"]
+    self.assertEqual(len(sequentialFiles), 12)
+    self.assertEqual(patchedFiles[testDir+"/outputParallel"], sequentialFiles)
+    self.assertEqual(patchedFiles[inputTestDir+"/output"], sequentialFiles)
+    # No temporary worker output directory is left behind
+    self.assertFalse([name for name in os.listdir(testDir+"/outputParallel") if name.startswith(".DICOMPatcher-")])
+
+    self.delayDisplay("Clean up")
+    import shutil
+    shutil.rmtree(testDir)
@@ -0,0 +1,395 @@
+import os
+import logging
+
+#
+# Patcher rules
+#
+
+class DICOMPatcherRule(object):
+  #: DICOM attributes that generateOutputFilePath uses. If it is set, the output file path depends on
+  #: all previously processed files. In parallel mode such rules are then run in the main process,
+  #: in the order as files are found, using a data set that only contains these attributes.
+  outputFilePathTags = None
+  def __init__(self):
+    self.logCallback = None
+  def addLog(self, text):
+    logging.info(text)
+    if self.logCallback:
+      self.logCallback(text)
+  def processStart(self, inputRootDir, outputRootDir):
+    pass
+  def processDirectory(self, currentSubDir):
+    pass
+  def skipFile(self, filepath):
+    return False
+  def processDataSet(self, ds):
+    pass
+  def generateOutputFilePath(self, ds, filepath):
+    return filepath
+
+#
+#
+#
+
+class ForceSamePatientNameIdInEachDirectory(DICOMPatcherRule):
+  def __init__(self):
+    self.requiredTags = ['PatientName', 'PatientID']
+    self.eachFileIsSeparateSeries = False
+  def processStart(self, inputRootDir, outputRootDir):
+    self.patientIndex = 0
+  def processDirectory(self, currentSubDir):
+    self.firstFileInDirectory = True
+    self.patientIndex += 1
+  def processDataSet(self, ds):
+    import dicom
+    if self.firstFileInDirectory:
+      # Get patient name and ID for this folder and save it
+      self.firstFileInDirectory = False
+      if ds.PatientName == '':
+        self.patientName = "Unspecified Patient " + str(self.patientIndex)
+      if ds.PatientID == '':
+        self.patientID = dicom.UID.generate_uid(None)
+    # Set the same patient name and ID as the first file in the directory
+    ds.PatientName = self.patientName
+    ds.PatientID = self.patientID
+
+class GenerateMissingIDs(DICOMPatcherRule):
+  def __init__(self):
+    self.requiredTags = ['PatientName', 'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SeriesNumber']
+    self.eachFileIsSeparateSeries = False
+  def processStart(self, inputRootDir, outputRootDir):
+    import dicom
+    self.patientIDToRandomIDMap = {}
+    self.studyUIDToRandomUIDMap = {}
+    self.seriesUIDToRandomUIDMap = {}
+    self.numberOfSeriesInStudyMap = {}
+    # All files without a patient ID will be assigned to the same patient
+    self.randomPatientID = dicom.UID.generate_uid(None)
+  def processDirectory(self, currentSubDir):
+    import dicom
+    # Assume that all files in a directory belongs to the same study
+    self.randomStudyUID = dicom.UID.generate_uid(None)
+    # Assume that all files in a directory belongs to the same series
+    self.randomSeriesInstanceUID = dicom.UID.generate_uid(None)
+  def processDataSet(self, ds):
+    import dicom
+
+    for tag in self.requiredTags:
+      if not hasattr(ds,tag):
+        setattr(ds,tag,'')
+
+    # Generate a new SOPInstanceUID to avoid different files having the same SOPInstanceUID
+    ds.SOPInstanceUID = dicom.UID.generate_uid(None)
+
+    if ds.PatientName == '':
+      ds.PatientName = "Unspecified Patient"
+    if ds.PatientID == '':
+      ds.PatientID = self.randomPatientID
+    if ds.StudyInstanceUID == '':
+      ds.StudyInstanceUID = self.randomStudyUID
+    if ds.SeriesInstanceUID == '':
+      if self.eachFileIsSeparateSeries:
+        ds.SeriesInstanceUID = dicom.UID.generate_uid(None)
+      else:
+        ds.SeriesInstanceUID = self.randomSeriesInstanceUID
+
+    # Generate series number to make it easier to identify a sequence within a study
+    if ds.SeriesNumber == '':
+      if ds.StudyInstanceUID not in self.numberOfSeriesInStudyMap:
+        self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] = 0
+      self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] = self.numberOfSeriesInStudyMap[ds.StudyInstanceUID] + 1
+      ds.SeriesNumber = self.numberOfSeriesInStudyMap[ds.StudyInstanceUID]
+
+#
+#
+#
+
+class RemoveDICOMDIR(DICOMPatcherRule):
+  def skipFile(self, filepath):
+    if os.path.basename(filepath) != 'DICOMDIR':
+      return False
+    self.addLog('DICOMDIR file is ignored (its contents may be inconsistent with the contents of the indexed DICOM files, therefore it is safer not to use it)')
+    return True
+
+#
+#
+#
+
+class FixPrivateMediaStorageSOPClassUID(DICOMPatcherRule):
+  def processDataSet(self, ds):
+    # DCMTK uses a specific UID for if storage SOP class UID is not specified.
+    # GDCM refuses to load images with a private SOP class UID, so we change it to CT storage
+    # (as that is the most commonly used imaging modality).
+    # We could make things nicer by allowing the user to specify a modality.
+    import dicom
+    DCMTKPrivateMediaStorageSOPClassUID = "1.2.276.0.7230010.3.1.0.1"
+    CTImageStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    if not hasattr(ds.file_meta, 'MediaStorageSOPClassUID') or ds.file_meta.MediaStorageSOPClassUID == DCMTKPrivateMediaStorageSOPClassUID:
+      self.addLog("DCMTK private MediaStorageSOPClassUID found. Replace it with CT media storage SOP class UID.")
+      ds.file_meta.MediaStorageSOPClassUID = CTImageStorageSOPClassUID
+
+    if hasattr(ds, 'SOPClassUID') and ds.SOPClassUID == DCMTKPrivateMediaStorageSOPClassUID:
+      ds.SOPClassUID = CTImageStorageSOPClassUID
+#
+#
+#
+
+class AddMissingSliceSpacingToMultiframe(DICOMPatcherRule):
+  """Add missing slice spacing info to multiframe files"""
+  def processDataSet(self, ds):
+    import dicom
+
+    if not hasattr(ds,'NumberOfFrames'):
+      return
+    numberOfFrames = ds.NumberOfFrames
+    if numberOfFrames <= 1:
+      return
+
+    # Multi-frame sequence, we may need to add slice positions
+
+    # Error in Dolphin 3D CBCT scanners, they store multiple frames but they keep using CTImageStorage as storage class
+    if ds.SOPClassUID == '1.2.840.10008.5.1.4.1.1.2': # Computed Tomography Image IOD
+      ds.SOPClassUID = '1.2.840.10008.5.1.4.1.1.2.1' # Enhanced CT Image IOD
+
+    sliceStartPosition = ds.ImagePositionPatient if hasattr(ds,'ImagePositionPatient') else [0,0,0]
+    sliceAxes = ds.ImageOrientationPatient if hasattr(ds,'ImagePositionPatient') else [1,0,0,0,1,0]
+    x = sliceAxes[:3]
+    y = sliceAxes[3:]
+    z = [x[1] * y[2] - x[2] * y[1], x[2] * y[0] - x[0] * y[2], x[0] * y[1] - x[1] * y[0]] # cross(x,y)
+    sliceSpacing = ds.SliceThickness if hasattr(ds,'SliceThickness') else 1.0
+    pixelSpacing = ds.PixelSpacing if hasattr(ds,'PixelSpacing') else [1.0, 1.0]
+
+    if not (dicom.tag.Tag(0x5200,0x9229) in ds):
+
+      # (5200,9229) SQ (Sequence with undefined length #=1)     # u/l, 1 SharedFunctionalGroupsSequence
+      #   (0020,9116) SQ (Sequence with undefined length #=1)     # u/l, 1 PlaneOrientationSequence
+      #       (0020,0037) DS [1.00000\0.00000\0.00000\0.00000\1.00000\0.00000] #  48, 6 ImageOrientationPatient
+      #   (0028,9110) SQ (Sequence with undefined length #=1)     # u/l, 1 PixelMeasuresSequence
+      #       (0018,0050) DS [3.00000]                                #   8, 1 SliceThickness
+      #       (0028,0030) DS [0.597656\0.597656]                      #  18, 2 PixelSpacing
+
+      planeOrientationDataSet = dicom.dataset.Dataset()
+      planeOrientationDataSet.ImageOrientationPatient = sliceAxes
+      planeOrientationSequence = dicom.sequence.Sequence()
+      planeOrientationSequence.insert(dicom.tag.Tag(0x0020,0x9116),planeOrientationDataSet)
+
+      pixelMeasuresDataSet = dicom.dataset.Dataset()
+      pixelMeasuresDataSet.SliceThickness = sliceSpacing
+      pixelMeasuresDataSet.PixelSpacing = pixelSpacing
+      pixelMeasuresSequence = dicom.sequence.Sequence()
+      pixelMeasuresSequence.insert(dicom.tag.Tag(0x0028,0x9110),pixelMeasuresDataSet)
+
+      sharedFunctionalGroupsDataSet = dicom.dataset.Dataset()
+      sharedFunctionalGroupsDataSet.PlaneOrientationSequence = planeOrientationSequence
+      sharedFunctionalGroupsDataSet.PixelMeasuresSequence = pixelMeasuresSequence
+      sharedFunctionalGroupsSequence = dicom.sequence.Sequence()
+      sharedFunctionalGroupsSequence.insert(dicom.tag.Tag(0x5200,0x9229),sharedFunctionalGroupsDataSet)
+      ds.SharedFunctionalGroupsSequence = sharedFunctionalGroupsSequence
+
+    if not (dicom.tag.Tag(0x5200,0x9230) in ds):
+
+      #(5200,9230) SQ (Sequence with undefined length #=54)    # u/l, 1 PerFrameFunctionalGroupsSequence
+      #  (0020,9113) SQ (Sequence with undefined length #=1)     # u/l, 1 PlanePositionSequence
+      #    (0020,0032) DS [-94.7012\-312.701\-806.500]             #  26, 3 ImagePositionPatient
+      #  (0020,9113) SQ (Sequence with undefined length #=1)     # u/l, 1 PlanePositionSequence
+      #    (0020,0032) DS [-94.7012\-312.701\-809.500]             #  26, 3 ImagePositionPatient
+      #  ...
+
+      perFrameFunctionalGroupsSequence = dicom.sequence.Sequence()
+
+      for frameIndex in range(numberOfFrames):
+        planePositionDataSet = dicom.dataset.Dataset()
+        slicePosition = [
+          sliceStartPosition[0]+frameIndex*z[0]*sliceSpacing,
+          sliceStartPosition[1]+frameIndex*z[1]*sliceSpacing,
+          sliceStartPosition[2]+frameIndex*z[2]*sliceSpacing]
+        planePositionDataSet.ImagePositionPatient = slicePosition
+        planePositionSequence = dicom.sequence.Sequence()
+        planePositionSequence.insert(dicom.tag.Tag(0x0020,0x9113),planePositionDataSet)
+        perFrameFunctionalGroupsDataSet = dicom.dataset.Dataset()
+        perFrameFunctionalGroupsDataSet.PlanePositionSequence = planePositionSequence
+        perFrameFunctionalGroupsSequence.insert(dicom.tag.Tag(0x5200,0x9230),perFrameFunctionalGroupsDataSet)
+
+      ds.PerFrameFunctionalGroupsSequence = perFrameFunctionalGroupsSequence
+
+#
+#
+#
+
+class Anonymize(DICOMPatcherRule):
+  def __init__(self):
+    self.requiredTags = ['PatientName', 'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SeriesNumber']
+  def processStart(self, inputRootDir, outputRootDir):
+    import dicom
+    self.patientIDToRandomIDMap = {}
+    self.studyUIDToRandomUIDMap = {}
+    self.seriesUIDToRandomUIDMap = {}
+    self.numberOfSeriesInStudyMap = {}
+    # All files without a patient ID will be assigned to the same patient
+    self.randomPatientID = dicom.UID.generate_uid(None)
+    # Random IDs are derived from the original IDs and this random seed, so that all files that share
+    # an ID get the same random ID, even if they are processed by different worker processes
+    self.randomSeed = dicom.UID.generate_uid(None)
+  def generateRandomUID(self, originalUID):
+    import uuid
+    return "2.25.{0}".format(uuid.uuid5(uuid.NAMESPACE_OID, self.randomSeed + "/" + str(originalUID)).int)
+  def processDirectory(self, currentSubDir):
+    import dicom
+    # Assume that all files in a directory belongs to the same study
+    self.randomStudyUID = dicom.UID.generate_uid(None)
+    # Assume that all files in a directory belongs to the same series
+    self.randomSeriesInstanceUID = dicom.UID.generate_uid(None)
+  def processDataSet(self, ds):
+    import dicom
+
+    ds.StudyDate = ''
+    ds.StudyTime = ''
+    ds.ContentDate = ''
+    ds.ContentTime = ''
+    ds.AccessionNumber = ''
+    ds.ReferringPhysiciansName = ''
+    ds.PatientsBirthDate = ''
+    ds.PatientsSex = ''
+    ds.StudyID = ''
+    ds.PatientName = "Unspecified Patient"
+
+    # replace ids with random values - re-use if we have seen them before
+    if ds.PatientID not in self.patientIDToRandomIDMap:
+      self.patientIDToRandomIDMap[ds.PatientID] = self.generateRandomUID(ds.PatientID)
+    ds.PatientID = self.patientIDToRandomIDMap[ds.PatientID]
+    if ds.StudyInstanceUID not in self.studyUIDToRandomUIDMap:
+      self.studyUIDToRandomUIDMap[ds.StudyInstanceUID] = self.generateRandomUID(ds.StudyInstanceUID)
+    ds.StudyInstanceUID = self.studyUIDToRandomUIDMap[ds.StudyInstanceUID]
+    if ds.SeriesInstanceUID not in self.seriesUIDToRandomUIDMap:
+      self.seriesUIDToRandomUIDMap[ds.SeriesInstanceUID] = self.generateRandomUID(ds.SeriesInstanceUID)
+    ds.SeriesInstanceUID = self.seriesUIDToRandomUIDMap[ds.SeriesInstanceUID]
+
+#
+#
+#
+
+class NormalizeFileNames(DICOMPatcherRule):
+  outputFilePathTags = ['PatientName', 'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'Modality']
+  def processStart(self, inputRootDir, outputRootDir):
+    self.inputRootDir = inputRootDir
+    self.outputRootDir = outputRootDir
+    self.patientNameIDToFolderMap = {}
+    self.studyUIDToFolderMap = {}
+    self.seriesUIDToFolderMap = {}
+    # Number of files or folder in the specified folder
+    self.numberOfItemsInFolderMap = {}
+  def getNextItemName(self, prefix, root):
+    numberOfFilesInFolder = self.numberOfItemsInFolderMap[root] if root in self.numberOfItemsInFolderMap else 0
+    self.numberOfItemsInFolderMap[root] = numberOfFilesInFolder+1
+    return "{0}{1:03d}".format(prefix, numberOfFilesInFolder)
+  def generateOutputFilePath(self, ds, filepath):
+    folderName = ""
+    patientNameID = str(ds.PatientName)+"*"+ds.PatientID
+    if patientNameID not in self.patientNameIDToFolderMap:
+      self.patientNameIDToFolderMap[patientNameID] = self.getNextItemName("pa", folderName)
+    folderName += self.patientNameIDToFolderMap[patientNameID]
+    if ds.StudyInstanceUID not in self.studyUIDToFolderMap:
+      self.studyUIDToFolderMap[ds.StudyInstanceUID] = self.getNextItemName("st", folderName)
+    folderName += "/" + self.studyUIDToFolderMap[ds.StudyInstanceUID]
+    if ds.SeriesInstanceUID not in self.seriesUIDToFolderMap:
+      self.seriesUIDToFolderMap[ds.SeriesInstanceUID] = self.getNextItemName("se", folderName)
+    folderName += "/" +self.seriesUIDToFolderMap[ds.SeriesInstanceUID]
+    prefix = ds.Modality.lower() if hasattr(ds, 'Modality') else ""
+    filePath = self.outputRootDir + "/" + folderName + "/" + self.getNextItemName(prefix, folderName)+".dcm"
+    return filePath
+
+#
+# Patching of files
+#
+
+def patchFile(rules, filePath, patchedFilePath, addLog, deferredRules=None):
+  """Read the file, patch it with the rules and write it to the output file path generated by the rules.
+  Output file path is not generated by deferredRules, the caller is responsible for that.
+  Returns the written file path and the patched data set, or (None, None) if the file was skipped.
+  """
+  import dicom
+
+  for rule in rules:
+    if rule.skipFile(filePath):
+      addLog('  Rule '+rule.__class__.__name__+' requested to skip this file.')
+      return None, None
+
+  try:
+    ds = dicom.read_file(filePath)
+  except (IOError, dicom.filereader.InvalidDicomError):
+    addLog('  Not DICOM file. Skipped.')
+    return None, None
+
+  addLog('  Patching...')
+
+  for rule in rules:
+    rule.processDataSet(ds)
+
+  for rule in rules:
+    if deferredRules and rule in deferredRules:
+      continue
+    patchedFilePath = rule.generateOutputFilePath(ds, patchedFilePath)
+
+  dirName = os.path.dirname(patchedFilePath)
+  if not os.path.exists(dirName):
+    os.makedirs(dirName)
+
+  addLog('  Writing DICOM...')
+  dicom.write_file(patchedFilePath, ds)
+  return patchedFilePath, ds
+
+def patchDirectoryFiles(rules, inputDirPath, outputDirPath, currentSubDir, files):
+  """Patch files of a directory in a worker process.
+  Rules must have processDirectory already called for this directory.
+  Rules that have outputFilePathTags are not used for generating the output file path,
+  instead, the values of those tags are returned so that the main process can generate the path.
+  Returns list of (patched file path, tag values, log messages) for each file.
+  """
+  deferredRules = [rule for rule in rules if rule.outputFilePathTags is not None]
+  deferredTags = set()
+  for rule in deferredRules:
+    deferredTags.update(rule.outputFilePathTags)
+
+  results = []
+  for file in files:
+    messages = []
+    for rule in rules:
+      rule.logCallback = messages.append
+    messages.append('Examining %s...' % os.path.join(currentSubDir,file))
+    filePath = os.path.join(inputDirPath, currentSubDir, file)
+    patchedFilePath = os.path.abspath(os.path.join(outputDirPath, currentSubDir, file))
+    try:
+      patchedFilePath, ds = patchFile(rules, filePath, patchedFilePath, messages.append, deferredRules)
+    except Exception as e:
+      messages.append('  Failed to patch file: {0}'.format(str(e)))
+      patchedFilePath, ds = None, None
+    tagValues = None
+    if ds is not None and deferredRules:
+      tagValues = {}
+      for tag in deferredTags:
+        if hasattr(ds, tag):
+          tagValues[tag] = getattr(ds, tag)
+    results.append((patchedFilePath, tagValues, messages))
+  return results
+
+# Patching rules of the current worker process, set by initializePatchDirectoryFilesWorker
+_workerRules = None
+
+def initializePatchDirectoryFilesWorker(serializedRules):
+  """Initializer of worker processes. Rules are deserialized only once in each worker process.
+  """
+  import pickle
+  global _workerRules
+  _workerRules = pickle.loads(serializedRules)
+
+def patchDirectoryFilesTask(task):
+  """Entry point of worker processes.
+  task contains serialized state of rules that are run in worker processes (rules that do not have
+  outputFilePathTags), input and output root directory, current subdirectory, and list of files.
+  """
+  import pickle
+  serializedRuleStates, inputDirPath, outputDirPath, currentSubDir, files = task
+  workerRules = [rule for rule in _workerRules if rule.outputFilePathTags is None]
+  for rule, ruleState in zip(workerRules, pickle.loads(serializedRuleStates)):
+    rule.__dict__.update(ruleState)
+  return patchDirectoryFiles(_workerRules, inputDirPath, outputDirPath, currentSubDir, files)
@@ -0,0 +1 @@
+from .DICOMPatcherRules import *
@@ -18,10 +18,11 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
   """ ScalarVolume specific interpretation code
   """
 
-  def __init__(self,epsilon=0.01):
+  def __init__(self,epsilon=0.01,tiltEpsilon=0.1):
     super(DICOMScalarVolumePluginClass,self).__init__()
     self.loadType = "Scalar Volume"
     self.epsilon = epsilon
+    self.tiltEpsilon = tiltEpsilon
     self.acquisitionModeling = None
     self.defaultStudyID = 'SLICER10001' #TODO: What should be the new study ID?
 
@@ -44,6 +45,7 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     self.tags['classUID'] = "0008,0016"
     self.tags['rows'] = "0028,0010"
     self.tags['columns'] = "0028,0011"
+    self.tags['pixelSpacing'] = "0028,0030"
 
   @staticmethod
   def readerApproaches():
@@ -128,20 +130,55 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     settings = qt.QSettings()
     return (int(settings.value("DICOM/ScalarVolume/AllowLoadingByTime", "0")) != 0)
 
+  def loadableCacheParameters(self):
+    """Examination results depend on these settings, so persistently cached results
+    are only reused if the settings have not changed"""
+    return "epsilon=%s;tiltEpsilon=%s;allowLoadingByTime=%s" % (self.epsilon, self.tiltEpsilon, self.allowLoadingByTime())
+
   def examineForImport(self,fileLists):
     """ Returns a sorted list of DICOMLoadable instances
     corresponding to ways of interpreting the
     fileLists parameter (list of file lists).
     """
-    loadables = []
+    inputs = self.getExaminationInputs(fileLists)
+    return self.getLoadablesFromExaminationResults(inputs, self.examineInputs(inputs))
+
+  def getExaminationInputs(self,fileLists):
+    """ Returns cached loadables and, for file lists that are not cached,
+    the tag values and settings that examination needs.
+    Accesses the DICOM database, therefore it must be called on the main thread.
+    """
+    inputs = []
     for files in fileLists:
       cachedLoadables = self.getCachedLoadables(files)
       if cachedLoadables:
-        loadables += cachedLoadables
+        inputs.append({'files': files, 'cachedLoadables': cachedLoadables})
       else:
-        loadablesForFiles = self.examineFiles(files)
-        loadables += loadablesForFiles
-        self.cacheLoadables(files,loadablesForFiles)
+        inputs.append(self.getFilesExaminationInputs(files))
+    return inputs
+
+  def examineInputs(self,inputs):
+    """ Examines file lists that were not found in the cache.
+    Does not access the DICOM database, the scene, or the application log,
+    therefore it can run in a worker thread.
+    """
+    return [self.examineFilesFromInputs(filesInputs) if 'cachedLoadables' not in filesInputs else None
+      for filesInputs in inputs]
+
+  def getLoadablesFromExaminationResults(self,inputs,results):
+    """ Caches examination results and returns all loadables sorted by series number.
+    Must be called on the main thread.
+    """
+    loadables = []
+    for filesInputs, filesResults in zip(inputs, results):
+      if 'cachedLoadables' in filesInputs:
+        loadables += filesInputs['cachedLoadables']
+        continue
+      loadablesForFiles, logMessages = filesResults
+      for level, message in logMessages:
+        logging.log(level, message)
+      loadables += loadablesForFiles
+      self.cacheLoadables(filesInputs['files'],loadablesForFiles)
 
     # sort the loadables by series number if possible
     loadables.sort(key=cmp_to_key(lambda x,y: self.seriesSorter(x,y)))
@@ -153,17 +190,16 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     corresponding to ways of interpreting the
     files parameter.
     """
+    loadables, logMessages = self.examineFilesFromInputs(self.getFilesExaminationInputs(files))
+    for level, message in logMessages:
+      logging.log(level, message)
+    return loadables
 
+  def getFilesExaminationInputs(self,files):
+    """ Returns everything from the DICOM database and application settings
+    that examineFilesFromInputs needs to examine the files.
+    """
     seriesUID = slicer.dicomDatabase.fileValue(files[0],self.tags['seriesUID'])
-    seriesName = self.defaultSeriesNodeName(seriesUID)
-
-    # default loadable includes all files for series
-    loadable = DICOMLoadable()
-    loadable.files = files
-    loadable.name = seriesName
-    loadable.tooltip = "%d files, first file: %s" % (len(loadable.files), loadable.files[0])
-    loadable.selected = True
-    # add it to the list of loadables later, if pixel data is available in at least one file
 
     # make subseries volumes based on tag differences
     subseriesTags = [
@@ -176,6 +212,38 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
       subseriesTags.append("contentTime")
       subseriesTags.append("triggerTime")
 
+    # get all tag values that are needed for examination in one step
+    tags = subseriesTags + ['pixelData', 'sopClassUID', 'position', 'orientation', 'pixelSpacing', 'numberOfFrames']
+    tagValues = DICOMUtils.getTagValuesForFiles(files, [self.tags[tag] for tag in tags])
+
+    return {
+      'files': files,
+      'seriesName': self.defaultSeriesNodeName(seriesUID),
+      'subseriesTags': subseriesTags,
+      'tagValues': dict([(tag, tagValues[self.tags[tag]]) for tag in tags]),
+      'acquisitionGeometryRegularizationEnabled': self.acquisitionGeometryRegularizationEnabled(),
+      }
+
+  def examineFilesFromInputs(self,inputs):
+    """ Returns a list of DICOMLoadable instances corresponding to ways of
+    interpreting the files described by inputs (see getFilesExaminationInputs)
+    and a list of (level, message) tuples that should be logged.
+    Only uses the inputs, therefore it can run in a worker thread.
+    """
+    files = inputs['files']
+    seriesName = inputs['seriesName']
+    subseriesTags = inputs['subseriesTags']
+    tagValues = inputs['tagValues']
+    logMessages = []
+
+    # default loadable includes all files for series
+    loadable = DICOMLoadable()
+    loadable.files = files
+    loadable.name = seriesName
+    loadable.tooltip = "%d files, first file: %s" % (len(loadable.files), loadable.files[0])
+    loadable.selected = True
+    # add it to the list of loadables later, if pixel data is available in at least one file
+
     #
     # first, look for subseries within this series
     # - build a list of files for each unique value
@@ -183,10 +251,10 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     #
     subseriesFiles = {}
     subseriesValues = {}
-    for file in loadable.files:
+    for fileIndex, file in enumerate(loadable.files):
       # check for subseries values
       for tag in subseriesTags:
-        value = slicer.dicomDatabase.fileValue(file,self.tags[tag])
+        value = tagValues[tag][fileIndex]
         value = value.replace(",","_") # remove commas so it can be used as an index
         if tag not in subseriesValues:
           subseriesValues[tag] = []
@@ -220,19 +288,21 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
 
     # remove any files from loadables that don't have pixel data (no point sending them to ITK for reading)
     # also remove DICOM SEG, since it is not handled by ITK readers
+    pixelDataValues = dict(zip(files, tagValues['pixelData']))
+    sopClassUIDValues = dict(zip(files, tagValues['sopClassUID']))
     newLoadables = []
     for loadable in loadables:
       newFiles = []
       excludedLoadable = False
       for file in loadable.files:
-        if slicer.dicomDatabase.fileValue(file,self.tags['pixelData'])!='':
+        if pixelDataValues[file]!='':
           newFiles.append(file)
-        if slicer.dicomDatabase.fileValue(file,self.tags['sopClassUID'])=='1.2.840.10008.5.1.4.1.1.66.4':
+        if sopClassUIDValues[file]=='1.2.840.10008.5.1.4.1.1.66.4':
           excludedLoadable = True
-          logging.error('Please install Quantitative Reporting extension to enable loading of DICOM Segmentation objects')
-        elif slicer.dicomDatabase.fileValue(file,self.tags['sopClassUID'])=='1.2.840.10008.5.1.4.1.1.481.3':
+          logMessages.append((logging.ERROR, 'Please install Quantitative Reporting extension to enable loading of DICOM Segmentation objects'))
+        elif sopClassUIDValues[file]=='1.2.840.10008.5.1.4.1.1.481.3':
           excludedLoadable = True
-          logging.error('Please install SlicerRT extension to enable loading of DICOM RT Structure Set objects')
+          logMessages.append((logging.ERROR, 'Please install SlicerRT extension to enable loading of DICOM RT Structure Set objects'))
       if len(newFiles) > 0 and not excludedLoadable:
         loadable.files = newFiles
         newLoadables.append(loadable)
@@ -251,10 +321,25 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     # now for each series and subseries, sort the images
     # by position and check for consistency
     #
+    positionValues = dict(zip(files, tagValues['position']))
+    orientationValues = dict(zip(files, tagValues['orientation']))
+    pixelSpacingValues = dict(zip(files, tagValues['pixelSpacing']))
+    numberOfFramesValues = dict(zip(files, tagValues['numberOfFrames']))
     for loadable in loadables:
-      loadable.files, distances, loadable.warning = DICOMUtils.getSortedImageFiles(loadable.files, self.epsilon)
-
-    return loadables
+      geometry = DICOMUtils.computeImageGeometry(loadable.files,
+        [positionValues[file] for file in loadable.files],
+        [orientationValues[file] for file in loadable.files],
+        numberOfFramesValues[loadable.files[0]] != "",
+        inputs['acquisitionGeometryRegularizationEnabled'], self.epsilon, tiltEpsilon=self.tiltEpsilon,
+        pixelSpacingValues=[pixelSpacingValues[file] for file in loadable.files])
+      loadable.files = geometry['files']
+      loadable.warning = geometry['warningText']
+      # keep the geometry report, so that loading does not need to compute it again
+      loadable.geometry = geometry
+      if not geometry['spacingUniform']:
+        logMessages.append((logging.WARNING, "Geometric issues were found with the series. Please use caution.\n"))
+
+    return loadables, logMessages
 
   def seriesSorter(self,x,y):
     """ returns -1, 0, 1 for sorting of strings like: "400: series description"
@@ -436,9 +521,13 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
     # code such as the DICOMReaders test can introspect to validate.
 
     if volumeNode:
+      # the geometry report of the examination is only valid if the files have not changed since then
+      geometry = getattr(loadable, 'geometry', None)
+      if geometry and list(geometry['files']) != list(loadable.files):
+        geometry = None
       self.acquisitionModeling = self.AcquisitionModeling()
       self.acquisitionModeling.createAcquisitionTransform(volumeNode,
-        addAcquisitionTransformIfNeeded=self.acquisitionGeometryRegularizationEnabled())
+        addAcquisitionTransformIfNeeded=self.acquisitionGeometryRegularizationEnabled(), geometry=geometry)
 
     return volumeNode
 
@@ -614,10 +703,14 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
           for column in range(2):
             displacements[sliceIndex][row][column] = targetCorners[sliceIndex][row][column] - sourceCorners[sliceIndex][row][column]
 
-    def sliceCornersFromDICOM(self,volumeNode):
+    def sliceCornersFromDICOM(self,volumeNode,geometry=None):
       """Calculate the RAS position of each of the four corners of each
       slice of a volume node based on the dicom headers
 
+      If the geometry report of the series (see DICOMUtils.getImageGeometry) is
+      specified then positions, orientations, and pixel spacings are taken from it,
+      instead of being retrieved from the database for each slice.
+
       Note: PixelSpacing is row spacing followed by column spacing [1] (i.e. vertical then horizontal)
       while ImageOrientationPatient is row cosines then column cosines [2] (i.e. horizontal then vertical).
       [1] http://dicom.nema.org/medical/dicom/current/output/html/part03.html#sect_10.7.1.1
@@ -628,28 +721,37 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
       orientationTag = "0020,0037"
 
       columns, rows, slices = volumeNode.GetImageData().GetDimensions()
+      if (geometry and geometry['pixelSpacings'] is not None
+          and len(geometry['positions']) == slices and len(geometry['pixelSpacings']) == slices):
+        positions = numpy.array(geometry['positions'])
+        orientations = numpy.array(geometry['orientations'])
+        spacings = numpy.array(geometry['pixelSpacings'])
+      else:
+        positions = numpy.zeros(shape=[slices,3])
+        orientations = numpy.zeros(shape=[slices,6])
+        spacings = numpy.zeros(shape=[slices,2])
+        uids = volumeNode.GetAttribute('DICOM.instanceUIDs').split()
+        for sliceIndex in range(slices):
+          uid = uids[sliceIndex]
+          # get slice geometry from instance
+          positionString = slicer.dicomDatabase.instanceValue(uid, positionTag)
+          orientationString = slicer.dicomDatabase.instanceValue(uid, orientationTag)
+          spacingString = slicer.dicomDatabase.instanceValue(uid, spacingTag)
+          if positionString == "" or orientationString == "" or spacingString == "":
+            logging.warning('No geometry information available for DICOM data, skipping corner calculations')
+            return None
+          positions[sliceIndex] = list(map(float, positionString.split('\\')))
+          orientations[sliceIndex] = list(map(float, orientationString.split('\\')))
+          spacings[sliceIndex] = list(map(float, spacingString.split('\\')))
+
       corners = numpy.zeros(shape=[slices,2,2,3])
-      uids = volumeNode.GetAttribute('DICOM.instanceUIDs').split()
+      # map from LPS to RAS
+      lpsToRAS = numpy.array([-1,-1,1])
       for sliceIndex in range(slices):
-        uid = uids[sliceIndex]
-        # get slice geometry from instance
-        positionString = slicer.dicomDatabase.instanceValue(uid, positionTag)
-        orientationString = slicer.dicomDatabase.instanceValue(uid, orientationTag)
-        spacingString = slicer.dicomDatabase.instanceValue(uid, spacingTag)
-        if positionString == "" or orientationString == "" or spacingString == "":
-          logging.warning('No geometry information available for DICOM data, skipping corner calculations')
-          return None
-
-        position = numpy.array(list(map(float, positionString.split('\\'))))
-        orientation = list(map(float, orientationString.split('\\')))
-        rowOrientation = numpy.array(orientation[:3])
-        columnOrientation = numpy.array(orientation[3:])
-        spacing = numpy.array(list(map(float, spacingString.split('\\'))))
-        # map from LPS to RAS
-        lpsToRAS = numpy.array([-1,-1,1])
-        position *= lpsToRAS
-        rowOrientation *= lpsToRAS
-        columnOrientation *= lpsToRAS
+        position = positions[sliceIndex] * lpsToRAS
+        rowOrientation = orientations[sliceIndex][:3] * lpsToRAS
+        columnOrientation = orientations[sliceIndex][3:] * lpsToRAS
+        spacing = spacings[sliceIndex]
         rowVector = columns * spacing[1] * rowOrientation # dicom PixelSpacing is between rows first, then columns
         columnVector = rows * spacing[0] * columnOrientation
         # apply the transform to the four corners
@@ -687,12 +789,13 @@ class DICOMScalarVolumePluginClass(DICOMPlugin):
             volumeNode.TransformPointToWorld(corners[slice,row,column], worldCorners[slice,row,column])
       return worldCorners
 
-    def createAcquisitionTransform(self, volumeNode, addAcquisitionTransformIfNeeded = True):
+    def createAcquisitionTransform(self, volumeNode, addAcquisitionTransformIfNeeded = True, geometry = None):
       """Creates the actual transform if needed.
-      Slice corners are cached for inpection by tests
+      Slice corners are cached for inpection by tests.
+      If the geometry report of the loaded series is specified then DICOM slice corners are computed from it.
       """
       self.originalCorners = self.sliceCornersFromIJKToRAS(volumeNode)
-      self.targetCorners = self.sliceCornersFromDICOM(volumeNode)
+      self.targetCorners = self.sliceCornersFromDICOM(volumeNode, geometry)
       if self.originalCorners is None or self.targetCorners is None:
         # can't create transform without corner information
         return
@@ -1,5 +1,6 @@
 from __future__ import print_function
 import os
+import time
 import unittest
 import vtk, qt, ctk, slicer
 import teem
@@ -80,6 +81,17 @@ class DataProbeInfoWidget(object):
     self.imageCrop = vtk.vtkExtractVOI()
     self.painter = qt.QPainter()
     self.pen = qt.QPen()
+    # Cursor position, blend output modified time, output size and crosshair color
+    # of the currently displayed magnified pixmap
+    self.magnifiedPixmapKey = None
+
+    # Cursor position events are coalesced: only the most recent position is
+    # probed, at most maximumUpdateRate times per second
+    self.maximumUpdateRate = slicer.util.settingsValue('DataProbe/MaximumUpdateRate', 30.0, converter=float)
+    self.updateTimer = qt.QTimer()
+    self.updateTimer.setSingleShot(True)
+    self.updateTimer.connect('timeout()', self.updateInformation)
+    self.lastUpdateTime = None
 
     self._createSmall()
 
@@ -110,6 +122,7 @@ class DataProbeInfoWidget(object):
     if self.CrosshairNode and self.CrosshairNodeObserverTag:
       self.CrosshairNode.RemoveObserver(self.CrosshairNodeObserverTag)
     self.CrosshairNodeObserverTag = None
+    self.updateTimer.stop()
 
   def getPixelString(self,volumeNode,ijk):
     """Given a volume node, create a human readable
@@ -180,7 +193,19 @@ class DataProbeInfoWidget(object):
 
 
   def processEvent(self,observee,event):
-    # TODO: use a timer to delay calculation and compress events
+    """Schedule an update of the probed information. Events received while an
+    update is already pending are dropped, as the update always uses the latest
+    cursor position."""
+    if self.updateTimer.isActive():
+      return
+    delayMs = 0
+    if self.lastUpdateTime is not None and self.maximumUpdateRate > 0:
+      elapsedMs = (time.time() - self.lastUpdateTime) * 1000.0
+      delayMs = max(0, int(1000.0 / self.maximumUpdateRate - elapsedMs))
+    self.updateTimer.start(delayMs)
+
+  def updateInformation(self):
+    self.lastUpdateTime = time.time()
     insideView = False
     ras = [0.0,0.0,0.0]
     xyz = [0.0,0.0,0.0]
@@ -267,10 +292,18 @@ class DataProbeInfoWidget(object):
 
     # set image
     if (not slicer.mrmlScene.IsBatchProcessing()) and sliceLogic and hasVolume and self.showImage:
-      pixmap = self._createMagnifiedPixmap(
-        xyz, sliceLogic.GetBlend().GetOutputPort(), self.imageLabel.size, color)
-      if pixmap:
-        self.imageLabel.setPixmap(pixmap)
+      # regenerate the pixmap only if the probed pixel or the blended slice image changed
+      blendOutputPort = sliceLogic.GetBlend().GetOutputPort()
+      outputSize = self.imageLabel.size
+      pixmapKey = (tuple(_roundInt(value) for value in xyz),
+                   blendOutputPort.GetProducer().GetOutput().GetMTime(),
+                   (outputSize.width(), outputSize.height()), tuple(rgbColor))
+      if pixmapKey != self.magnifiedPixmapKey:
+        pixmap = self._createMagnifiedPixmap(xyz, blendOutputPort, outputSize, color)
+        if pixmap:
+          self.imageLabel.setPixmap(pixmap)
+          self.magnifiedPixmapKey = pixmapKey
+      if self.magnifiedPixmapKey == pixmapKey:
         self.onShowImage(self.showImage)
 
     if hasattr(self.frame.parent(), 'text'):
@@ -480,6 +513,7 @@ class DataProbeInfoWidget(object):
       self.imageLabel.hide()
       pixmap = qt.QPixmap()
       self.imageLabel.setPixmap(pixmap)
+      self.magnifiedPixmapKey = None
 
 #
 # DataProbe widget
@@ -566,6 +600,8 @@ class DataProbeTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_DataProbe1()
+    self.setUp()
+    self.test_DataProbeCoalescing()
 
   def test_DataProbe1(self):
     """ Ideally you should have several levels of tests.  At the lowest level
@@ -595,3 +631,53 @@ class DataProbeTest(ScriptedLoadableModuleTest):
     self.widget.frame.show()
 
     self.delayDisplay('Test passed!')
+
+  def test_DataProbeCoalescing(self):
+    """Cursor position events received while an update is pending are merged into
+    a single update that uses the latest cursor position, and updates are rate limited."""
+    self.delayDisplay("Starting the coalescing test")
+
+    class CountingDataProbeInfoWidget(DataProbeInfoWidget):
+      def __init__(self):
+        self.updatedPositions = []
+        DataProbeInfoWidget.__init__(self)
+      def updateInformation(self):
+        ras = [0.0, 0.0, 0.0]
+        self.CrosshairNode.GetCursorPositionRAS(ras)
+        self.updatedPositions.append(ras)
+        DataProbeInfoWidget.updateInformation(self)
+
+    def processEventsFor(durationSec):
+      startTime = time.time()
+      while time.time() - startTime < durationSec:
+        slicer.app.processEvents()
+        time.sleep(0.005)
+
+    crosshairNode = slicer.mrmlScene.GetFirstNodeByClass('vtkMRMLCrosshairNode')
+    widget = CountingDataProbeInfoWidget()
+    try:
+      widget.maximumUpdateRate = 5
+      for position in range(50):
+        crosshairNode.SetCursorPositionRAS([position, 0.0, 0.0])
+      # events only schedule an update
+      self.assertEqual(widget.updatedPositions, [])
+      processEventsFor(0.05)
+      self.assertEqual(widget.updatedPositions, [[49.0, 0.0, 0.0]])
+
+      # next update is delayed to stay within the maximum update rate
+      for position in range(50, 100):
+        crosshairNode.SetCursorPositionRAS([position, 0.0, 0.0])
+      processEventsFor(0.05)
+      self.assertEqual(len(widget.updatedPositions), 1)
+      processEventsFor(0.3)
+      self.assertEqual(widget.updatedPositions, [[49.0, 0.0, 0.0], [99.0, 0.0, 0.0]])
+
+      # no updates after observers are removed
+      widget.removeObservers()
+      crosshairNode.SetCursorPositionRAS([100.0, 0.0, 0.0])
+      processEventsFor(0.3)
+      self.assertEqual(len(widget.updatedPositions), 2)
+    finally:
+      widget.removeObservers()
+
+    self.delayDisplay('Test passed!')
@@ -360,50 +360,88 @@ class EditUtil(object):
         EditUtil.markVolumeNodeAsModified(structureVolume)
 
 class UndoRedo(object):
-  """ Code to manage a list of undo/redo volumes
-  stored in a compressed format using the vtkImageStash
-  class to compress label maps in a thread
+  """ Code to manage a list of undo/redo steps.
+  Each step only stores the region of the label map that was changed
+  in the step, in a compressed format. Changes are detected by comparing
+  the label map to a reference copy of its state at the previous step.
   """
 
   class checkPoint(object):
     """Internal class to store one checkpoint
-    step consisting of the stashed data
+    step consisting of the compressed voxel values of the changed region
     and the volumeNode it corresponds to
     """
-    def __init__(self,volumeNode):
+    def __init__(self,volumeNode,region,values):
+      import zlib
       self.volumeNode = volumeNode
-      self.stashImage = vtk.vtkImageData()
-      self.stash = slicer.vtkImageStash()
-      self.stashImage.DeepCopy( volumeNode.GetImageData() )
-      self.stash.SetStashImage( self.stashImage )
-      self.stash.ThreadedStash()
+      # region is a tuple of slices in (k,j,i) order, None if no voxels were changed
+      self.region = region
+      self.shape = values.shape if values is not None else None
+      self.dtype = values.dtype if values is not None else None
+      self.compressedValues = zlib.compress(values.tobytes(), 1) if values is not None else b''
+
+    def size(self):
+      """Memory used by the stored voxel values (in bytes)"""
+      return len(self.compressedValues)
 
     def restore(self):
-      """Unstash the volume but first check that the
-      stash operation is not still ongoing in the other thread.
-      TODO: the stash operation is determinisitic, so there's
-      no chance of a deadlock here, but it would still be better
-      to integrate the wait into the event queue to avoid locking
-      the interface.  In practice this would only happen if the user
-      clicks Undo while the thread is still executing, which is
-      unlikely.  And at worst this busy loop will consume two threads
-      (this one and the stashing one) for the time the stash takes to complete.
+      """Write the stored voxel values into the volume.
+      Returns checkpoint that can revert this restore operation.
       """
-      while self.stash.GetStashing():
-        pass
-      self.stash.Unstash()
-      self.volumeNode.GetImageData().DeepCopy( self.stashImage )
+      import numpy, zlib
+      if self.region is None:
+        return UndoRedo.checkPoint(self.volumeNode, None, None)
+      array = slicer.util.arrayFromVolume(self.volumeNode)
+      revertCheckPoint = UndoRedo.checkPoint(self.volumeNode, self.region, array[self.region])
+      values = numpy.frombuffer(zlib.decompress(self.compressedValues), dtype=self.dtype).reshape(self.shape)
+      array[self.region] = values
       EditUtil().markVolumeNodeAsModified(self.volumeNode)
+      return revertCheckPoint
 
-
-  def __init__(self,undoSize=100):
+  @staticmethod
+  def changedRegion(referenceArray, array, slabSize=16):
+    """Get bounding box of voxels that are different in the two arrays, as a tuple of slices.
+    Arrays are compared slab by slab to limit the size of temporary arrays.
+    Returns None if the arrays are equal.
+    """
+    import numpy
+    regionMin = None
+    regionMax = None
+    for slabStart in range(0, array.shape[0], slabSize):
+      different = referenceArray[slabStart:slabStart+slabSize] != array[slabStart:slabStart+slabSize]
+      if not different.any():
+        continue
+      slabMin = []
+      slabMax = []
+      for axis in range(3):
+        otherAxes = tuple([otherAxis for otherAxis in range(3) if otherAxis != axis])
+        changedIndices = numpy.flatnonzero(different.any(axis=otherAxes))
+        slabMin.append(changedIndices[0])
+        slabMax.append(changedIndices[-1])
+      slabMin[0] += slabStart
+      slabMax[0] += slabStart
+      regionMin = slabMin if regionMin is None else numpy.minimum(regionMin, slabMin)
+      regionMax = slabMax if regionMax is None else numpy.maximum(regionMax, slabMax)
+    if regionMin is None:
+      return None
+    return tuple([slice(int(start), int(end)+1) for start, end in zip(regionMin, regionMax)])
+
+  def __init__(self,undoSize=100,memoryBudget=512*1024*1024):
     self.enabled = True
     self.undoSize = undoSize
+    # maximum memory (in bytes) used by stored steps, oldest steps are discarded to stay within this limit
+    self.memoryBudget = memoryBudget
     self.undoList = []
     self.redoList = []
     self.undoObservers = []
     self.redoObservers = []
     self.stateChangedCallback = self.defaultStateChangedCallback
+    # copy of the label map at the last saved state, used for detecting changed regions
+    self.referenceVolumeNode = None
+    self.referenceArray = None
+    # True if state of the label map is saved but not yet stored in the undo list
+    # (changes are not known until the next step starts or undo is requested)
+    self.pendingCheckPoint = False
 
   def defaultStateChangedCallback(self):
     """placeholder so that using class can define a callable
@@ -431,47 +469,83 @@ class UndoRedo(object):
 
   def undoEnabled(self):
     """for managing undo/redo button state"""
-    return self.enabled and self.undoList != []
+    return self.enabled and (self.undoList != [] or self.pendingCheckPoint)
 
   def redoEnabled(self):
     """for managing undo/redo button state"""
     return self.enabled and self.redoList != []
 
-  def storeVolume(self,checkPointList,volumeNode):
+  def synchronizeReference(self,volumeNode):
     """ Internal helper function
-    Save a stashed copy of the given volume node into
-    the passed list (could be undo or redo list)
+    Update the reference copy to match the current state of the volume node.
+    Returns checkpoint that can restore the previous state of the reference,
+    or None if the reference cannot be compared to the volume.
     """
-    if not self.enabled or not volumeNode or not volumeNode.GetImageData():
+    import numpy
+    array = slicer.util.arrayFromVolume(volumeNode)
+    if (self.referenceVolumeNode != volumeNode or self.referenceArray is None
+      or self.referenceArray.shape != array.shape or self.referenceArray.dtype != array.dtype):
+      self.referenceVolumeNode = volumeNode
+      self.referenceArray = numpy.copy(array)
+      return None
+    region = self.changedRegion(self.referenceArray, array)
+    if region is None:
+      return self.checkPoint(volumeNode, None, None)
+    checkPoint = self.checkPoint(volumeNode, region, self.referenceArray[region])
+    self.referenceArray[region] = array[region]
+    return checkPoint
+
+  def storePendingCheckPoint(self):
+    """ Internal helper function
+    Store changes made since the state was saved in the undo list
+    """
+    if not self.pendingCheckPoint:
       return
-    checkPointList.append( self.checkPoint(volumeNode) )
-    self.stateChangedCallback()
-    if len(checkPointList) >= self.undoSize:
-      return( checkPointList[1:] )
-    else:
-      return( checkPointList )
+    self.pendingCheckPoint = False
+    volumeNode = self.referenceVolumeNode
+    if not volumeNode or not volumeNode.GetImageData() or not volumeNode.GetScene():
+      return
+    checkPoint = self.synchronizeReference(volumeNode)
+    if checkPoint:
+      self.undoList.append(checkPoint)
+      self.limitMemoryUsage()
+
+  def limitMemoryUsage(self):
+    """ Internal helper function
+    Remove oldest steps if the number of steps or the memory they use exceeds the limits
+    """
+    if len(self.undoList) >= self.undoSize:
+      self.undoList = self.undoList[len(self.undoList) - self.undoSize + 1:]
+    memoryUsage = sum([checkPoint.size() for checkPoint in self.undoList + self.redoList])
+    while memoryUsage > self.memoryBudget and self.undoList:
+      memoryUsage -= self.undoList.pop(0).size()
 
   def saveState(self):
     """Called by effects as they modify the label volume node
     """
-    # store current state onto undoList
-    self.undoList = self.storeVolume( self.undoList, EditUtil.getLabelVolume() )
+    volumeNode = EditUtil.getLabelVolume()
+    if not self.enabled or not volumeNode or not volumeNode.GetImageData():
+      return
+    # store changes of the previous step onto undoList
+    self.storePendingCheckPoint()
+    # current state will be stored when the next step starts or undo is requested
+    self.synchronizeReference(volumeNode)
+    self.pendingCheckPoint = True
     self.redoList = []
     self.stateChangedCallback()
 
   def undo(self):
     """Perform the operation when the user presses
     the undo button on the editor interface.
-    This pushes the current state onto the redoList and
-    removes a volume from the undoList.
+    This restores the state before the last step and
+    pushes the reverting step onto the redoList.
     """
+    self.storePendingCheckPoint()
     if self.undoList == []:
       return
-    # store current state onto redoList
-    self.redoList = self.storeVolume( self.redoList, EditUtil.getLabelVolume() )
     # get the checkPoint to restore and remove it from the list
-    self.undoList[-1].restore()
-    self.undoList = self.undoList[:-1]
+    checkPoint = self.undoList.pop()
+    self.restoreCheckPoint(checkPoint, self.redoList)
     self.stateChangedCallback()
     for observer in self.undoObservers:
       observer()
@@ -479,16 +553,28 @@ class UndoRedo(object):
   def redo(self):
     """Perform the operation when the user presses
     the undo button on the editor interface.
-    This pushes the current state onto the undo stack
-    and restores the state from the redo stack
+    This restores the state from the redo stack
+    and pushes the reverting step onto the undoList.
     """
     if self.redoList == []:
       return
-    # store current state onto undoList
-    self.undoList = self.storeVolume( self.undoList, EditUtil.getLabelVolume() )
     # get the checkPoint to restore and remove it from the list
-    self.redoList[-1].restore()
-    self.redoList = self.redoList[:-1]
+    checkPoint = self.redoList.pop()
+    self.restoreCheckPoint(checkPoint, self.undoList)
     self.stateChangedCallback()
     for observer in self.redoObservers:
       observer()
+
+  def restoreCheckPoint(self,checkPoint,revertCheckPointList):
+    """ Internal helper function
+    Restore the checkpoint and add the step that reverts it to the list
+    """
+    volumeNode = checkPoint.volumeNode
+    if not volumeNode or not volumeNode.GetImageData() or not volumeNode.GetScene():
+      return
+    revertCheckPoint = checkPoint.restore()
+    revertCheckPointList.append(revertCheckPoint)
+    # keep reference in sync with the restored volume
+    if volumeNode == self.referenceVolumeNode and checkPoint.region is not None:
+      self.referenceArray[checkPoint.region] = slicer.util.arrayFromVolume(volumeNode)[checkPoint.region]
+    self.limitMemoryUsage()
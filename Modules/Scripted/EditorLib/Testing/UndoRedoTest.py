@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+import numpy
+import slicer
+from EditorLib import EditUtil, UndoRedo
+
+
+class UndoRedoTest(unittest.TestCase):
+  """Tests of undo and redo of label map changes stored as changed regions."""
+
+  def setUp(self):
+    slicer.mrmlScene.Clear(0)
+    self.labelNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode')
+    slicer.util.updateVolumeFromArray(self.labelNode, numpy.zeros((20, 30, 40), dtype=numpy.int16))
+    patcher = mock.patch.object(EditUtil, 'getLabelVolume', return_value=self.labelNode)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def edit(self, undoRedo, region, value):
+    """Change the label map the same way as editor effects do"""
+    undoRedo.saveState()
+    slicer.util.arrayFromVolume(self.labelNode)[region] = value
+    EditUtil.markVolumeNodeAsModified(self.labelNode)
+    return slicer.util.arrayFromVolume(self.labelNode).copy()
+
+  def assertLabelArrayEqual(self, expectedArray):
+    numpy.testing.assert_array_equal(slicer.util.arrayFromVolume(self.labelNode), expectedArray)
+
+  def test_UndoRedoRoundTrip(self):
+    undoRedo = UndoRedo()
+    states = [slicer.util.arrayFromVolume(self.labelNode).copy()]
+    states.append(self.edit(undoRedo, (slice(2, 5), slice(3, 9), slice(10, 20)), 1))
+    # overlapping change
+    states.append(self.edit(undoRedo, (slice(4, 6), slice(0, 30), slice(15, 16)), 2))
+    # step without changes
+    states.append(self.edit(undoRedo, (slice(0, 1), slice(0, 1), slice(0, 1)), 0))
+    # change at the opposite corner of the volume
+    states.append(self.edit(undoRedo, (slice(19, 20), slice(29, 30), slice(39, 40)), 3))
+    self.assertTrue(undoRedo.undoEnabled())
+    self.assertFalse(undoRedo.redoEnabled())
+
+    for state in reversed(states[:-1]):
+      undoRedo.undo()
+      self.assertLabelArrayEqual(state)
+    self.assertFalse(undoRedo.undoEnabled())
+    self.assertTrue(undoRedo.redoEnabled())
+    # nothing more to undo
+    undoRedo.undo()
+    self.assertLabelArrayEqual(states[0])
+
+    for state in states[1:]:
+      undoRedo.redo()
+      self.assertLabelArrayEqual(state)
+    self.assertFalse(undoRedo.redoEnabled())
+
+    # undo and redo again after a round trip
+    undoRedo.undo()
+    undoRedo.undo()
+    self.assertLabelArrayEqual(states[-3])
+    undoRedo.redo()
+    self.assertLabelArrayEqual(states[-2])
+
+    # a new step discards the steps that could be redone
+    newState = self.edit(undoRedo, (slice(10, 12), slice(10, 12), slice(10, 12)), 4)
+    self.assertFalse(undoRedo.redoEnabled())
+    undoRedo.undo()
+    self.assertLabelArrayEqual(states[-2])
+    undoRedo.redo()
+    self.assertLabelArrayEqual(newState)
+
+  def test_CheckPointStoresChangedRegionOnly(self):
+    undoRedo = UndoRedo()
+    self.edit(undoRedo, (slice(2, 5), slice(3, 9), slice(10, 20)), 1)
+    self.edit(undoRedo, (slice(0, 1), slice(0, 1), slice(0, 1)), 2)
+    self.assertEqual(len(undoRedo.undoList), 1)
+    self.assertEqual(undoRedo.undoList[0].region, (slice(2, 5), slice(3, 9), slice(10, 20)))
+    self.assertEqual(undoRedo.undoList[0].shape, (3, 6, 10))
+
+  def test_UndoSize(self):
+    # only the most recent steps are kept
+    undoRedo = UndoRedo(undoSize=3)
+    states = [slicer.util.arrayFromVolume(self.labelNode).copy()]
+    for value in range(1, 5):
+      states.append(self.edit(undoRedo, (slice(value, value + 2), slice(0, 30), slice(0, 40)), value))
+    undoRedo.undo()
+    undoRedo.undo()
+    self.assertLabelArrayEqual(states[-3])
+    self.assertFalse(undoRedo.undoEnabled())
+    undoRedo.undo()
+    self.assertLabelArrayEqual(states[-3])
+    undoRedo.redo()
+    undoRedo.redo()
+    self.assertLabelArrayEqual(states[-1])
@@ -0,0 +1,84 @@
+import unittest
+import numpy
+from EditorLib import WandEffectLogic
+
+
+class WandEffectTest(unittest.TestCase):
+  """Tests of the flood fill of the wand effect."""
+
+  @staticmethod
+  def referenceFloodFill(backgroundArray, labelArray, seed, label, lo, hi, paintOver, maxPixels):
+    """Fill pixels one by one, visiting them from a first-in first-out queue."""
+    shape = backgroundArray.shape
+    visited = numpy.zeros(shape, dtype=bool)
+    pixelsSet = 0
+    toVisit = [tuple(seed)]
+    while toVisit:
+      location = toVisit.pop(0)
+      if any([index < 0 or index >= size for index, size in zip(location, shape)]) or visited[location]:
+        continue
+      visited[location] = True
+      l = labelArray[location]
+      b = backgroundArray[location]
+      if (not paintOver and l != 0) or b < lo or b > hi:
+        continue
+      labelArray[location] = label
+      if l != label:
+        pixelsSet += 1
+      if pixelsSet > maxPixels:
+        break
+      for axis in range(len(shape)):
+        for offset in [-1, 1]:
+          neighbor = list(location)
+          neighbor[axis] += offset
+          toVisit.append(tuple(neighbor))
+    return pixelsSet
+
+  def test_FloodFillCapped(self):
+    # 5x5 plane filled from its center, limited to 4 changed pixels
+    backgroundArray = numpy.ones((5, 5), dtype=numpy.int16)
+    labelArray = numpy.zeros((5, 5), dtype=numpy.int16)
+    pixelsSet = WandEffectLogic.floodFill(backgroundArray, labelArray, (2, 2), 1, 1, 1, False, 4)
+    # the pixel that exceeds the limit is still filled
+    self.assertEqual(pixelsSet, 5)
+    # center, then its neighbors in the order of first axis -1, +1, second axis -1, +1
+    expectedLabelArray = numpy.zeros((5, 5), dtype=numpy.int16)
+    expectedLabelArray[1:4, 2] = 1
+    expectedLabelArray[2, 1:4] = 1
+    numpy.testing.assert_array_equal(labelArray, expectedLabelArray)
+
+    # second layer is cut off in the order as the pixels are reached from the first layer
+    labelArray = numpy.zeros((5, 5), dtype=numpy.int16)
+    WandEffectLogic.floodFill(backgroundArray, labelArray, (2, 2), 1, 1, 1, False, 6)
+    expectedLabelArray[0, 2] = 1
+    expectedLabelArray[1, 1] = 1
+    numpy.testing.assert_array_equal(labelArray, expectedLabelArray)
+
+  def test_FloodFillBorder(self):
+    # the region must not wrap around to the other side of the array
+    backgroundArray = numpy.zeros((4, 6), dtype=numpy.int16)
+    backgroundArray[:, 0] = 1
+    backgroundArray[:, -1] = 1
+    labelArray = numpy.zeros((4, 6), dtype=numpy.int16)
+    pixelsSet = WandEffectLogic.floodFill(backgroundArray, labelArray, (0, 0), 1, 1, 1, False, 100)
+    self.assertEqual(pixelsSet, 4)
+    numpy.testing.assert_array_equal(labelArray[:, 0], 1)
+    self.assertEqual(labelArray[:, 1:].sum(), 0)
+
+    # seed outside of the array
+    self.assertEqual(WandEffectLogic.floodFill(backgroundArray, labelArray, (-1, 0), 1, 1, 1, False, 100), 0)
+    self.assertEqual(WandEffectLogic.floodFill(backgroundArray, labelArray, (0, 6), 1, 1, 1, False, 100), 0)
+
+  def test_FloodFillMatchesQueueOrder(self):
+    randomState = numpy.random.RandomState(0)
+    for shape in [(20, 30), (8, 9, 10)]:
+      for paintOver in [False, True]:
+        for maxPixels in [0, 7, 40, 100000]:
+          backgroundArray = randomState.randint(0, 4, shape).astype(numpy.int16)
+          labelArray = randomState.choice([0, 0, 0, 1, 2], shape).astype(numpy.int16)
+          seed = tuple([size // 2 for size in shape])
+          referenceLabelArray = labelArray.copy()
+          pixelsSet = WandEffectLogic.floodFill(backgroundArray, labelArray, seed, 1, 0, 2, paintOver, maxPixels)
+          referencePixelsSet = self.referenceFloodFill(backgroundArray, referenceLabelArray, seed, 1, 0, 2, paintOver, maxPixels)
+          self.assertEqual(pixelsSet, referencePixelsSet)
+          numpy.testing.assert_array_equal(labelArray, referenceLabelArray)
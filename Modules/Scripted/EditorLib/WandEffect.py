@@ -292,15 +292,20 @@ class WandEffectLogic(LabelEffectLogic):
       # for the input volume
       ijkPlane = self.sliceIJKPlane()
       i,j,k = ijk
+      # the slice index is clamped, so that a slice position that is rounded to outside
+      # of the volume does not select a plane from the other side of the volume
       if ijkPlane == 'JK':
+        k = min(max(k, 0), shape[2] - 1)
         backgroundDrawArray = backgroundArray[:,:,k]
         labelDrawArray = labelArray[:,:,k]
         ijk = (i, j)
       if ijkPlane == 'IK':
+        j = min(max(j, 0), shape[1] - 1)
         backgroundDrawArray = backgroundArray[:,j,:]
         labelDrawArray = labelArray[:,j,:]
         ijk = (i, k)
       if ijkPlane == 'IJ':
+        i = min(max(i, 0), shape[0] - 1)
         backgroundDrawArray = backgroundArray[i,:,:]
         labelDrawArray = labelArray[i,:,:]
         ijk = (j, k)
@@ -308,73 +313,93 @@ class WandEffectLogic(LabelEffectLogic):
       backgroundDrawArray = backgroundArray
       labelDrawArray = labelArray
 
+    if any([index < 0 or index >= size for index, size in zip(ijk, backgroundDrawArray.shape)]):
+      # clicked outside of the volume
+      return
+
     #
-    # do a recursive search for pixels to change
+    # fill the connected region of pixels to change
     #
     self.undoRedo.saveState()
-    value = backgroundDrawArray[ijk]
     label = EditUtil.getLabel()
     if paintThreshold:
       lo = thresholdMin
       hi = thresholdMax
     else:
+      value = backgroundDrawArray[ijk]
       lo = value - tolerance
       hi = value + tolerance
-    pixelsSet = 0
-    toVisit = [ijk,]
-    # Create a map that contains the location of the pixels
-    # that have been already visited (added or considered to be added).
-    # This is required if paintOver is enabled because then we reconsider
-    # all pixels (not just the ones that have not labelled yet).
-    if paintOver:
-      labelDrawVisitedArray = numpy.zeros(labelDrawArray.shape,dtype='bool')
-
-    while toVisit != []:
-      location = toVisit.pop(0)
-      try:
-        l = labelDrawArray[location]
-        b = backgroundDrawArray[location]
-      except IndexError:
-        continue
-      if (not paintOver and l != 0):
-        # label filled already and not painting over, leave it alone
-        continue
-      if (paintOver and l == label):
-        # label is the current one, but maybe it was filled with another high/low value,
-        # so we have to visit it once (and only once) in this session, too
-        if  labelDrawVisitedArray[location]:
-          # visited already, so don't try to fill it again
-          continue
-        else:
-          # we'll visit this pixel now, so mark it as visited
-          labelDrawVisitedArray[location] = True
-      if b < lo or b > hi:
-        continue
-      labelDrawArray[location] = label
-      if l != label:
-        # only count those pixels that were changed (to allow step-by-step growing by multiple mouse clicks)
-        pixelsSet += 1
-      if pixelsSet > maxPixels:
-        toVisit = []
-      else:
-        if self.fillMode == 'Plane':
-          # add the 4 neighbors to the stack
-          toVisit.append((location[0] - 1, location[1]     ))
-          toVisit.append((location[0] + 1, location[1]     ))
-          toVisit.append((location[0]    , location[1] - 1 ))
-          toVisit.append((location[0]    , location[1] + 1 ))
-        elif self.fillMode == 'Volume':
-          # add the 6 neighbors to the stack
-          toVisit.append((location[0] - 1, location[1]    , location[2]    ))
-          toVisit.append((location[0] + 1, location[1]    , location[2]    ))
-          toVisit.append((location[0]    , location[1] - 1, location[2]    ))
-          toVisit.append((location[0]    , location[1] + 1, location[2]    ))
-          toVisit.append((location[0]    , location[1]    , location[2] - 1))
-          toVisit.append((location[0]    , location[1]    , location[2] + 1))
+    self.floodFill(backgroundDrawArray, labelDrawArray, ijk, label, lo, hi, paintOver, maxPixels)
 
     # signal to slicer that the label needs to be updated
     EditUtil.markVolumeNodeAsModified(labelNode)
 
+  @staticmethod
+  def floodFill(backgroundArray, labelArray, seed, label, lo, hi, paintOver, maxPixels):
+    """Set label in the region that is connected to the seed (with 4-connectivity in 2D
+    and 6-connectivity in 3D) where background values are in the [lo, hi] range.
+    If paintOver is disabled then only unlabeled pixels are changed.
+    The region is grown in breadth-first order, one layer of neighbors at a time.
+    Within a layer, pixels are visited in the order as they are first reached from the
+    previous layer (neighbors along the first array axis first), so the region is the same
+    as the one filled by visiting pixels one by one from a first-in first-out queue.
+    Growing stops when more than maxPixels pixels have been changed: the pixel that
+    exceeds the limit is still filled. Pixels outside the array are never visited.
+    Returns the number of pixels that have been changed.
+    """
+    import numpy
+    shape = backgroundArray.shape
+    if len(seed) != len(shape) or any([index < 0 or index >= size for index, size in zip(seed, shape)]):
+      # seed is outside of the volume
+      return 0
+
+    # pixels that may be added to the region; pixels are removed from this mask as they are visited
+    candidateMask = (backgroundArray >= lo) & (backgroundArray <= hi)
+    if not paintOver:
+      candidateMask &= (labelArray == 0)
+    if not candidateMask[seed]:
+      return 0
+    candidateMask = candidateMask.ravel()
+
+    # first pixels that would exceed the maximum number of changed pixels are still filled, as before
+    maxChangedPixels = int(maxPixels) + 1
+    pixelsSet = 0
+    front = numpy.array([numpy.ravel_multi_index(seed, shape)])
+    candidateMask[front] = False
+    while front.size > 0:
+      frontIndices = numpy.unravel_index(front, shape)
+      # only count those pixels that were changed (to allow step-by-step growing by multiple mouse clicks)
+      changed = labelArray[frontIndices] != label
+      numberOfChanged = numpy.count_nonzero(changed)
+      if pixelsSet + numberOfChanged >= maxChangedPixels:
+        # fill front only up to the pixel that reaches the limit
+        lastPixel = numpy.searchsorted(numpy.cumsum(changed), maxChangedPixels - pixelsSet)
+        frontIndices = tuple([indices[:lastPixel+1] for indices in frontIndices])
+        labelArray[frontIndices] = label
+        pixelsSet = maxChangedPixels
+        break
+      labelArray[frontIndices] = label
+      pixelsSet += numberOfChanged
+
+      # collect unvisited neighbors of the front (neighbors outside the array are ignored),
+      # for each front pixel in the order: -1 and +1 along the first axis, then along the next axis, ...
+      neighbors = numpy.empty((front.size, 2 * len(shape)), dtype=front.dtype)
+      insideArray = numpy.empty(neighbors.shape, dtype=bool)
+      for axis in range(len(shape)):
+        stride = int(numpy.prod(shape[axis+1:]))
+        neighbors[:, 2 * axis] = front - stride
+        neighbors[:, 2 * axis + 1] = front + stride
+        insideArray[:, 2 * axis] = frontIndices[axis] > 0
+        insideArray[:, 2 * axis + 1] = frontIndices[axis] < shape[axis] - 1
+      neighbors = neighbors[insideArray]
+      neighbors = neighbors[candidateMask[neighbors]]
+      # keep the first occurrence of each pixel
+      _, firstIndices = numpy.unique(neighbors, return_index=True)
+      front = neighbors[numpy.sort(firstIndices)]
+      candidateMask[front] = False
+
+    return pixelsSet
+
 #
 # The WandEffect class definition
 #
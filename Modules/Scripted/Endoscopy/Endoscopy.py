@@ -1,5 +1,6 @@
 from __future__ import print_function
 import os
+import time
 import unittest
 import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
@@ -27,6 +28,7 @@ Clicking "Create path" will make a path model and enable the flythrough panel.
 You can manually scroll through the path with the Frame slider. The Play/Pause button toggles animated flythrough.
 The Frame Skip slider speeds up the animation by skipping points on the path.
 The Frame Delay slider slows down the animation by adding more time between frames.
+When Real-time playback is enabled, the Frame Delay sets the playback speed: the flythrough advances by one frame (plus the skipped frames) per frame delay, and frames are skipped if rendering is slower than the frame delay, to keep the flythrough speed constant.
 The View Angle provides is used to approximate the optics of an endoscopy system.
 """
     self.parent.helpText += self.getDefaultModuleDocumentationLink()
@@ -53,8 +55,12 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
     # Flythough variables
     self.transform = None
     self.path = None
+    self.keyframes = None
+    self.cursorMatrix = vtk.vtkMatrix4x4()
     self.camera = None
     self.skip = 0
+    self.lastFrameTime = 0
+    self.frameFraction = 0.
     self.timer = qt.QTimer()
     self.timer.setInterval(20)
     self.timer.connect('timeout()', self.flyToNext)
@@ -138,6 +144,13 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
     frameDelaySlider.value = 20
     flythroughFormLayout.addRow("Frame delay:", frameDelaySlider)
 
+    # Real-time playback checkbox
+    realTimeCheckBox = qt.QCheckBox()
+    realTimeCheckBox.toolTip = "Advance frames based on elapsed time instead of frame count. " \
+      "Frames are skipped if rendering is slower than the frame delay to keep the flythrough speed constant."
+    realTimeCheckBox.checked = False
+    flythroughFormLayout.addRow("Real-time playback:", realTimeCheckBox)
+
     # View angle slider
     viewAngleSlider = ctk.ctkSliderWidget()
     viewAngleSlider.connect('valueChanged(double)', self.viewAngleSliderValueChanged)
@@ -162,6 +175,7 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
     self.createPathButton = createPathButton
     self.flythroughCollapsibleButton = flythroughCollapsibleButton
     self.frameSlider = frameSlider
+    self.realTimeCheckBox = realTimeCheckBox
     self.viewAngleSlider = viewAngleSlider
     self.playButton = playButton
 
@@ -233,9 +247,10 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
     self.transform = model.transform
     self.pathPlaneNormal = model.planeNormal
     self.path = result.path
+    self.keyframes = EndoscopyCameraKeyframes(result.path, model.planeNormal)
 
     # Enable / Disable flythrough button
-    self.flythroughCollapsibleButton.enabled = len(result.path) > 0
+    self.flythroughCollapsibleButton.enabled = self.keyframes.numberOfFrames > 0
 
   def frameSliderValueChanged(self, newValue):
     #print "frameSliderValueChanged:", newValue
@@ -257,6 +272,8 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
 
   def onPlayButtonToggled(self, checked):
     if checked:
+      self.lastFrameTime = time.time()
+      self.frameFraction = 0.
       self.timer.start()
       self.playButton.text = "Stop"
     else:
@@ -265,74 +282,72 @@ class EndoscopyWidget(ScriptedLoadableModuleWidget):
 
   def flyToNext(self):
     currentStep = self.frameSlider.value
-    nextStep = currentStep + self.skip + 1
-    if nextStep > len(self.path) - 2:
-      nextStep = 0
+    if self.realTimeCheckBox.checked:
+      now = time.time()
+      nextStep, self.frameFraction = self.realTimeStep(currentStep, self.frameFraction,
+        now - self.lastFrameTime, self.timer.interval, self.skip, int(self.frameSlider.maximum) + 1)
+      self.lastFrameTime = now
+    else:
+      nextStep = currentStep + self.skip + 1
+      if nextStep > self.frameSlider.maximum:
+        nextStep = 0
     self.frameSlider.value = nextStep
 
+  @staticmethod
+  def realTimeStep(currentStep, frameFraction, elapsedTime, frameDelay, skip, numberOfSteps):
+    """Return the step to display after elapsedTime seconds of real-time playback and
+    the fraction of a step that is carried over to the next frame.
+    One frame (plus skip frames) is advanced per frameDelay milliseconds and
+    playback restarts at the first step after the last one."""
+    # advance by the number of frames that should have been displayed since the last one
+    elapsedFrames = elapsedTime * 1000. / max(frameDelay, 1) * (skip + 1)
+    position = currentStep + frameFraction + elapsedFrames
+    nextStep = int(position)
+    return nextStep % max(numberOfSteps, 1), position - nextStep
+
   def flyTo(self, f):
     """ Apply the fth step in the path to the global camera"""
-    if self.path:
-      f = int(f)
-      p = self.path[f]
-      wasModified = self.cameraNode.StartModify()
-      self.camera.SetPosition(*p)
-      foc = self.path[f+1]
-      self.camera.SetFocalPoint(*foc)
-      self.camera.OrthogonalizeViewUp()
-
-      toParent = vtk.vtkMatrix4x4()
-      self.transform.GetMatrixTransformToParent(toParent)
-      toParent.SetElement(0 ,3, p[0])
-      toParent.SetElement(1, 3, p[1])
-      toParent.SetElement(2, 3, p[2])
-
-      # Set up transform orientation component so that
-      # Z axis is aligned with view direction and
-      # Y vector is aligned with the curve's plane normal.
-      # This can be used for example to show a reformatted slice
-      # using with SlicerIGT extension's VolumeResliceDriver module.
-      import numpy as np
-      zVec = (foc-p)/np.linalg.norm(foc-p)
-      yVec = self.pathPlaneNormal
-      xVec = np.cross(yVec, zVec)
-      toParent.SetElement(0, 0, xVec[0])
-      toParent.SetElement(1, 0, xVec[1])
-      toParent.SetElement(2, 0, xVec[2])
-      toParent.SetElement(0, 1, yVec[0])
-      toParent.SetElement(1, 1, yVec[1])
-      toParent.SetElement(2, 1, yVec[2])
-      toParent.SetElement(0, 2, zVec[0])
-      toParent.SetElement(1, 2, zVec[1])
-      toParent.SetElement(2, 2, zVec[2])
-
-      self.transform.SetMatrixTransformToParent(toParent)
-
-      self.cameraNode.EndModify(wasModified)
-      self.cameraNode.ResetClippingRange()
+    if self.keyframes is None:
+      return
+    f = int(f)
+    if f < 0 or f >= self.keyframes.numberOfFrames:
+      return
+    wasModified = self.cameraNode.StartModify()
+    self.camera.SetPosition(*self.keyframes.positions[f])
+    self.camera.SetFocalPoint(*self.keyframes.focalPoints[f])
+    self.camera.SetViewUp(*self.keyframes.viewUps[f])
+
+    # Cursor transform Z axis is aligned with view direction and
+    # Y axis is aligned with the view-up (the curve's plane normal).
+    # This can be used for example to show a reformatted slice
+    # using with SlicerIGT extension's VolumeResliceDriver module.
+    self.cursorMatrix.DeepCopy(self.keyframes.cursorToParent[f].ravel())
+    self.transform.SetMatrixTransformToParent(self.cursorMatrix)
+
+    self.cameraNode.EndModify(wasModified)
+    self.cameraNode.ResetClippingRange()
 
 class EndoscopyComputePath(object):
   """Compute path given a list of fiducials.
   A Hermite spline interpolation is used. See http://en.wikipedia.org/wiki/Cubic_Hermite_spline
 
+  The curve is densely sampled and resampled at equal arc length steps of ``dl``
+  by inverting the cumulative curve length, starting at the first control point
+  and ending at the last one. The result is stored as a numpy array of
+  shape (N, 3) in ``path``.
+
   Example:
     result = EndoscopyComputePath(fiducialListNode)
     print "computer path has %d elements" % len(result.path)
 
   """
 
-  def __init__(self, fiducialListNode, dl = 0.5):
+  def __init__(self, fiducialListNode, dl = 0.5, samplesPerStep = 4):
     import numpy
     self.dl = dl # desired world space step size (in mm)
-    self.dt = dl # current guess of parametric stepsize
+    self.samplesPerStep = samplesPerStep # number of curve samples per dl for arc length estimation
     self.fids = fiducialListNode
 
-    # hermite interpolation functions
-    self.h00 = lambda t: 2*t**3 - 3*t**2     + 1
-    self.h10 = lambda t:   t**3 - 2*t**2 + t
-    self.h01 = lambda t:-2*t**3 + 3*t**2
-    self.h11 = lambda t:   t**3 -   t**2
-
     # n is the number of control points in the piecewise curve
 
     if self.fids.GetClassName() == "vtkMRMLAnnotationHierarchyNode":
@@ -379,118 +394,186 @@ class EndoscopyComputePath(object):
     # - first tangent is out vector, last is in vector
     # - sets self.m
     n = self.n
-    fm = numpy.zeros((n,3))
-    for i in range(0,n-1):
-      fm[i] = self.p[i+1] - self.p[i]
     self.m = numpy.zeros((n,3))
-    for i in range(1,n-1):
-      self.m[i] = (fm[i-1] + fm[i]) / 2.
-    self.m[0] = fm[0]
-    self.m[n-1] = fm[n-2]
+    if n > 1:
+      fm = numpy.diff(self.p, axis=0)
+      self.m[1:-1] = (fm[:-1] + fm[1:]) / 2.
+      self.m[0] = fm[0]
+      self.m[-1] = fm[-1]
 
-    self.path = [self.p[0]]
     self.calculatePath()
 
   def calculatePath(self):
     """ Generate a flight path for of steps of length dl """
     #
-    # calculate the actual path
-    # - take steps of self.dl in world space
-    # -- if dl steps into next segment, take a step of size "remainder" in the new segment
+    # - sample each segment densely (number of samples proportional to an upper bound
+    #   of the segment length) and compute the cumulative length along the samples
+    # - find the curve parameter at each multiple of dl by linear interpolation of
+    #   the cumulative length and evaluate the curve there
+    # - the last control point is always the last point of the path
     # - put resulting points into self.path
     #
+    import numpy
     n = self.n
-    segment = 0 # which first point of current segment
-    t = 0 # parametric current parametric increment
-    remainder = 0 # how much of dl isn't included in current step
-    while segment < n-1:
-      t, p, remainder = self.step(segment, t, self.dl)
-      if remainder != 0 or t == 1.:
-        segment += 1
-        t = 0
-        if segment < n-1:
-          t, p, remainder = self.step(segment, t, remainder)
-      self.path.append(p)
+    if n < 2:
+      self.path = self.p[:1].copy()
+      return
+
+    # Length of the Bezier control polygon of each segment is an upper bound of the segment length
+    controlPolygon = numpy.stack([self.p[:-1], self.p[:-1] + self.m[:-1] / 3.,
+      self.p[1:] - self.m[1:] / 3., self.p[1:]], axis=1)
+    segmentLengthBounds = numpy.linalg.norm(numpy.diff(controlPolygon, axis=1), axis=2).sum(axis=1)
+    samplesPerSegment = numpy.maximum(numpy.ceil(segmentLengthBounds * self.samplesPerStep / self.dl), 1).astype(int)
+
+    # Curve parameter of the samples: segment index + local parameter in [0, 1)
+    sampleSegments = numpy.repeat(numpy.arange(n-1), samplesPerSegment)
+    firstSampleIndices = numpy.repeat(numpy.cumsum(samplesPerSegment) - samplesPerSegment, samplesPerSegment)
+    sampleT = (numpy.arange(len(sampleSegments)) - firstSampleIndices) / numpy.repeat(samplesPerSegment, samplesPerSegment).astype(float)
+    sampleParameters = numpy.append(sampleSegments + sampleT, n-1)
+
+    samplePoints = self.points(sampleParameters)
+    sampleLengths = numpy.zeros(len(samplePoints))
+    numpy.cumsum(numpy.linalg.norm(numpy.diff(samplePoints, axis=0), axis=1), out=sampleLengths[1:])
+    totalLength = sampleLengths[-1]
+    if totalLength <= 0:
+      # all control points are at the same position
+      self.path = self.p[:1].copy()
+      return
+
+    # Arc length of the path points
+    pathLengths = numpy.arange(0., totalLength, self.dl)
+    if totalLength - pathLengths[-1] > 1e-6 * self.dl:
+      pathLengths = numpy.append(pathLengths, totalLength)
+    else:
+      pathLengths[-1] = totalLength
+
+    # Invert the cumulative length
+    intervals = numpy.clip(numpy.searchsorted(sampleLengths, pathLengths, side='right') - 1, 0, len(sampleLengths) - 2)
+    intervalLengths = sampleLengths[intervals+1] - sampleLengths[intervals]
+    fractions = numpy.zeros(len(pathLengths))
+    nonEmpty = intervalLengths > 0
+    fractions[nonEmpty] = (pathLengths[nonEmpty] - sampleLengths[intervals[nonEmpty]]) / intervalLengths[nonEmpty]
+    pathParameters = sampleParameters[intervals] + fractions * (sampleParameters[intervals+1] - sampleParameters[intervals])
+
+    self.path = self.points(pathParameters)
+    # use exact control point positions at both ends
+    self.path[0] = self.p[0]
+    self.path[-1] = self.p[-1]
+
+  def points(self, parameters):
+    """Evaluate the curve at the given parameters, where the integer part of a parameter
+    is the segment index and the fractional part is the position in the segment.
+    Returns a numpy array of shape (N, 3)."""
+    import numpy
+    parameters = numpy.asarray(parameters, dtype=float)
+    segments = numpy.clip(numpy.floor(parameters).astype(int), 0, self.n-2)
+    t = (parameters - segments)[:, numpy.newaxis]
+    t2 = t*t
+    t3 = t2*t
+    # hermite interpolation functions
+    h00 = 2*t3 - 3*t2 + 1
+    h10 = t3 - 2*t2 + t
+    h01 = -2*t3 + 3*t2
+    h11 = t3 - t2
+    return (h00*self.p[segments] +
+              h10*self.m[segments] +
+              h01*self.p[segments+1] +
+              h11*self.m[segments+1])
 
   def point(self,segment,t):
-    return (self.h00(t)*self.p[segment] +
-              self.h10(t)*self.m[segment] +
-              self.h01(t)*self.p[segment+1] +
-              self.h11(t)*self.m[segment+1])
-
-  def step(self,segment,t,dl):
-    """ Take a step of dl and return the path point and new t
-      return:
-      t = new parametric coordinate after step
-      p = point after step
-      remainder = if step results in parametic coordinate > 1.0, then
-        this is the amount of world space not covered by step
-    """
-    import numpy.linalg
-    p0 = self.path[self.path.__len__() - 1] # last element in path
-    remainder = 0
-    ratio = 100
-    count = 0
-    while abs(1. - ratio) > 0.05:
-      t1 = t + self.dt
-      pguess = self.point(segment,t1)
-      dist = numpy.linalg.norm(pguess - p0)
-      ratio = self.dl / dist
-      self.dt *= ratio
-      if self.dt < 0.00000001:
-        return
-      count += 1
-      if count > 500:
-        return (t1, pguess, 0)
-    if t1 > 1.:
-      t1 = 1.
-      p1 = self.point(segment, t1)
-      remainder = numpy.linalg.norm(p1 - pguess)
-      pguess = p1
-    return (t1, pguess, remainder)
+    return self.points([segment + t])[0]
+
+
+class EndoscopyCameraKeyframes(object):
+  """Precompute camera poses and cursor transforms for all frames of a flythrough.
+
+  Frame i places the camera at path point i, looking at path point i+1. The view-up
+  is the normal of the plane fitted to the path, orthogonalized with respect to the
+  view direction (where they are parallel, the view-up of the previous frame is used).
+  Cursor transforms have their Z axis aligned with the view direction and their
+  Y axis with the view-up.
+
+  Example:
+    keyframes = EndoscopyCameraKeyframes(result.path, model.planeNormal)
+    camera.SetPosition(*keyframes.positions[i])
+
+  """
+
+  def __init__(self, path, planeNormal):
+    import numpy
+    path = numpy.asarray(path, dtype=float).reshape(-1, 3)
+    self.positions = path[:-1].copy()
+    self.focalPoints = path[1:].copy()
+    self.numberOfFrames = len(self.positions)
+
+    # view direction (z axis)
+    directions = self.focalPoints - self.positions
+    directionLengths = numpy.linalg.norm(directions, axis=1)
+    validDirections = directionLengths > 0
+    directions[validDirections] /= directionLengths[validDirections, numpy.newaxis]
+    directions = self.propagateValidRows(directions, validDirections, [0., 0., 1.])
+
+    # view-up (y axis)
+    planeNormal = numpy.asarray(planeNormal, dtype=float)
+    viewUps = planeNormal - numpy.dot(directions, planeNormal)[:, numpy.newaxis] * directions
+    viewUpLengths = numpy.linalg.norm(viewUps, axis=1)
+    validViewUps = viewUpLengths > 1e-3 * numpy.linalg.norm(planeNormal)
+    viewUps[validViewUps] /= viewUpLengths[validViewUps, numpy.newaxis]
+    viewUps = self.propagateValidRows(viewUps, validViewUps, [0., 1., 0.])
+    # re-orthogonalize the propagated vectors
+    viewUps -= numpy.sum(viewUps * directions, axis=1)[:, numpy.newaxis] * directions
+    viewUpLengths = numpy.linalg.norm(viewUps, axis=1)
+    degenerate = viewUpLengths < 1e-6
+    if numpy.any(degenerate):
+      # view-up is still parallel to view direction, pick any perpendicular vector
+      axes = numpy.eye(3)[numpy.argmin(numpy.abs(directions[degenerate]), axis=1)]
+      viewUps[degenerate] = numpy.cross(directions[degenerate], axes)
+      viewUpLengths[degenerate] = numpy.linalg.norm(viewUps[degenerate], axis=1)
+    self.viewUps = viewUps / viewUpLengths[:, numpy.newaxis]
+
+    # cursor transforms
+    self.cursorToParent = numpy.zeros((self.numberOfFrames, 4, 4))
+    self.cursorToParent[:, :3, 0] = numpy.cross(self.viewUps, directions)
+    self.cursorToParent[:, :3, 1] = self.viewUps
+    self.cursorToParent[:, :3, 2] = directions
+    self.cursorToParent[:, :3, 3] = self.positions
+    self.cursorToParent[:, 3, 3] = 1.
+
+  @staticmethod
+  def propagateValidRows(vectors, valid, defaultVector):
+    """Replace invalid rows by the closest preceding valid row (following
+    valid row for leading invalid rows, defaultVector if no row is valid)."""
+    import numpy
+    if numpy.all(valid):
+      return vectors
+    if not numpy.any(valid):
+      return numpy.tile(numpy.asarray(defaultVector, dtype=float), (len(vectors), 1))
+    indices = numpy.where(valid, numpy.arange(len(valid)), 0)
+    indices[:numpy.argmax(valid)] = numpy.argmax(valid)
+    return vectors[numpy.maximum.accumulate(indices)]
 
 
 class EndoscopyPathModel(object):
   """Create a vtkPolyData for a polyline:
        - Add one point per path point.
        - Add a single polyline
+     Path can be a list of points or a numpy array of shape (N, 3).
   """
   def __init__(self, path, fiducialListNode):
 
     fids = fiducialListNode
     scene = slicer.mrmlScene
 
-    points = vtk.vtkPoints()
-    polyData = vtk.vtkPolyData()
-    polyData.SetPoints(points)
-
-    lines = vtk.vtkCellArray()
-    polyData.SetLines(lines)
-    linesIDArray = lines.GetData()
-    linesIDArray.Reset()
-    linesIDArray.InsertNextTuple1(0)
-
-    polygons = vtk.vtkCellArray()
-    polyData.SetPolys( polygons )
-    idArray = polygons.GetData()
-    idArray.Reset()
-    idArray.InsertNextTuple1(0)
-
-    for point in path:
-      pointIndex = points.InsertNextPoint(*point)
-      linesIDArray.InsertNextTuple1(pointIndex)
-      linesIDArray.SetTuple1( 0, linesIDArray.GetNumberOfTuples() - 1 )
-      lines.SetNumberOfCells(1)
-
-    import vtk.util.numpy_support as VN
-    pointsArray = VN.vtk_to_numpy(points.GetData())
+    import numpy
+    pointsArray = numpy.asarray(path, dtype=float).reshape(-1, 3)
     self.planePosition, self.planeNormal = self.planeFit(pointsArray.T)
 
     # Create model node
     model = slicer.vtkMRMLModelNode()
     model.SetScene(scene)
     model.SetName(scene.GenerateUniqueName("Path-%s" % fids.GetName()))
-    model.SetAndObservePolyData(polyData)
+    # Single polyline through all the path points
+    slicer.util.updateModelFromArrays(model, pointsArray, lines=numpy.arange(len(pointsArray))[numpy.newaxis, :])
 
     # Create display node
     modelDisplay = slicer.vtkMRMLModelDisplayNode()
@@ -549,3 +632,139 @@ class EndoscopyPathModel(object):
     x = points - ctr[:,np.newaxis]
     M = np.dot(x, x.T) # Could also use np.cov(x) here.
     return ctr, svd(M)[0][:,-1]
+
+
+class EndoscopyTest(ScriptedLoadableModuleTest):
+  """
+  This is the test case for your scripted module.
+  Uses ScriptedLoadableModuleTest base class, available at:
+  https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+  """
+
+  def setUp(self):
+    slicer.mrmlScene.Clear(0)
+
+  def runTest(self):
+    self.setUp()
+    self.test_ComputePathStepLength()
+    self.setUp()
+    self.test_ComputePathZeroLength()
+    self.setUp()
+    self.test_CameraKeyframes()
+    self.setUp()
+    self.test_CameraKeyframesDegenerate()
+    self.setUp()
+    self.test_RealTimeStep()
+
+  @staticmethod
+  def createFiducials(points):
+    fiducialsNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLMarkupsFiducialNode')
+    for point in points:
+      fiducialsNode.AddFiducial(*point)
+    return fiducialsNode
+
+  def test_ComputePathStepLength(self):
+    import numpy
+    controlPoints = [[0, 0, 0], [10, 5, 0], [20, 0, 3], [30, 10, 5]]
+    fiducialsNode = self.createFiducials(controlPoints)
+    for dl in [0.5, 1.0]:
+      result = EndoscopyComputePath(fiducialsNode, dl)
+      # path starts and ends at the first and last control points
+      numpy.testing.assert_allclose(result.path[0], controlPoints[0])
+      numpy.testing.assert_allclose(result.path[-1], controlPoints[-1])
+      # all steps are dl long along the curve (chords are slightly shorter), except the last one
+      stepLengths = numpy.linalg.norm(numpy.diff(result.path, axis=0), axis=1)
+      numpy.testing.assert_allclose(stepLengths[:-1], dl, rtol=0.01)
+      self.assertGreater(stepLengths[-1], 0)
+      self.assertLessEqual(stepLengths[-1], dl * 1.01)
+
+  def test_ComputePathZeroLength(self):
+    import numpy
+    # coincident control points
+    result = EndoscopyComputePath(self.createFiducials([[1, 2, 3], [1, 2, 3], [1, 2, 3]]))
+    numpy.testing.assert_allclose(result.path, [[1, 2, 3]])
+    # single control point
+    result = EndoscopyComputePath(self.createFiducials([[4, 5, 6]]))
+    numpy.testing.assert_allclose(result.path, [[4, 5, 6]])
+
+  def assertKeyframesOrthonormal(self, keyframes):
+    import numpy
+    directions = keyframes.focalPoints - keyframes.positions
+    for frameIndex in range(keyframes.numberOfFrames):
+      viewUp = keyframes.viewUps[frameIndex]
+      self.assertAlmostEqual(numpy.linalg.norm(viewUp), 1.0)
+      if numpy.linalg.norm(directions[frameIndex]) > 0:
+        self.assertAlmostEqual(numpy.dot(viewUp, directions[frameIndex]), 0.0)
+      # cursor transform is a rigid transform located at the camera position
+      cursorToParent = keyframes.cursorToParent[frameIndex]
+      rotation = cursorToParent[:3, :3]
+      numpy.testing.assert_allclose(numpy.dot(rotation.T, rotation), numpy.eye(3), atol=1e-9)
+      self.assertAlmostEqual(numpy.linalg.det(rotation), 1.0)
+      numpy.testing.assert_allclose(cursorToParent[:3, 1], viewUp)
+      numpy.testing.assert_allclose(cursorToParent[:3, 3], keyframes.positions[frameIndex])
+      numpy.testing.assert_allclose(cursorToParent[3], [0, 0, 0, 1])
+
+  def test_CameraKeyframes(self):
+    import numpy
+    controlPoints = [[0, 0, 0], [10, 5, 0], [20, 0, 3], [30, 10, 5]]
+    path = EndoscopyComputePath(self.createFiducials(controlPoints)).path
+    planeNormal = [0.1, -0.2, 1.0]
+    keyframes = EndoscopyCameraKeyframes(path, planeNormal)
+    self.assertEqual(keyframes.numberOfFrames, len(path) - 1)
+    numpy.testing.assert_allclose(keyframes.positions, path[:-1])
+    numpy.testing.assert_allclose(keyframes.focalPoints, path[1:])
+    self.assertKeyframesOrthonormal(keyframes)
+    # cursor Z axis is the view direction and view-up points to the side of the plane normal
+    directions = path[1:] - path[:-1]
+    directions /= numpy.linalg.norm(directions, axis=1)[:, numpy.newaxis]
+    numpy.testing.assert_allclose(keyframes.cursorToParent[:, :3, 2], directions, atol=1e-9)
+    self.assertTrue(numpy.all(numpy.dot(keyframes.viewUps, planeNormal) > 0))
+
+  def test_CameraKeyframesDegenerate(self):
+    import numpy
+    # view direction parallel to the plane normal in some frames
+    path = [[0, 0, 0], [1, 0, 0], [1, 0, 1], [1, 0, 2], [2, 0, 2]]
+    keyframes = EndoscopyCameraKeyframes(path, [0, 0, 1])
+    self.assertKeyframesOrthonormal(keyframes)
+    numpy.testing.assert_allclose(keyframes.viewUps[0], [0, 0, 1], atol=1e-9)
+    numpy.testing.assert_allclose(keyframes.viewUps[3], [0, 0, 1], atol=1e-9)
+
+    # view direction parallel to the plane normal in all frames
+    keyframes = EndoscopyCameraKeyframes([[0, 0, 0], [0, 0, 1], [0, 0, 2]], [0, 0, 1])
+    self.assertKeyframesOrthonormal(keyframes)
+
+    # zero-length steps reuse the view direction of the closest valid step
+    keyframes = EndoscopyCameraKeyframes([[0, 0, 0], [0, 0, 0], [1, 0, 0], [1, 0, 0], [2, 0, 0]], [0, 0, 1])
+    self.assertKeyframesOrthonormal(keyframes)
+    numpy.testing.assert_allclose(keyframes.cursorToParent[:, :3, 2], numpy.tile([1, 0, 0], (4, 1)), atol=1e-9)
+
+    # all points at the same position
+    keyframes = EndoscopyCameraKeyframes([[1, 2, 3], [1, 2, 3]], [0, 0, 1])
+    self.assertKeyframesOrthonormal(keyframes)
+
+    # path of a single point has no frames
+    keyframes = EndoscopyCameraKeyframes([[1, 2, 3]], [0, 0, 1])
+    self.assertEqual(keyframes.numberOfFrames, 0)
+    self.assertEqual(keyframes.cursorToParent.shape, (0, 4, 4))
+
+  def test_RealTimeStep(self):
+    realTimeStep = EndoscopyWidget.realTimeStep
+    # one frame per frame delay
+    step, fraction = realTimeStep(10, 0., 0.1, 20, 0, 100)
+    self.assertEqual(step, 15)
+    self.assertAlmostEqual(fraction, 0.)
+    # skipped frames multiply the speed
+    step, fraction = realTimeStep(10, 0., 0.1, 20, 2, 100)
+    self.assertEqual(step, 25)
+    # fractions of frames are carried over to the next frame
+    step, fraction = realTimeStep(10, 0., 0.03, 20, 0, 100)
+    self.assertEqual(step, 11)
+    self.assertAlmostEqual(fraction, 0.5)
+    step, fraction = realTimeStep(step, fraction, 0.01, 20, 0, 100)
+    self.assertEqual(step, 12)
+    self.assertAlmostEqual(fraction, 0.)
+    # playback restarts after the last step
+    step, fraction = realTimeStep(98, 0., 0.1, 20, 0, 100)
+    self.assertEqual(step, 3)
+    # zero frame delay and empty path do not raise
+    self.assertEqual(realTimeStep(0, 0., 0.1, 0, 0, 0)[0], 0)
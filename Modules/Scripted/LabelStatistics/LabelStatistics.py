@@ -315,72 +315,81 @@ class LabelStatisticsLogic(ScriptedLoadableModuleLogic):
       # No input grayscale image data
       return
 
-    stataccum = vtk.vtkImageAccumulate()
-    stataccum.SetInputConnection(labelNode.GetImageDataConnection())
-    stataccum.Update()
-    lo = int(stataccum.GetMin()[0])
-    hi = int(stataccum.GetMax()[0])
-
-    for i in range(lo,hi+1):
-
-      # this->SetProgress((float)i/hi);
-      # std::string event_message = "Label "; std::stringstream s; s << i; event_message.append(s.str());
-      # this->InvokeEvent(vtkLabelStatisticsLogic::LabelStatsOuterLoop, (void*)event_message.c_str());
-
-      # logic copied from slicer3 LabelStatistics
-      # to create the binary volume of the label
-      # //logic copied from slicer2 LabelStatistics MaskStat
-      # // create the binary volume of the label
-      thresholder = vtk.vtkImageThreshold()
-      thresholder.SetInputConnection(labelNode.GetImageDataConnection())
-      thresholder.SetInValue(1)
-      thresholder.SetOutValue(0)
-      thresholder.ReplaceOutOn()
-      thresholder.ThresholdBetween(i,i)
-      thresholder.SetOutputScalarType(grayscaleNode.GetImageData().GetScalarType())
-      thresholder.Update()
-
-      # this.InvokeEvent(vtkLabelStatisticsLogic::LabelStatsInnerLoop, (void*)"0.25");
-
-      #  use vtk's statistics class with the binary labelmap as a stencil
-      stencil = vtk.vtkImageToImageStencil()
-      stencil.SetInputConnection(thresholder.GetOutputPort())
-      stencil.ThresholdBetween(1, 1)
-
-      # this.InvokeEvent(vtkLabelStatisticsLogic::LabelStatsInnerLoop, (void*)"0.5")
-
-      stat1 = vtk.vtkImageAccumulate()
-      stat1.SetInputConnection(grayscaleNode.GetImageDataConnection())
-      stencil.Update()
-      stat1.SetStencilData(stencil.GetOutput())
-
-      stat1.Update()
-
-      medians = vtk.vtkImageHistogramStatistics()
-      medians.SetInputConnection(grayscaleNode.GetImageDataConnection())
-      stencil.Update()
-      medians.SetStencilData(stencil.GetOutput())
-
-      medians.Update()
-
-      # this.InvokeEvent(vtkLabelStatisticsLogic::LabelStatsInnerLoop, (void*)"0.75")
-
-      if stat1.GetVoxelCount() > 0:
-        # add an entry to the LabelStats list
-        self.labelStats["Labels"].append(i)
-        self.labelStats[i,"Index"] = i
-        self.labelStats[i,"Count"] = stat1.GetVoxelCount()
-        self.labelStats[i,"Volume mm^3"] = self.labelStats[i,"Count"] * cubicMMPerVoxel
-        self.labelStats[i,"Volume cc"] = self.labelStats[i,"Volume mm^3"] * ccPerCubicMM
-        self.labelStats[i,"Min"] = stat1.GetMin()[0]
-        self.labelStats[i,"Max"] = stat1.GetMax()[0]
-        self.labelStats[i,"Mean"] = stat1.GetMean()[0]
-        self.labelStats[i,"Median"] = medians.GetMedian()
-        self.labelStats[i,"StdDev"] = stat1.GetStandardDeviation()[0]
-
-        # this.InvokeEvent(vtkLabelStatisticsLogic::LabelStatsInnerLoop, (void*)"1")
-
-    # this.InvokeEvent(vtkLabelStatisticsLogic::EndLabelStats, (void*)"end label stats")
+    statistics = self.computeLabelStatistics(grayscaleNode.GetImageData(), labelNode.GetImageData())
+    for index, i in enumerate(statistics["Labels"]):
+      # add an entry to the LabelStats list
+      self.labelStats["Labels"].append(i)
+      self.labelStats[i,"Index"] = i
+      self.labelStats[i,"Count"] = statistics["Count"][index]
+      self.labelStats[i,"Volume mm^3"] = self.labelStats[i,"Count"] * cubicMMPerVoxel
+      self.labelStats[i,"Volume cc"] = self.labelStats[i,"Volume mm^3"] * ccPerCubicMM
+      self.labelStats[i,"Min"] = statistics["Min"][index]
+      self.labelStats[i,"Max"] = statistics["Max"][index]
+      self.labelStats[i,"Mean"] = statistics["Mean"][index]
+      self.labelStats[i,"Median"] = statistics["Median"][index]
+      self.labelStats[i,"StdDev"] = statistics["StdDev"][index]
+
+  @staticmethod
+  def arrayFromImageData(imageData):
+    """Get first scalar component of the image as a 3D numpy array (indexed as [k,j,i])"""
+    import vtk.util.numpy_support
+    scalars = vtk.util.numpy_support.vtk_to_numpy(imageData.GetPointData().GetScalars())
+    shape = tuple(reversed(imageData.GetDimensions()))
+    return scalars.reshape(shape + (-1,))[..., 0]
+
+  @staticmethod
+  def computeLabelStatistics(grayscaleImage, labelImage):
+    """Compute statistics of grayscale image values for each label value present in the label image.
+    Voxels are grouped by label using a single stable sort of the label values, then the
+    statistics of each label are computed from the grayscale values of that label only
+    (the median is found by partial sorting), so no sorted copy of all grayscale values is made.
+    Results are identical to computing each label separately with vtkImageAccumulate
+    (count, min, max, mean, sample standard deviation) and vtkImageHistogramStatistics (median).
+    Returns dictionary with "Labels" (sorted list of present label values) and
+    "Count", "Min", "Max", "Mean", "Median", "StdDev" lists of the corresponding values.
+    """
+    import numpy
+    statistics = {"Labels": [], "Count": [], "Min": [], "Max": [], "Mean": [], "Median": [], "StdDev": []}
+
+    grayscaleArray = LabelStatisticsLogic.arrayFromImageData(grayscaleImage)
+    labelArray = LabelStatisticsLogic.arrayFromImageData(labelImage)
+    binOrigin, binSpacing = slicer.util.histogramBinning(grayscaleArray)
+
+    # only the overlapping region of the two images is analyzed
+    commonShape = numpy.minimum(grayscaleArray.shape, labelArray.shape)
+    commonRegion = tuple(slice(0, size) for size in commonShape)
+    labels = labelArray[commonRegion].ravel()
+    values = grayscaleArray[commonRegion].ravel()
+    if not numpy.issubdtype(labels.dtype, numpy.integer):
+      # label values are compared to integer label indices
+      integerLabels = (labels == numpy.floor(labels))
+      labels = labels[integerLabels]
+      values = values[integerLabels]
+    if labels.size == 0:
+      return statistics
+
+    # group voxels by label (stable sort of integer labels is a linear-time radix sort for small integer types)
+    order = numpy.argsort(labels, kind='stable')
+    sortedLabels = labels[order]
+    starts = numpy.concatenate([[0], numpy.flatnonzero(sortedLabels[1:] != sortedLabels[:-1]) + 1])
+    ends = numpy.append(starts[1:], len(sortedLabels))
+    presentLabels = sortedLabels[starts]
+    del sortedLabels
+
+    for label, start, end in zip(presentLabels, starts, ends):
+      labelValues = values[order[start:end]].astype(numpy.float64)
+      count = len(labelValues)
+      mean = labelValues.mean()
+      standardDeviation = labelValues.std(ddof=1) if count > 1 else 0.0
+      middleValue = numpy.partition(labelValues, count // 2)[count // 2]
+      statistics["Labels"].append(int(label))
+      statistics["Count"].append(int(count))
+      statistics["Min"].append(float(labelValues.min()))
+      statistics["Max"].append(float(labelValues.max()))
+      statistics["Mean"].append(float(mean))
+      statistics["Median"].append(float(slicer.util.histogramMedian(middleValue, binOrigin, binSpacing)))
+      statistics["StdDev"].append(float(standardDeviation))
+    return statistics
 
   def getColorNode(self):
     """Returns the color node corresponding to the labelmap. If a color node is explicitly
@@ -521,6 +530,10 @@ class LabelStatisticsTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_LabelStatisticsBasic()
+    self.setUp()
+    self.test_LabelStatisticsComputation()
+    self.setUp()
+    self.test_LabelStatisticsKnownValues()
 
   def test_LabelStatisticsBasic(self):
     """
@@ -554,6 +567,89 @@ class LabelStatisticsTest(ScriptedLoadableModuleTest):
 
     self.delayDisplay('test_LabelStatisticsBasic passed!')
 
+  def test_LabelStatisticsComputation(self):
+    """
+    Compare statistics computed for all labels at once with statistics
+    computed by VTK filters for each label separately
+    """
+    self.delayDisplay("Starting test_LabelStatisticsComputation")
+    import numpy as np
+
+    grayscaleNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+    labelNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+    np.random.seed(0)
+    slicer.util.updateVolumeFromArray(grayscaleNode, np.random.randint(-1000, 3000, (10, 20, 30)).astype(np.int16))
+    slicer.util.updateVolumeFromArray(labelNode, np.random.choice([0, 2, 3, 1000], (10, 20, 30)).astype(np.int16))
+
+    logic = LabelStatisticsLogic(grayscaleNode, labelNode)
+    self.assertEqual(logic.labelStats["Labels"], [0, 2, 3, 1000])
+
+    for label in logic.labelStats["Labels"]:
+      thresholder = vtk.vtkImageThreshold()
+      thresholder.SetInputConnection(labelNode.GetImageDataConnection())
+      thresholder.SetInValue(1)
+      thresholder.SetOutValue(0)
+      thresholder.ReplaceOutOn()
+      thresholder.ThresholdBetween(label, label)
+      thresholder.SetOutputScalarType(grayscaleNode.GetImageData().GetScalarType())
+      stencil = vtk.vtkImageToImageStencil()
+      stencil.SetInputConnection(thresholder.GetOutputPort())
+      stencil.ThresholdBetween(1, 1)
+      stencil.Update()
+      accumulate = vtk.vtkImageAccumulate()
+      accumulate.SetInputConnection(grayscaleNode.GetImageDataConnection())
+      accumulate.SetStencilData(stencil.GetOutput())
+      accumulate.Update()
+      histogramStatistics = vtk.vtkImageHistogramStatistics()
+      histogramStatistics.SetInputConnection(grayscaleNode.GetImageDataConnection())
+      histogramStatistics.SetStencilData(stencil.GetOutput())
+      histogramStatistics.Update()
+
+      self.assertEqual(logic.labelStats[label, "Count"], accumulate.GetVoxelCount())
+      self.assertEqual(logic.labelStats[label, "Min"], accumulate.GetMin()[0])
+      self.assertEqual(logic.labelStats[label, "Max"], accumulate.GetMax()[0])
+      self.assertAlmostEqual(logic.labelStats[label, "Mean"], accumulate.GetMean()[0])
+      self.assertAlmostEqual(logic.labelStats[label, "StdDev"], accumulate.GetStandardDeviation()[0])
+      self.assertAlmostEqual(logic.labelStats[label, "Median"], histogramStatistics.GetMedian())
+
+    self.delayDisplay('test_LabelStatisticsComputation passed!')
+
+  def test_LabelStatisticsKnownValues(self):
+    """
+    Check statistics of a small image against values computed by hand
+    """
+    self.delayDisplay("Starting test_LabelStatisticsKnownValues")
+    import numpy as np
+
+    grayscaleNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+    labelNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+    slicer.util.updateVolumeFromArray(grayscaleNode, np.array([[[1, 2, 3, 4, 10, 7, -5, 5]]], dtype=np.int16))
+    slicer.util.updateVolumeFromArray(labelNode, np.array([[[1, 1, 1, 1, 1, 3, 4, 4]]], dtype=np.int16))
+
+    logic = LabelStatisticsLogic(grayscaleNode, labelNode)
+    self.assertEqual(logic.labelStats["Labels"], [1, 3, 4])
+    # label 1: values 1, 2, 3, 4, 10
+    self.assertEqual(logic.labelStats[1, "Count"], 5)
+    self.assertEqual(logic.labelStats[1, "Min"], 1)
+    self.assertEqual(logic.labelStats[1, "Max"], 10)
+    self.assertAlmostEqual(logic.labelStats[1, "Mean"], 4.0)
+    self.assertAlmostEqual(logic.labelStats[1, "StdDev"], np.sqrt(50.0 / 4))
+    # median is reported as the lower edge of the bin preceding the median value's bin (as in vtkImageHistogramStatistics)
+    self.assertEqual(logic.labelStats[1, "Median"], 2)
+    # label 3: single voxel
+    self.assertEqual(logic.labelStats[3, "Count"], 1)
+    self.assertEqual(logic.labelStats[3, "Mean"], 7)
+    self.assertEqual(logic.labelStats[3, "StdDev"], 0)
+    # label 4: values -5, 5 (the histogram starts at the minimum value, -5)
+    self.assertEqual(logic.labelStats[4, "Count"], 2)
+    self.assertEqual(logic.labelStats[4, "Min"], -5)
+    self.assertEqual(logic.labelStats[4, "Max"], 5)
+    self.assertAlmostEqual(logic.labelStats[4, "Mean"], 0.0)
+    self.assertAlmostEqual(logic.labelStats[4, "StdDev"], np.sqrt(50.0))
+    self.assertEqual(logic.labelStats[4, "Median"], 4)
+
+    self.delayDisplay('test_LabelStatisticsKnownValues passed!')
+
 class Slicelet(object):
   """A slicer slicelet is a module widget that comes up in stand alone mode
   implemented as a python class.
@@ -37,6 +37,9 @@ class PerformanceTestsWidget(ScriptedLoadableModuleWidget):
         ( 'Web View Test', self.webViewTest ),
         ( 'Fill Out Web Form Test', self.webViewFormTest ),
         ( 'Memory Check', self.memoryCheck ),
+        ( 'DICOM Examine', self.dicomExamine ),
+        ( 'Wand Fill', self.wandFill ),
+        ( 'SimpleITK Push/Pull', self.sitkPushPull ),
       )
 
     for test in tests:
@@ -157,6 +160,144 @@ class PerformanceTestsWidget(ScriptedLoadableModuleWidget):
     self.log.ensureCursorVisible()
     self.log.repaint()
 
+  def dicomExamine(self, numberOfFiles=2000):
+    """ measure time of examining a large DICOM series with the scalar volume plugin,
+    using bulk tag value queries and querying tag values file by file
+    """
+    import time
+    import numpy as np
+    from DICOMLib import DICOMUtils, DICOMExportScalarVolume
+    from DICOMScalarVolumePlugin import DICOMScalarVolumePluginClass
+
+    self.log.insertHtml('<b>Creating DICOM series of %d files' % numberOfFiles)
+    self.log.repaint()
+    volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", "DICOMExaminePerformanceTest")
+    slicer.util.updateVolumeFromArray(volumeNode, np.zeros([numberOfFiles, 8, 8], dtype=np.int16))
+    dicomDataDir = slicer.app.temporaryPath + '/DICOMExaminePerformanceTest'
+    qt.QDir().mkpath(dicomDataDir)
+    tags = {}
+    for tag in ['Patient Name', 'Patient ID', 'Patient Comments', 'Study ID', 'Study Date', 'Study Time',
+      'Study Description', 'Manufacturer', 'Model', 'Series Description', 'Series Number', 'Series Date',
+      'Series Time', 'Content Date', 'Content Time', 'Study Instance UID', 'Series Instance UID',
+      'Frame of Reference Instance UID']:
+      tags[tag] = ''
+    tags['Patient Name'] = 'PerformanceTest'
+    tags['Modality'] = 'CT'
+    exporter = DICOMExportScalarVolume(None, volumeNode, tags, dicomDataDir)
+    exporter.export()
+    slicer.mrmlScene.RemoveNode(volumeNode)
+    self.log.insertHtml('<i>finished.</i>\n')
+    self.log.insertPlainText('\n')
+    self.log.repaint()
+
+    plugin = DICOMScalarVolumePluginClass()
+    tagsToQuery = list(set(plugin.tags.values()))
+
+    def timeInNewDatabase(measure, databaseName):
+      """Import the series into a new database and return the number of files and the time of measure(files).
+      Each measurement starts with the same tag cache content (tags cached during import), so that tag values
+      read by previous measurements do not make later measurements faster. Import reads all the files,
+      so all measurements find the files in the file system cache.
+      """
+      with DICOMUtils.TemporaryDICOMDatabase(databaseName) as db:
+        DICOMUtils.importDicom(dicomDataDir)
+        files = []
+        for patient in slicer.dicomDatabase.patients():
+          for study in slicer.dicomDatabase.studiesForPatient(patient):
+            for series in slicer.dicomDatabase.seriesForStudy(study):
+              files += slicer.dicomDatabase.filesForSeries(series)
+        startTime = time.time()
+        measure(files)
+        return len(files), time.time() - startTime
+
+    def queryFileByFile(files):
+      for file in files:
+        for tag in tagsToQuery:
+          slicer.dicomDatabase.fileValue(file, tag)
+
+    def examineWithoutBulkQuery(files):
+      # without access to the tag cache tables getTagValuesForFiles reads values file by file
+      from unittest import mock
+      with mock.patch.object(DICOMUtils, '_getCachedTagValuesForFiles', return_value={}):
+        plugin.examineFiles(files)
+
+    numberOfFiles, fileByFileTime = timeInNewDatabase(queryFileByFile, 'DICOMExaminePerformanceTestDatabase1')
+    numberOfFiles, bulkTime = timeInNewDatabase(
+      lambda files: DICOMUtils.getTagValuesForFiles(files, tagsToQuery), 'DICOMExaminePerformanceTestDatabase2')
+    numberOfFiles, examineTime = timeInNewDatabase(plugin.examineFiles, 'DICOMExaminePerformanceTestDatabase3')
+    numberOfFiles, examineFileByFileTime = timeInNewDatabase(examineWithoutBulkQuery, 'DICOMExaminePerformanceTestDatabase4')
+
+    result = ("%d files, %d tags: tag query file by file = %.2f s, bulk tag query = %.2f s,"
+      " examine with bulk tag query = %.2f s, examine with tag query file by file = %.2f s"
+      % (numberOfFiles, len(tagsToQuery), fileByFileTime, bulkTime, examineTime, examineFileByFileTime))
+    print (result)
+    self.log.insertHtml('<i>%s</i>' % result)
+    self.log.insertPlainText('\n')
+    self.log.ensureCursorVisible()
+    self.log.repaint()
+
+  def wandFill(self, dimensions=[100,256,256]):
+    """ measure time of filling a plane and a volume with the wand effect flood fill
+    """
+    import time
+    import numpy as np
+    from EditorLib import WandEffectLogic
+
+    # background with a bright sphere, fill is started from its center
+    k, j, i = np.ogrid[0:dimensions[0], 0:dimensions[1], 0:dimensions[2]]
+    center = [size // 2 for size in dimensions]
+    distance = np.sqrt((k - center[0])**2 + (j - center[1])**2 + (i - center[2])**2)
+    backgroundArray = np.where(distance < min(dimensions) * 0.45, 100, 0).astype(np.int16)
+
+    for fillMode in ['Plane', 'Volume']:
+      labelArray = np.zeros(dimensions, dtype=np.int16)
+      if fillMode == 'Plane':
+        backgroundDrawArray = backgroundArray[center[0]]
+        labelDrawArray = labelArray[center[0]]
+        seed = tuple(center[1:])
+      else:
+        backgroundDrawArray = backgroundArray
+        labelDrawArray = labelArray
+        seed = tuple(center)
+      startTime = time.time()
+      pixelsSet = WandEffectLogic.floodFill(backgroundDrawArray, labelDrawArray, seed, 1, 90, 110, False, 1e9)
+      elapsedTime = time.time() - startTime
+      result = "%s fill: %d voxels in %.3f s (%.0f voxels/s)" % (fillMode, pixelsSet, elapsedTime, pixelsSet / max(elapsedTime, 1e-6))
+      print (result)
+      self.log.insertHtml('<i>%s</i>' % result)
+      self.log.insertPlainText('\n')
+      self.log.ensureCursorVisible()
+      self.log.repaint()
+
+  def sitkPushPull(self, iters=10):
+    """ compare the time of transferring MRHead between Slicer and SimpleITK
+    through MRMLIDImageIO and through the numpy array bridge
+    """
+    import time
+    import SampleData
+    import sitkUtils
+    volumeNode = SampleData.downloadSample("MRHead")
+    targetNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode', 'sitkPushPullTarget')
+
+    for useArrayBridge in [False, True]:
+      startTime = time.time()
+      for i in range(iters):
+        sitkimage = sitkUtils.PullVolumeFromSlicer(volumeNode, useArrayBridge=useArrayBridge)
+      pullTime = (time.time() - startTime) / iters
+      startTime = time.time()
+      for i in range(iters):
+        sitkUtils.PushVolumeToSlicer(sitkimage, targetNode, useArrayBridge=useArrayBridge)
+      pushTime = (time.time() - startTime) / iters
+      result = "%s: pull %.1f ms, push %.1f ms" % (
+        'Array bridge' if useArrayBridge else 'MRMLIDImageIO', pullTime * 1000., pushTime * 1000.)
+      print (result)
+      self.log.insertHtml('<i>%s</i>' % result)
+      self.log.insertPlainText('\n')
+      self.log.ensureCursorVisible()
+      self.log.repaint()
+
+    slicer.mrmlScene.RemoveNode(targetNode)
+
   def chartMouseOverCallback(self, mrmlID, pointIndex, x, y):
     node = slicer.util.getNode(mrmlID)
     name = node.GetName()
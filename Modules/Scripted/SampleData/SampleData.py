@@ -1,5 +1,8 @@
 from __future__ import print_function
+import hashlib
+import json
 import os
+import threading
 import unittest
 import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
@@ -207,6 +210,119 @@ class SampleDataSource(object):
     return "\n".join(output)
 
 
+#
+# SampleData cache index
+#
+
+class SampleDataCacheIndex(object):
+  """Content hash index of the files downloaded into a cache folder.
+
+  The index is stored as a JSON file in the cache folder and maps each file name
+  to the URI it was downloaded from, its size, modification time and the SHA-256
+  digest of its content. It allows detecting truncated or corrupted cached files
+  before they are loaded. The content is only hashed again if the size or the
+  modification time of the file changed.
+
+  The index file is read and rewritten on each modification so that multiple
+  logic instances (and download threads) can safely share the same folder.
+  """
+
+  indexFileName = 'SampleDataCacheIndex.json'
+
+  # Shared by all instances, as several logic objects may update the same index file.
+  _lock = threading.Lock()
+
+  def __init__(self, folderPath):
+    self.folderPath = folderPath
+    self.indexFilePath = os.path.join(folderPath, self.indexFileName)
+
+  @staticmethod
+  def computeFileHash(filePath, blockSize=1024*1024):
+    """Return the SHA-256 hex digest of the content of the given file."""
+    sha256 = hashlib.sha256()
+    with open(filePath, 'rb') as f:
+      for block in iter(lambda: f.read(blockSize), b''):
+        sha256.update(block)
+    return sha256.hexdigest()
+
+  def entries(self):
+    """Return the index content as a dictionary mapping file names to entries."""
+    with self._lock:
+      return self._read()
+
+  def entry(self, fileName):
+    """Return the index entry of the given file or None if the file is not indexed."""
+    return self.entries().get(fileName)
+
+  def add(self, fileName, uri, sha256=None):
+    """Add the given cached file to the index. The hash is computed if not provided."""
+    filePath = os.path.join(self.folderPath, fileName)
+    fileStat = os.stat(filePath)
+    if sha256 is None:
+      sha256 = self.computeFileHash(filePath)
+    fileEntry = {'uri': uri, 'size': fileStat.st_size, 'mtime': fileStat.st_mtime_ns, 'sha256': sha256}
+    with self._lock:
+      index = self._read()
+      index[fileName] = fileEntry
+      self._write(index)
+    return fileEntry
+
+  def remove(self, fileName):
+    """Remove the given file from the index (the file itself is not deleted)."""
+    with self._lock:
+      index = self._read()
+      if index.pop(fileName, None) is not None:
+        self._write(index)
+
+  def verify(self, fileName):
+    """Check the cached file against its index entry.
+
+    Returns True if the file size and content hash match the index, False if the
+    file is missing, truncated or corrupted, and None if the file is not indexed.
+    The content hash is not computed if the file size and modification time
+    match the index.
+    """
+    fileEntry = self.entry(fileName)
+    if fileEntry is None:
+      return None
+    filePath = os.path.join(self.folderPath, fileName)
+    if not os.path.isfile(filePath):
+      return False
+    fileStat = os.stat(filePath)
+    if fileStat.st_size != fileEntry.get('size'):
+      return False
+    if fileStat.st_mtime_ns == fileEntry.get('mtime'):
+      return True
+    if self.computeFileHash(filePath) != fileEntry.get('sha256'):
+      return False
+    # content is unchanged, store the new modification time to not hash the file again
+    with self._lock:
+      index = self._read()
+      if fileName in index and index[fileName].get('sha256') == fileEntry.get('sha256'):
+        index[fileName]['mtime'] = fileStat.st_mtime_ns
+        self._write(index)
+    return True
+
+  def _read(self):
+    try:
+      with open(self.indexFilePath, 'r') as f:
+        index = json.load(f)
+    except (IOError, ValueError):
+      return {}
+    return index if isinstance(index, dict) else {}
+
+  def _write(self, index):
+    # Write to a temporary file then rename so that readers never see a partially written index
+    import tempfile
+    try:
+      fd, tempFilePath = tempfile.mkstemp(prefix=self.indexFileName, dir=self.folderPath)
+      with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+      os.replace(tempFilePath, self.indexFilePath)
+    except (IOError, OSError) as e:
+      logging.warning('Failed to write sample data cache index %s: %s' % (self.indexFilePath, e))
+
+
 #
 # SampleData widget
 #
@@ -371,6 +487,9 @@ class SampleDataLogic(object):
       self.logMessage = logMessage
     self.builtInCategoryName = 'BuiltIn'
     self.developmentCategoryName = 'Development'
+    self.maximumNumberOfConcurrentDownloads = 4
+    self.maximumNumberOfResumeAttempts = 3
+    self.downloadTimeout = 60
     self.registerBuiltInSampleDataSources()
     self.registerDevelopmentSampleDataSources()
 
@@ -426,9 +545,8 @@ class SampleDataLogic(object):
       loadFileType=['VolumeFile', 'SegmentationFile']
       )
 
-  def downloadFileIntoCache(self, uri, name):
-    """Given a uri and and a filename, download the data into
-    a file of the given name in the scene's cache"""
+  def cacheFolderPath(self):
+    """Return the scene's remote cache folder, creating it if needed."""
     destFolderPath = slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory()
 
     if not os.access(destFolderPath, os.W_OK):
@@ -438,15 +556,60 @@ class SampleDataLogic(object):
         self.logMessage('<b>Failed to create cache folder %s</b>' % destFolderPath, logging.ERROR)
       if not os.access(destFolderPath, os.W_OK):
         self.logMessage('<b>Cache folder %s is not writable</b>' % destFolderPath, logging.ERROR)
-    return self.downloadFile(uri, destFolderPath, name)
+    return destFolderPath
+
+  def cacheIndex(self, destFolderPath=None):
+    """Return the content hash index of the given folder (the scene's cache by default)."""
+    if destFolderPath is None:
+      destFolderPath = self.cacheFolderPath()
+    return SampleDataCacheIndex(destFolderPath)
+
+  def downloadFileIntoCache(self, uri, name):
+    """Given a uri and and a filename, download the data into
+    a file of the given name in the scene's cache"""
+    return self.downloadFile(uri, self.cacheFolderPath(), name)
 
-  def downloadSourceIntoCache(self, source):
+  def downloadSourceIntoCache(self, source, maximumNumberOfWorkers=None):
     """Download all files for the given source and return a
     list of file paths for the results"""
-    filePaths = []
-    for uri,fileName in zip(source.uris,source.fileNames):
-      filePaths.append(self.downloadFileIntoCache(uri, fileName))
-    return filePaths
+    return self.downloadFilesIntoCache(source.uris, source.fileNames, maximumNumberOfWorkers)
+
+  def downloadFilesIntoCache(self, uris, fileNames, maximumNumberOfWorkers=None):
+    """Download the given files into the scene's cache and return a
+    list of file paths for the results.
+
+    Multiple files are downloaded concurrently, using at most ``maximumNumberOfWorkers``
+    threads (``maximumNumberOfConcurrentDownloads`` by default). Log messages of the
+    download threads are reported from the calling thread.
+    """
+    destFolderPath = self.cacheFolderPath()
+    if maximumNumberOfWorkers is None:
+      maximumNumberOfWorkers = self.maximumNumberOfConcurrentDownloads
+    uniqueFileNames = list(set(fileNames))
+    if len(uniqueFileNames) < 2 or maximumNumberOfWorkers < 2:
+      return [self.downloadFile(uri, destFolderPath, name) for uri, name in zip(uris, fileNames)]
+
+    import concurrent.futures
+    import queue
+    messages = queue.Queue()
+    def logMessage(message, logLevel=logging.INFO):
+      messages.put((message, logLevel))
+    def reportMessages():
+      while not messages.empty():
+        self.logMessage(*messages.get())
+
+    futures = {}
+    with concurrent.futures.ThreadPoolExecutor(min(maximumNumberOfWorkers, len(uniqueFileNames))) as executor:
+      for uri, name in zip(uris, fileNames):
+        # the same file may be listed more than once, download it only once
+        if name not in futures:
+          futures[name] = executor.submit(self._downloadFile, uri, destFolderPath, name, logMessage)
+      pending = set(futures.values())
+      while pending:
+        done, pending = concurrent.futures.wait(pending, timeout=0.1)
+        reportMessages()
+    reportMessages()
+    return [futures[name].result() for name in fileNames]
 
   def downloadFromSource(self,source,attemptCount=0):
     """Given an instance of SampleDataSource, downloads the associated data and
@@ -465,13 +628,11 @@ class SampleDataLogic(object):
     returns the list of all downloaded filepaths.
     """
     nodes = []
-    filePaths = []
+    filePaths = self.downloadSourceIntoCache(source)
 
-    for uri,fileName,nodeName,loadFile,loadFileType in zip(source.uris,source.fileNames,source.nodeNames,source.loadFiles,source.loadFileType):
+    for uri,fileName,nodeName,loadFile,loadFileType,filePath in zip(source.uris,source.fileNames,source.nodeNames,source.loadFiles,source.loadFileType,filePaths):
 
       current_source = SampleDataSource(uris=uri, fileNames=fileName, nodeNames=nodeName, loadFiles=loadFile, loadFileType=loadFileType, loadFileProperties=source.loadFileProperties)
-      filePath = self.downloadFileIntoCache(uri, fileName)
-      filePaths.append(filePath)
 
       if loadFileType == 'ZipFile':
         if loadFile == False:
@@ -632,32 +793,146 @@ class SampleDataLogic(object):
       size /= 1024.0
     return "%3.1f %s" % (size, 'TB')
 
-  def reportHook(self,blocksSoFar,blockSize,totalSize):
-    # we clamp to 100% because the blockSize might be larger than the file itself
-    percent = min(int((100. * blocksSoFar * blockSize) / totalSize), 100)
-    if percent == 100 or (percent - self.downloadPercent >= 10):
-      # we clamp to totalSize when blockSize is larger than totalSize
-      humanSizeSoFar = self.humanFormatSize(min(blocksSoFar * blockSize, totalSize))
-      humanSizeTotal = self.humanFormatSize(totalSize)
-      self.logMessage('<i>Downloaded %s (%d%% of %s)...</i>' % (humanSizeSoFar, percent, humanSizeTotal))
-      self.downloadPercent = percent
-
   def downloadFile(self, uri, destFolderPath, name):
+    return self._downloadFile(uri, destFolderPath, name, self.logMessage)
+
+  def _downloadFile(self, uri, destFolderPath, name, logMessage):
+    """Download a file into the given folder, unless a valid copy is already there.
+
+    A cached file is only reused if it matches its entry in the cache index.
+    Files are downloaded into a ``.part`` file first, which is moved in place and
+    added to the index once complete, so that interrupted downloads can be resumed.
+    The ETag or Last-Modified header of the response is stored in a ``.part.json``
+    file next to it, so that a partial file is only resumed if the remote file did not change.
+    This method does not use the GUI and may be called from a download thread
+    if ``logMessage`` is thread-safe.
+    """
     filePath = destFolderPath + '/' + name
-    if not os.path.exists(filePath) or os.stat(filePath).st_size == 0:
-      import urllib.request, urllib.parse, urllib.error
-      self.logMessage('<b>Requesting download</b> <i>%s</i> from %s...' % (name, uri))
-      # add a progress bar
-      self.downloadPercent = 0
+    cacheIndex = self.cacheIndex(destFolderPath)
+    if os.path.exists(filePath):
+      valid = cacheIndex.verify(name)
+      if valid is None and os.stat(filePath).st_size > 0:
+        # file was downloaded before the cache index existed, assume it is valid
+        cacheIndex.add(name, uri)
+        valid = True
+      if valid:
+        logMessage('<b>File already exists in cache - reusing it.</b>')
+        return filePath
+      logMessage('<b>Cached file <i>%s</i> is incomplete or corrupted - downloading it again.</b>' % name, logging.WARNING)
       try:
-        urllib.request.urlretrieve(uri, filePath, self.reportHook)
-        self.logMessage('<b>Download finished</b>')
-      except IOError as e:
-        self.logMessage('<b>\tDownload failed: %s</b>' % e, logging.ERROR)
-    else:
-      self.logMessage('<b>File already exists in cache - reusing it.</b>')
+        os.remove(filePath)
+      except OSError as e:
+        logMessage('<b>\tUnable to remove %s: %s</b>' % (filePath, e), logging.ERROR)
+      cacheIndex.remove(name)
+
+    logMessage('<b>Requesting download</b> <i>%s</i> from %s...' % (name, uri))
+    try:
+      partialFilePath = filePath + '.part'
+      self._downloadIntoPartialFile(uri, partialFilePath, logMessage)
+      os.replace(partialFilePath, filePath)
+      cacheIndex.add(name, uri)
+      logMessage('<b>Download finished</b>')
+    except (IOError, OSError) as e:
+      logMessage('<b>\tDownload failed: %s</b>' % e, logging.ERROR)
     return filePath
 
+  @staticmethod
+  def _readPartialFileValidator(partialFilePath, uri):
+    """Return the ETag or Last-Modified value stored for the partial file downloaded
+    from uri, or None if the partial file cannot be resumed."""
+    try:
+      with open(partialFilePath + '.json', 'r') as f:
+        partialFileInfo = json.load(f)
+    except (IOError, ValueError):
+      return None
+    if not isinstance(partialFileInfo, dict) or partialFileInfo.get('uri') != uri:
+      return None
+    return partialFileInfo.get('validator')
+
+  @staticmethod
+  def _writePartialFileValidator(partialFilePath, uri, validator):
+    """Store the ETag or Last-Modified value of the partial file downloaded from uri.
+    The stored value is removed if validator is None."""
+    validatorFilePath = partialFilePath + '.json'
+    if validator is None:
+      if os.path.exists(validatorFilePath):
+        os.remove(validatorFilePath)
+      return
+    with open(validatorFilePath, 'w') as f:
+      json.dump({'uri': uri, 'validator': validator}, f)
+
+  def _downloadIntoPartialFile(self, uri, partialFilePath, logMessage, blockSize=1024*1024):
+    """Download uri into partialFilePath, appending to existing content if the server
+    supports HTTP range requests. The range request is sent with an If-Range header,
+    so that the server sends the whole file instead if it changed since the partial
+    file was downloaded. Partial files without a stored ETag or Last-Modified value
+    are downloaded again. Interrupted transfers are resumed up to
+    ``maximumNumberOfResumeAttempts`` times. Raises IOError if the download fails."""
+    import http.client
+    import urllib.request, urllib.parse, urllib.error
+    supportsRange = urllib.parse.urlparse(uri).scheme in ['http', 'https']
+    resumeAttemptCount = 0
+    while True:
+      offset = os.path.getsize(partialFilePath) if os.path.exists(partialFilePath) else 0
+      validator = self._readPartialFileValidator(partialFilePath, uri) if offset > 0 and supportsRange else None
+      request = urllib.request.Request(uri)
+      if validator is not None:
+        request.add_header('Range', 'bytes=%d-' % offset)
+        request.add_header('If-Range', validator)
+        logMessage('<i>Resuming download from %s...</i>' % self.humanFormatSize(offset))
+      try:
+        response = urllib.request.urlopen(request, timeout=self.downloadTimeout)
+      except urllib.error.HTTPError as e:
+        if e.code == 416 and offset > 0:
+          # the partial file does not match the remote file, start over
+          os.remove(partialFilePath)
+          self._writePartialFileValidator(partialFilePath, uri, None)
+          continue
+        raise
+
+      with response:
+        if validator is None or response.getcode() != 206:
+          # server sent the whole file
+          offset = 0
+          # only strong entity tags can be used in If-Range
+          validator = response.headers.get('ETag')
+          if validator is None or validator.startswith('W/'):
+            validator = response.headers.get('Last-Modified')
+          self._writePartialFileValidator(partialFilePath, uri, validator if supportsRange else None)
+        contentLength = response.headers.get('Content-Length')
+        totalSize = offset + int(contentLength) if contentLength is not None else -1
+        sizeSoFar = offset
+        downloadPercent = 0
+        try:
+          with open(partialFilePath, 'ab' if offset > 0 else 'wb') as f:
+            while True:
+              block = response.read(blockSize)
+              if not block:
+                break
+              f.write(block)
+              sizeSoFar += len(block)
+              if totalSize > 0:
+                percent = min(int((100. * sizeSoFar) / totalSize), 100)
+                if percent == 100 or (percent - downloadPercent >= 10):
+                  logMessage('<i>Downloaded %s (%d%% of %s)...</i>' % (
+                    self.humanFormatSize(sizeSoFar), percent, self.humanFormatSize(totalSize)))
+                  downloadPercent = percent
+          error = None
+          if totalSize >= 0 and sizeSoFar < totalSize:
+            error = IOError('Incomplete download (%d of %d bytes received)' % (sizeSoFar, totalSize))
+        except (IOError, http.client.HTTPException) as e:
+          error = e
+
+      if error is None:
+        self._writePartialFileValidator(partialFilePath, uri, None)
+        return
+      # keep the partial file and resume if some data was received
+      if sizeSoFar > offset and supportsRange and resumeAttemptCount < self.maximumNumberOfResumeAttempts:
+        resumeAttemptCount += 1
+        logMessage('<b>Download interrupted: %s</b>' % error, logging.WARNING)
+        continue
+      raise IOError(str(error))
+
   def loadScene(self, uri,  fileProperties = {}):
     self.logMessage('<b>Requesting load</b> %s...' % uri)
     fileProperties['fileName'] = uri
@@ -718,7 +993,11 @@ class SampleDataTest(ScriptedLoadableModuleTest):
       self.test_downloadFromSource_loadNode,
       self.test_downloadFromSource_loadNodeFromMultipleFiles,
       self.test_downloadFromSource_loadNodes,
-      self.test_downloadFromSource_loadNodesWithLoadFileFalse
+      self.test_downloadFromSource_loadNodesWithLoadFileFalse,
+      self.test_downloadFromSource_concurrentDownloads,
+      self.test_downloadFile_resumePartialFile,
+      self.test_downloadFile_restartStalePartialFile,
+      self.test_downloadFile_detectCorruptedCachedFile
     ]:
       self.setUp()
       test()
@@ -731,6 +1010,72 @@ class SampleDataTest(ScriptedLoadableModuleTest):
     import urllib.parse, urllib.request, urllib.parse, urllib.error
     return urllib.parse.urljoin('file:', urllib.request.pathname2url(path))
 
+  @staticmethod
+  def startTestServer(files):
+    """Serve the given dictionary of file names to content from a local HTTP server
+    supporting range requests. Returns the server, which records the Range and If-Range
+    headers of the received requests in its ``requests`` list. Transfer of a file name
+    in the ``interruptAfter`` dictionary of the server is stopped once after the given
+    number of bytes.
+    """
+    import http.server, socketserver
+    class Handler(http.server.BaseHTTPRequestHandler):
+      def do_GET(self):
+        server = self.server
+        fileName = self.path.lstrip('/')
+        server.requests.append((self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+        content = server.files.get(fileName)
+        if content is None:
+          self.send_error(404)
+          return
+        eTag = '"%s"' % hashlib.sha256(content).hexdigest()
+        start = 0
+        rangeHeader = self.headers.get('Range')
+        if self.headers.get('If-Range', eTag) != eTag:
+          # file changed, send the whole file
+          rangeHeader = None
+        if rangeHeader and rangeHeader.startswith('bytes=') and rangeHeader.endswith('-'):
+          start = int(rangeHeader[len('bytes='):-1])
+          if start >= len(content):
+            self.send_error(416)
+            return
+          self.send_response(206)
+          self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(content)-1, len(content)))
+        else:
+          self.send_response(200)
+        self.send_header('Content-Length', str(len(content)-start))
+        self.send_header('ETag', eTag)
+        self.end_headers()
+        interruptAfter = server.interruptAfter.pop(fileName, None)
+        if interruptAfter is not None:
+          self.wfile.write(content[start:start+interruptAfter])
+          self.close_connection = True
+          return
+        self.wfile.write(content[start:])
+      def log_message(self, format, *args):
+        pass
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+      daemon_threads = True
+    server = Server(('127.0.0.1', 0), Handler)
+    server.files = files
+    server.requests = []
+    server.interruptAfter = {}
+    server.baseURL = 'http://127.0.0.1:%d/' % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+  @staticmethod
+  def removeCachedFiles(logic, fileNames):
+    cacheIndex = logic.cacheIndex()
+    for fileName in fileNames:
+      for fileSuffix in ['', '.part', '.part.json']:
+        filePath = os.path.join(cacheIndex.folderPath, fileName + fileSuffix)
+        if os.path.exists(filePath):
+          os.remove(filePath)
+      cacheIndex.remove(fileName)
+
   def test_downloadFromSource_downloadFiles(self):
     """Specifying URIs and fileNames without nodeNames is expected to download the files
     without loading into Slicer.
@@ -859,3 +1204,147 @@ class SampleDataTest(ScriptedLoadableModuleTest):
     self.assertEqual(len(nodes), 2)
     self.assertEqual(nodes[0], slicer.mrmlScene.GetFirstNodeByName("MRHead"))
     self.assertEqual(nodes[1], slicer.mrmlScene.GetFirstNodeByName("CTChest"))
+
+  def test_downloadFromSource_concurrentDownloads(self):
+    logic = SampleDataLogic()
+    files = {'SampleDataTest-concurrent-%d.bin' % i: os.urandom(100000 + i) for i in range(4)}
+    fileNames = sorted(files.keys())
+    self.removeCachedFiles(logic, fileNames)
+    server = self.startTestServer(files)
+    try:
+      filePaths = logic.downloadFromSource(SampleDataSource(
+        uris=[server.baseURL + fileName for fileName in fileNames], fileNames=fileNames))
+      self.assertEqual(len(filePaths), len(fileNames))
+      cacheIndex = logic.cacheIndex()
+      for fileName, filePath in zip(fileNames, filePaths):
+        with open(filePath, 'rb') as f:
+          self.assertEqual(f.read(), files[fileName])
+        self.assertTrue(cacheIndex.verify(fileName))
+
+      # valid cached files are not downloaded again
+      requestCount = len(server.requests)
+      logic.downloadFromSource(SampleDataSource(
+        uris=[server.baseURL + fileName for fileName in fileNames], fileNames=fileNames))
+      self.assertEqual(len(server.requests), requestCount)
+    finally:
+      server.shutdown()
+      server.server_close()
+      self.removeCachedFiles(logic, fileNames)
+
+  def test_downloadFile_resumePartialFile(self):
+    logic = SampleDataLogic()
+    fileName = 'SampleDataTest-resume.bin'
+    content = os.urandom(300000)
+    self.removeCachedFiles(logic, [fileName])
+    server = self.startTestServer({fileName: content})
+    try:
+      # interrupted download is not resumed if resume attempts are disabled
+      logic.maximumNumberOfResumeAttempts = 0
+      server.interruptAfter[fileName] = 120000
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(os.path.getsize(filePath + '.part'), 120000)
+      self.assertTrue(os.path.exists(filePath + '.part.json'))
+      self.assertIsNone(logic.cacheIndex().entry(fileName))
+
+      # download is resumed if the file did not change
+      logic.maximumNumberOfResumeAttempts = 3
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      eTag = '"%s"' % hashlib.sha256(content).hexdigest()
+      self.assertEqual(server.requests, [('/' + fileName, None, None), ('/' + fileName, 'bytes=120000-', eTag)])
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), content)
+      self.assertFalse(os.path.exists(filePath + '.part'))
+      self.assertFalse(os.path.exists(filePath + '.part.json'))
+      self.assertTrue(logic.cacheIndex().verify(fileName))
+
+      # transfer interrupted during a download is resumed in the same call
+      self.removeCachedFiles(logic, [fileName])
+      del server.requests[:]
+      server.interruptAfter[fileName] = 50000
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(server.requests, [('/' + fileName, None, None), ('/' + fileName, 'bytes=50000-', eTag)])
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), content)
+    finally:
+      server.shutdown()
+      server.server_close()
+      self.removeCachedFiles(logic, [fileName])
+
+  def test_downloadFile_restartStalePartialFile(self):
+    logic = SampleDataLogic()
+    fileName = 'SampleDataTest-stale.bin'
+    oldContent = os.urandom(300000)
+    newContent = os.urandom(250000)
+    self.removeCachedFiles(logic, [fileName])
+    server = self.startTestServer({fileName: oldContent})
+    try:
+      logic.maximumNumberOfResumeAttempts = 0
+      server.interruptAfter[fileName] = 120000
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(os.path.getsize(filePath + '.part'), 120000)
+
+      # remote file changed, the server sends the whole new file instead of the requested range
+      server.files[fileName] = newContent
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(server.requests[-1][1], 'bytes=120000-')
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), newContent)
+      self.assertTrue(logic.cacheIndex().verify(fileName))
+
+      # partial file without stored ETag is not appended to
+      self.removeCachedFiles(logic, [fileName])
+      with open(filePath + '.part', 'wb') as f:
+        f.write(oldContent[:120000])
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(server.requests[-1], ('/' + fileName, None, None))
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), newContent)
+    finally:
+      server.shutdown()
+      server.server_close()
+      self.removeCachedFiles(logic, [fileName])
+
+  def test_downloadFile_detectCorruptedCachedFile(self):
+    logic = SampleDataLogic()
+    fileName = 'SampleDataTest-corrupted.bin'
+    content = os.urandom(200000)
+    self.removeCachedFiles(logic, [fileName])
+    server = self.startTestServer({fileName: content})
+    try:
+      filePath = logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(len(server.requests), 1)
+
+      # content is not hashed if size and modification time did not change
+      from unittest import mock
+      with mock.patch.object(SampleDataCacheIndex, 'computeFileHash', side_effect=AssertionError('file hashed')):
+        self.assertTrue(logic.cacheIndex().verify(fileName))
+
+      # touched file is hashed once more and its new modification time is stored
+      fileStat = os.stat(filePath)
+      os.utime(filePath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 10**9))
+      self.assertTrue(logic.cacheIndex().verify(fileName))
+      self.assertEqual(logic.cacheIndex().entry(fileName)['mtime'], fileStat.st_mtime_ns + 10**9)
+
+      # corrupted content of the same size
+      with open(filePath, 'r+b') as f:
+        f.seek(1000)
+        f.write(b'corrupted')
+      # file systems with coarse timestamps may not update the modification time of a quick change
+      os.utime(filePath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 2 * 10**9))
+      self.assertFalse(logic.cacheIndex().verify(fileName))
+      logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(len(server.requests), 2)
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), content)
+
+      # truncated file
+      with open(filePath, 'r+b') as f:
+        f.truncate(5000)
+      logic.downloadFileIntoCache(server.baseURL + fileName, fileName)
+      self.assertEqual(len(server.requests), 3)
+      with open(filePath, 'rb') as f:
+        self.assertEqual(f.read(), content)
+    finally:
+      server.shutdown()
+      server.server_close()
+      self.removeCachedFiles(logic, [fileName])
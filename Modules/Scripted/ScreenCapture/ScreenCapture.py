@@ -551,6 +551,12 @@ class ScreenCaptureWidget(ScriptedLoadableModuleWidget):
     # existing files in the output directory
     imageFileNamePattern = self.logic.getRandomFilePattern() if videoOutputRequested else self.fileNamePatternWidget.text
 
+    # Frames are piped directly into ffmpeg, unless they have to be repeated (then they are written to image files)
+    forwardBackward = self.forwardBackwardCheckBox.checked
+    numberOfRepeats = int(self.repeatSliderWidget.value)
+    streamVideo = videoOutputRequested and not forwardBackward and numberOfRepeats == 1
+    fps = self.videoFrameRateSliderWidget.value
+
     self.captureButton.setEnabled(True)
     self.captureButton.text = self.captureButtonLabelCancel
     slicer.app.setOverrideCursor(qt.Qt.WaitCursor)
@@ -559,6 +565,11 @@ class ScreenCaptureWidget(ScriptedLoadableModuleWidget):
     if captureAllViews:
       self.logic.showViewControllers(False)
     try:
+      if streamVideo:
+        self.logic.startVideoStream(fps, self.extraVideoOptionsWidget.text,
+          outputDir, self.videoFileNameWidget.text, transparentBackground)
+      elif numberOfSteps > 1:
+        self.logic.startBackgroundImageWriting()
       if numberOfSteps < 2:
         if imageFileNamePattern != self.snapshotFileNamePattern or outputDir != self.snapshotOutputDir:
           self.snapshotIndex = 0
@@ -589,11 +600,10 @@ class ScreenCaptureWidget(ScriptedLoadableModuleWidget):
 
       import shutil
 
-      fps = self.videoFrameRateSliderWidget.value
-
-      if numberOfSteps > 1:
-        forwardBackward = self.forwardBackwardCheckBox.checked
-        numberOfRepeats = int(self.repeatSliderWidget.value)
+      if streamVideo:
+        self.logic.finishVideoStream()
+      elif numberOfSteps > 1:
+        self.logic.finishBackgroundImageWriting()
         filePathPattern = os.path.join(outputDir, imageFileNamePattern)
         fileIndex = numberOfSteps
         for repeatIndex in range(numberOfRepeats):
@@ -615,7 +625,7 @@ class ScreenCaptureWidget(ScriptedLoadableModuleWidget):
           numberOfSteps += numberOfSteps - 2
         numberOfSteps *= numberOfRepeats
 
-      if videoOutputRequested:
+      if videoOutputRequested and not streamVideo:
         try:
           self.logic.createVideo(fps, self.extraVideoOptionsWidget.text,
             outputDir, imageFileNamePattern, self.videoFileNameWidget.text)
@@ -628,6 +638,9 @@ class ScreenCaptureWidget(ScriptedLoadableModuleWidget):
       self.createdOutputFile = os.path.join(outputDir, self.videoFileNameWidget.text) if videoOutputRequested else outputDir
       self.showCreatedOutputFileButton.enabled = True
     except Exception as e:
+      if streamVideo:
+        self.logic.cancelVideoStream()
+      self.logic.cancelBackgroundImageWriting()
       self.addLog("Error: {0}".format(str(e)))
       import traceback
       traceback.print_exc()
@@ -657,6 +670,14 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
   def __init__(self):
     self.logCallback = None
     self.cancelRequested = False
+    # If set then captured images are sent to this video writer instead of writing them to files
+    self.videoStreamWriter = None
+    # If set then captured images are encoded and written to files by this thread pool
+    self.imageWriterExecutor = None
+    self.imageWriterFutures = []
+    self.maximumNumberOfQueuedImages = 0
+    # Offscreen render windows that are used for rendering views, indexed by the original render window of the view
+    self.offscreenRenderWindows = {}
 
     self.videoFormatPresets = [
       {"name": "H.264",                    "fileExtension": "mp4", "extraVideoOptions": "-codec libx264 -preset slower -pix_fmt yuv420p"},
@@ -832,10 +853,112 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
 
     return sliceOffsetResolution
 
+  def startBackgroundImageWriting(self, numberOfWorkers=None, maximumNumberOfQueuedImages=16):
+    """
+    Encode and write images captured by subsequent captureImageFromView() calls in a pool of
+    worker threads, while the next view state is rendered.
+    Call finishBackgroundImageWriting() to wait for all images to be written.
+    """
+    import concurrent.futures
+    if numberOfWorkers is None:
+      numberOfWorkers = os.cpu_count() or 1
+    self.imageWriterExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=numberOfWorkers)
+    self.imageWriterFutures = []
+    self.maximumNumberOfQueuedImages = max(maximumNumberOfQueuedImages, numberOfWorkers)
+
+  def finishBackgroundImageWriting(self):
+    """
+    Wait until all images are written. Raises the first error that occurred while writing.
+    """
+    if not self.imageWriterExecutor:
+      return
+    imageWriterExecutor = self.imageWriterExecutor
+    self.imageWriterExecutor = None
+    imageWriterExecutor.shutdown(wait=True)
+    futures = self.imageWriterFutures
+    self.imageWriterFutures = []
+    for future in futures:
+      future.result()
+
+  def cancelBackgroundImageWriting(self):
+    """
+    Stop background image writing started by startBackgroundImageWriting() and ignore write errors.
+    Images that are already queued are still written.
+    """
+    if not self.imageWriterExecutor:
+      return
+    self.imageWriterExecutor.shutdown(wait=True)
+    self.imageWriterExecutor = None
+    self.imageWriterFutures = []
+
+  def writeImageInBackground(self, imageData, filename):
+    import numpy as np
+    from vtk.util.numpy_support import vtk_to_numpy
+    dims = imageData.GetDimensions()
+    pixels = vtk_to_numpy(imageData.GetPointData().GetScalars()).reshape(dims[1], dims[0], -1)
+    # Make sure image witdth and height is even (as when writing synchronously),
+    # and make the first row the top row
+    pixels = np.array(pixels[:dims[1] & ~1, :dims[0] & ~1][::-1])
+    # Limit the number of images in memory
+    while len(self.imageWriterFutures) >= self.maximumNumberOfQueuedImages:
+      self.imageWriterFutures.pop(0).result()
+    self.imageWriterFutures.append(self.imageWriterExecutor.submit(writeImageFile, pixels, filename))
+
+  def startOffscreenRendering(self, view):
+    """
+    Render the view in a separate offscreen render window, until stopOffscreenRendering is called.
+    Renderers of the view are moved to the offscreen render window, therefore captured images
+    do not depend on the view widget being shown or repainted on screen.
+    Raises ValueError if offscreen rendering is not supported.
+    """
+    renderWindow = view.renderWindow()
+    if renderWindow in self.offscreenRenderWindows:
+      raise ValueError('Offscreen rendering is already started for this view.')
+    offscreenRenderWindow = vtk.vtkRenderWindow()
+    offscreenRenderWindow.SetOffScreenRendering(1)
+    if not offscreenRenderWindow.GetOffScreenRendering() or not offscreenRenderWindow.SupportsOpenGL():
+      offscreenRenderWindow.Finalize()
+      raise ValueError('Offscreen rendering is not supported on this system.')
+    offscreenRenderWindow.SetSize(renderWindow.GetSize())
+    offscreenRenderWindow.SetNumberOfLayers(renderWindow.GetNumberOfLayers())
+    offscreenRenderWindow.SetAlphaBitPlanes(renderWindow.GetAlphaBitPlanes())
+    offscreenRenderWindow.SetMultiSamples(renderWindow.GetMultiSamples())
+    for renderer in self.getRenderers(renderWindow):
+      renderWindow.RemoveRenderer(renderer)
+      offscreenRenderWindow.AddRenderer(renderer)
+    self.offscreenRenderWindows[renderWindow] = offscreenRenderWindow
+
+  def stopOffscreenRendering(self, view):
+    """
+    Move renderers of the view back to its render window.
+    """
+    renderWindow = view.renderWindow()
+    offscreenRenderWindow = self.offscreenRenderWindows.pop(renderWindow, None)
+    if not offscreenRenderWindow:
+      return
+    for renderer in self.getRenderers(offscreenRenderWindow):
+      offscreenRenderWindow.RemoveRenderer(renderer)
+      renderWindow.AddRenderer(renderer)
+    offscreenRenderWindow.Finalize()
+    view.forceRender()
+
+  def getRenderers(self, renderWindow):
+    renderers = renderWindow.GetRenderers()
+    return [renderers.GetItemAsObject(index) for index in range(renderers.GetNumberOfItems())]
+
+  def getRenderWindow(self, view):
+    """
+    Returns the render window where the view is rendered (offscreen render window, if offscreen rendering is started).
+    """
+    renderWindow = view.renderWindow()
+    return self.offscreenRenderWindows.get(renderWindow, renderWindow)
+
   def captureImageFromView(self, view, filename, transparentBackground=False):
 
     slicer.app.processEvents()
-    if view:
+    if view and view.renderWindow() in self.offscreenRenderWindows:
+      self.getRenderWindow(view).Render()
+    elif view:
       view.forceRender()
     else:
       # force rendering of all views
@@ -871,10 +994,18 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
         imageSize.setY(imageSize.y()-1)
 
       img = ctk.ctkWidgetsUtils.grabWidget(slicer.util.mainWindow(), qt.QRect(topLeft.x(), topLeft.y(), imageSize.x(), imageSize.y()))
+      if self.videoStreamWriter or self.imageWriterExecutor:
+        imageData = vtk.vtkImageData()
+        slicer.qMRMLUtils().qImageToVtkImageData(img, imageData)
+        if self.videoStreamWriter:
+          self.videoStreamWriter.writeFrame(imageData)
+        else:
+          self.writeImageInBackground(imageData, filename)
+        return
       img.save(filename)
       return
 
-    rw = view.renderWindow()
+    rw = self.getRenderWindow(view)
     wti = vtk.vtkWindowToImageFilter()
 
     if transparentBackground:
@@ -886,6 +1017,8 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       wti.SetInputBufferTypeToRGBA()
       rw.Render() # need to render after changing bit planes
 
+    if rw.GetOffScreenRendering():
+      wti.ReadFrontBufferOff()
     wti.SetInput(rw)
     wti.Update()
 
@@ -893,8 +1026,6 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       rw.SetAlphaBitPlanes(originalAlphaBitPlanes)
       ren.SetGradientBackground(originalGradientBackground)
 
-    writer = vtk.vtkPNGWriter()
-    writer.SetFileName(filename)
     outputImage = wti.GetOutput()
     imageSize = outputImage.GetDimensions()
 
@@ -902,6 +1033,16 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       # image is too small, most likely it is invalid
       raise ValueError('Capture image from view failed')
 
+    if self.videoStreamWriter:
+      self.videoStreamWriter.writeFrame(outputImage)
+      return
+    if self.imageWriterExecutor:
+      self.writeImageInBackground(outputImage, filename)
+      return
+
+    writer = vtk.vtkPNGWriter()
+    writer.SetFileName(filename)
+
     # Make sure image witdth and height is even, otherwise encoding may fail
     imageWidthOdd = (imageSize[0] & 1 == 1)
     imageHeightOdd = (imageSize[1] & 1 == 1)
@@ -938,12 +1079,20 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       raise ValueError('Invalid view node.')
 
   def captureSliceSweep(self, sliceNode, startSliceOffset, endSliceOffset, numberOfImages,
-                        outputDir, outputFilenamePattern, captureAllViews = None, transparentBackground = False):
+                        outputDir, outputFilenamePattern, captureAllViews = None, transparentBackground = False,
+                        offscreenRendering = False):
+    """
+    Acquire a set of screenshots of a slice view while moving the slice offset.
+    If offscreenRendering is True then the slice view is rendered in a separate offscreen render window.
+    Offscreen rendering is not available when all views are captured.
+    """
 
     self.cancelRequested = False
 
     if not captureAllViews and not sliceNode.IsMappedInLayout():
       raise ValueError('Selected slice view is not visible in the current layout.')
+    if offscreenRendering and captureAllViews:
+      raise ValueError('Offscreen rendering is not available when all views are captured.')
 
     if not os.path.exists(outputDir):
       os.makedirs(outputDir)
@@ -953,17 +1102,22 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
     originalSliceOffset = sliceLogic.GetSliceOffset()
 
     sliceView = self.viewFromNode(sliceNode)
-    compositeNode = sliceLogic.GetSliceCompositeNode()
-    offsetStepSize = (endSliceOffset-startSliceOffset)/(numberOfImages-1)
-    for offsetIndex in range(numberOfImages):
-      filename = filePathPattern % offsetIndex
-      self.addLog("Write "+filename)
-      sliceLogic.SetSliceOffset(startSliceOffset+offsetIndex*offsetStepSize)
-      self.captureImageFromView(None if captureAllViews else sliceView, filename, transparentBackground)
-      if self.cancelRequested:
-        break
-
-    sliceLogic.SetSliceOffset(originalSliceOffset)
+    if offscreenRendering:
+      self.startOffscreenRendering(sliceView)
+    try:
+      compositeNode = sliceLogic.GetSliceCompositeNode()
+      offsetStepSize = (endSliceOffset-startSliceOffset)/(numberOfImages-1)
+      for offsetIndex in range(numberOfImages):
+        filename = filePathPattern % offsetIndex
+        self.addLog("Write "+filename)
+        sliceLogic.SetSliceOffset(startSliceOffset+offsetIndex*offsetStepSize)
+        self.captureImageFromView(None if captureAllViews else sliceView, filename, transparentBackground)
+        if self.cancelRequested:
+          break
+    finally:
+      sliceLogic.SetSliceOffset(originalSliceOffset)
+      if offscreenRendering:
+        self.stopOffscreenRendering(sliceView)
     if self.cancelRequested:
       raise ValueError('User requested cancel.')
 
@@ -1000,62 +1154,73 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       raise ValueError('User requested cancel.')
 
   def capture3dViewRotation(self, viewNode, startRotation, endRotation, numberOfImages, rotationAxis,
-    outputDir, outputFilenamePattern, captureAllViews = None, transparentBackground = False):
+    outputDir, outputFilenamePattern, captureAllViews = None, transparentBackground = False,
+    offscreenRendering = False):
     """
     Acquire a set of screenshots of the 3D view while rotating it.
+    If offscreenRendering is True then the 3D view is rendered in a separate offscreen render window.
+    Offscreen rendering is not available when all views are captured.
     """
 
     self.cancelRequested = False
 
+    if offscreenRendering and captureAllViews:
+      raise ValueError('Offscreen rendering is not available when all views are captured.')
+
     if not os.path.exists(outputDir):
       os.makedirs(outputDir)
     filePathPattern = os.path.join(outputDir, outputFilenamePattern)
 
     renderView = self.viewFromNode(viewNode)
-
-    # Save original orientation and go to start orientation
-    originalPitchRollYawIncrement = renderView.pitchRollYawIncrement
-    originalDirection = renderView.pitchDirection
-    renderView.setPitchRollYawIncrement(-startRotation)
-    if rotationAxis == AXIS_YAW:
-      renderView.yawDirection = renderView.YawRight
-      renderView.yaw()
-    else:
-      renderView.pitchDirection = renderView.PitchDown
-      renderView.pitch()
-
-    # Rotate step-by-step
-    rotationStepSize = (endRotation - startRotation) / (numberOfImages - 1)
-    renderView.setPitchRollYawIncrement(rotationStepSize)
-    if rotationAxis == AXIS_YAW:
-      renderView.yawDirection = renderView.YawLeft
-    else:
-      renderView.pitchDirection = renderView.PitchUp
-    for offsetIndex in range(numberOfImages):
-      if not self.cancelRequested:
-        filename = filePathPattern % offsetIndex
-        self.addLog("Write " + filename)
-        self.captureImageFromView(None if captureAllViews else renderView, filename, transparentBackground)
+    if offscreenRendering:
+      self.startOffscreenRendering(renderView)
+    try:
+      # Save original orientation and go to start orientation
+      originalPitchRollYawIncrement = renderView.pitchRollYawIncrement
+      originalDirection = renderView.pitchDirection
+      renderView.setPitchRollYawIncrement(-startRotation)
       if rotationAxis == AXIS_YAW:
+        renderView.yawDirection = renderView.YawRight
         renderView.yaw()
       else:
+        renderView.pitchDirection = renderView.PitchDown
         renderView.pitch()
 
-    # Restore original orientation and rotation step size & direction
-    if rotationAxis == AXIS_YAW:
-      renderView.yawDirection = renderView.YawRight
-      renderView.yaw()
-      renderView.setPitchRollYawIncrement(endRotation)
-      renderView.yaw()
-      renderView.setPitchRollYawIncrement(originalPitchRollYawIncrement)
-      renderView.yawDirection = originalDirection
-    else:
-      renderView.pitchDirection = renderView.PitchDown
-      renderView.pitch()
-      renderView.setPitchRollYawIncrement(endRotation)
-      renderView.pitch()
-      renderView.setPitchRollYawIncrement(originalPitchRollYawIncrement)
-      renderView.pitchDirection = originalDirection
+      # Rotate step-by-step
+      rotationStepSize = (endRotation - startRotation) / (numberOfImages - 1)
+      renderView.setPitchRollYawIncrement(rotationStepSize)
+      if rotationAxis == AXIS_YAW:
+        renderView.yawDirection = renderView.YawLeft
+      else:
+        renderView.pitchDirection = renderView.PitchUp
+      for offsetIndex in range(numberOfImages):
+        if not self.cancelRequested:
+          filename = filePathPattern % offsetIndex
+          self.addLog("Write " + filename)
+          self.captureImageFromView(None if captureAllViews else renderView, filename, transparentBackground)
+        if rotationAxis == AXIS_YAW:
+          renderView.yaw()
+        else:
+          renderView.pitch()
+
+      # Restore original orientation and rotation step size & direction
+      if rotationAxis == AXIS_YAW:
+        renderView.yawDirection = renderView.YawRight
+        renderView.yaw()
+        renderView.setPitchRollYawIncrement(endRotation)
+        renderView.yaw()
+        renderView.setPitchRollYawIncrement(originalPitchRollYawIncrement)
+        renderView.yawDirection = originalDirection
+      else:
+        renderView.pitchDirection = renderView.PitchDown
+        renderView.pitch()
+        renderView.setPitchRollYawIncrement(endRotation)
+        renderView.pitch()
+        renderView.setPitchRollYawIncrement(originalPitchRollYawIncrement)
+        renderView.pitchDirection = originalDirection
+    finally:
+      if offscreenRendering:
+        self.stopOffscreenRendering(renderView)
 
     if self.cancelRequested:
       raise ValueError('User requested cancel.')
@@ -1089,16 +1254,51 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
     if self.cancelRequested:
       raise ValueError('User requested cancel.')
 
-  def createVideo(self, frameRate, extraOptions, outputDir, imageFileNamePattern, videoFileName):
-    self.addLog("Export to video...")
-
-    # Get ffmpeg
+  def getValidFfmpegPath(self):
     import os.path
     ffmpegPath = os.path.abspath(self.getFfmpegPath())
     if not ffmpegPath:
       raise ValueError("Video creation failed: ffmpeg executable path is not defined")
     if not os.path.isfile(ffmpegPath):
       raise ValueError("Video creation failed: ffmpeg executable path is invalid: "+ffmpegPath)
+    return ffmpegPath
+
+  def startVideoStream(self, frameRate, extraOptions, outputDir, videoFileName, transparentBackground=False):
+    """
+    Start an ffmpeg process that encodes all subsequently captured images into a video file.
+    Images are piped to ffmpeg as raw frames, no image files are written.
+    Call finishVideoStream() after all images are captured.
+    """
+    self.addLog("Export to video (streaming frames to encoder)...")
+    if not os.path.exists(outputDir):
+      os.makedirs(outputDir)
+    outputVideoFilePath = os.path.join(outputDir, videoFileName)
+    self.videoStreamWriter = FfmpegFrameWriter(self.getValidFfmpegPath(), frameRate, extraOptions,
+      outputVideoFilePath, transparentBackground, logCallback=self.addLog)
+
+  def finishVideoStream(self):
+    """
+    Wait until all captured frames are encoded and close the video file.
+    """
+    videoStreamWriter = self.videoStreamWriter
+    self.videoStreamWriter = None
+    videoStreamWriter.finish()
+    self.addLog("Video export succeeded to file: "+videoStreamWriter.outputVideoFilePath)
+
+  def cancelVideoStream(self):
+    """
+    Stop video encoding started by startVideoStream() without waiting for completion.
+    """
+    if self.videoStreamWriter:
+      self.videoStreamWriter.abort()
+      self.videoStreamWriter = None
+
+  def createVideo(self, frameRate, extraOptions, outputDir, imageFileNamePattern, videoFileName):
+    self.addLog("Export to video...")
+
+    # Get ffmpeg
+    import os.path
+    ffmpegPath = self.getValidFfmpegPath()
 
     filePathPattern = os.path.join(outputDir, imageFileNamePattern)
     outputVideoFilePath = os.path.join(outputDir, videoFileName)
@@ -1150,6 +1350,185 @@ class ScreenCaptureLogic(ScriptedLoadableModuleLogic):
       snapshotIndex += 1
     return [filename, snapshotIndex]
 
+def writeImageFile(pixels, filename):
+  """Write an RGB or RGBA image to file. pixels is a numpy array of unsigned char
+  values (rows x columns x components), with the top row first.
+  PNG files are encoded using zlib, which does not hold the Python interpreter lock
+  while compressing, therefore multiple images can be written in parallel threads.
+  All rows use the PNG "Up" filter (difference from the row above), which can be computed
+  for the whole image at once and compresses screenshots much better than no filtering.
+  The adaptive per-row filter selection of other PNG encoders is not performed, therefore
+  files may be somewhat larger than the ones written by VTK.
+  Other file formats are written using VTK image writers.
+  """
+  import numpy as np
+  height, width, numberOfComponents = pixels.shape
+  if filename.lower().endswith('.png'):
+    import struct
+    import zlib
+    def chunk(chunkType, data):
+      return (struct.pack('>I', len(data)) + chunkType + data
+        + struct.pack('>I', zlib.crc32(chunkType + data) & 0xffffffff))
+    colorType = {1: 0, 2: 4, 3: 2, 4: 6}[numberOfComponents]
+    # each row starts with filter type byte (2 = Up filter), followed by the difference from the row above
+    rows = np.empty((height, width * numberOfComponents + 1), dtype=np.uint8)
+    rows[:, 0] = 2
+    pixelRows = pixels.reshape(height, -1).astype(np.uint8, copy=False)
+    rows[0, 1:] = pixelRows[0]
+    np.subtract(pixelRows[1:], pixelRows[:-1], out=rows[1:, 1:])
+    with open(filename, 'wb') as pngFile:
+      pngFile.write(b'\x89PNG\r\n\x1a\n')
+      pngFile.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, colorType, 0, 0, 0)))
+      pngFile.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+      pngFile.write(chunk(b'IEND', b''))
+    return
+  from vtk.util.numpy_support import numpy_to_vtk
+  writers = {'.jpg': vtk.vtkJPEGWriter, '.jpeg': vtk.vtkJPEGWriter, '.bmp': vtk.vtkBMPWriter,
+    '.tif': vtk.vtkTIFFWriter, '.tiff': vtk.vtkTIFFWriter}
+  extension = os.path.splitext(filename)[1].lower()
+  if extension not in writers:
+    raise ValueError("Unsupported image file format: " + filename)
+  imageData = vtk.vtkImageData()
+  imageData.SetDimensions(width, height, 1)
+  imageData.GetPointData().SetScalars(numpy_to_vtk(pixels[::-1].reshape(-1, numberOfComponents), deep=True))
+  writer = writers[extension]()
+  writer.SetFileName(filename)
+  writer.SetInputData(imageData)
+  writer.Write()
+
+class FfmpegFrameWriter(object):
+  """Encode captured images into a video file by piping raw RGB (or RGBA) frames
+  into the standard input of an ffmpeg process.
+  Frames are put into a bounded queue and written to ffmpeg by a background thread,
+  so capturing of new frames and encoding of previous frames overlap.
+  """
+
+  def __init__(self, ffmpegPath, frameRate, extraOptions, outputVideoFilePath, transparentBackground=False,
+    maximumNumberOfQueuedFrames=8, logCallback=None):
+    import queue
+    self.ffmpegPath = ffmpegPath
+    self.frameRate = frameRate
+    self.extraOptions = extraOptions
+    self.outputVideoFilePath = outputVideoFilePath
+    self.numberOfChannels = 4 if transparentBackground else 3
+    self.logCallback = logCallback
+    self.frameQueue = queue.Queue(maximumNumberOfQueuedFrames)
+    self.frameSize = None
+    self.process = None
+    self.writerThread = None
+    self.writeError = None
+    self.errorOutputFile = None
+
+  def addLog(self, text):
+    logging.info(text)
+    if self.logCallback:
+      self.logCallback(text)
+
+  def getFfmpegCommand(self, width, height):
+    """Get ffmpeg command line for encoding frames of the given size read from standard input"""
+    ffmpegParams = [self.ffmpegPath,
+                    "-y", # overwrite without asking
+                    "-f", "rawvideo",
+                    "-pix_fmt", "rgba" if self.numberOfChannels == 4 else "rgb24",
+                    "-s", "%dx%d" % (width, height),
+                    "-r", str(self.frameRate),
+                    "-i", "-"]
+    ffmpegParams += [_f for _f in self.extraOptions.split(' ') if _f]
+    ffmpegParams.append(self.outputVideoFilePath)
+    return ffmpegParams
+
+  def start(self, width, height):
+    import subprocess
+    import tempfile
+    import threading
+    ffmpegParams = self.getFfmpegCommand(width, height)
+    self.addLog("Start ffmpeg:\n"+' '.join(ffmpegParams))
+    # ffmpeg output is collected in a file, as a pipe that is not read could block ffmpeg
+    self.errorOutputFile = tempfile.TemporaryFile()
+    self.process = subprocess.Popen(ffmpegParams, stdin=subprocess.PIPE, stdout=self.errorOutputFile,
+      stderr=self.errorOutputFile, cwd=os.path.dirname(self.outputVideoFilePath))
+    self.frameSize = (width, height)
+    self.writerThread = threading.Thread(target=self.writeQueuedFrames)
+    self.writerThread.start()
+
+  def writeQueuedFrames(self):
+    while True:
+      frame = self.frameQueue.get()
+      if frame is None:
+        break
+      if self.writeError:
+        # ffmpeg stopped, just consume remaining frames
+        continue
+      try:
+        self.process.stdin.write(frame)
+      except (IOError, OSError) as e:
+        self.writeError = e
+
+  def writeFrame(self, imageData):
+    """Add a frame to the video. imageData is a vtkImageData with unsigned char RGB or RGBA pixels.
+    Blocks if the maximum number of frames are already waiting to be encoded.
+    """
+    import numpy as np
+    from vtk.util.numpy_support import vtk_to_numpy
+    dims = imageData.GetDimensions()
+    numberOfComponents = imageData.GetNumberOfScalarComponents()
+    pixels = vtk_to_numpy(imageData.GetPointData().GetScalars()).reshape(dims[1], dims[0], numberOfComponents)
+
+    # Make sure image width and height is even, otherwise encoding may fail
+    width = dims[0] & ~1
+    height = dims[1] & ~1
+    if width < 2 or height < 2:
+      raise ValueError('Capture image from view failed')
+    pixels = pixels[:height, :width]
+    if numberOfComponents >= self.numberOfChannels:
+      pixels = pixels[:, :, :self.numberOfChannels]
+    else:
+      pixels = np.concatenate([pixels[:, :, :3], np.full((height, width, 1), 255, dtype=pixels.dtype)], axis=2)
+    # first row of VTK images is the bottom row
+    frame = np.ascontiguousarray(pixels[::-1]).tobytes()
+
+    if self.process is None:
+      self.start(width, height)
+    elif self.frameSize != (width, height):
+      raise ValueError("Video creation failed: image size changed from %dx%d to %dx%d during capture"
+        % (self.frameSize[0], self.frameSize[1], width, height))
+    if self.writeError:
+      raise ValueError("Video creation failed: writing frame to ffmpeg failed: " + str(self.writeError))
+    self.frameQueue.put(frame)
+
+  def stopWriterThread(self):
+    if self.writerThread:
+      self.frameQueue.put(None)
+      self.writerThread.join()
+      self.writerThread = None
+    try:
+      self.process.stdin.close()
+    except (IOError, OSError):
+      pass
+
+  def finish(self):
+    """Wait until all frames are encoded. Raises ValueError if video creation failed."""
+    if self.process is None:
+      raise ValueError("Video creation failed: no frames were captured")
+    self.stopWriterThread()
+    returnCode = self.process.wait()
+    self.errorOutputFile.seek(0)
+    ffmpegOutput = self.errorOutputFile.read().decode(errors='replace')
+    self.errorOutputFile.close()
+    if returnCode != 0 or self.writeError:
+      self.addLog("ffmpeg error output: " + ffmpegOutput)
+      raise ValueError("ffmpeg returned with error")
+    logging.debug("ffmpeg output: " + ffmpegOutput)
+
+  def abort(self):
+    """Stop encoding and terminate ffmpeg."""
+    if self.process is None:
+      return
+    self.process.kill()
+    self.stopWriterThread()
+    self.process.wait()
+    self.errorOutputFile.close()
+
 class ScreenCaptureTest(ScriptedLoadableModuleTest):
   """
   This is the test case for your scripted module.
@@ -1199,8 +1578,11 @@ class ScreenCaptureTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_SliceSweep()
+    self.test_SliceSweepBackgroundImageWriting()
     self.test_SliceFade()
     self.test_3dViewRotation()
+    self.test_OffscreenRendering()
+    self.test_FfmpegFrameWriter()
 
   def test_SliceSweep(self):
     self.delayDisplay("Testing SliceSweep")
@@ -1210,6 +1592,16 @@ class ScreenCaptureTest(ScriptedLoadableModuleTest):
     self.verifyAndDeleteWrittenFiles()
     self.delayDisplay('Testing SliceSweep completed successfully')
 
+  def test_SliceSweepBackgroundImageWriting(self):
+    self.delayDisplay("Testing SliceSweep with background image writing")
+    viewNode = slicer.mrmlScene.GetNodeByID('vtkMRMLSliceNodeRed')
+    self.assertIsNotNone(viewNode)
+    self.logic.startBackgroundImageWriting(numberOfWorkers=4)
+    self.logic.captureSliceSweep(viewNode, -125, 75, self.numberOfImages, self.tempDir, self.imageFileNamePattern)
+    self.logic.finishBackgroundImageWriting()
+    self.verifyAndDeleteWrittenFiles()
+    self.delayDisplay('Testing SliceSweep with background image writing completed successfully')
+
   def test_SliceFade(self):
     self.delayDisplay("Testing SliceFade")
     viewNode = slicer.mrmlScene.GetNodeByID('vtkMRMLSliceNodeRed')
@@ -1225,3 +1617,127 @@ class ScreenCaptureTest(ScriptedLoadableModuleTest):
     self.logic.capture3dViewRotation(viewNode, -180, 180, self.numberOfImages, AXIS_YAW, self.tempDir, self.imageFileNamePattern)
     self.verifyAndDeleteWrittenFiles()
     self.delayDisplay('Testing 3D view rotation completed successfully')
+
+  def test_OffscreenRendering(self):
+    self.delayDisplay("Testing offscreen rendering")
+    sliceNode = slicer.mrmlScene.GetNodeByID('vtkMRMLSliceNodeRed')
+    viewNode = slicer.mrmlScene.GetNodeByID('vtkMRMLViewNode1')
+    sliceRenderWindow = self.logic.viewFromNode(sliceNode).renderWindow()
+    sliceRenderers = self.logic.getRenderers(sliceRenderWindow)
+    threeDRenderWindow = self.logic.viewFromNode(viewNode).renderWindow()
+    threeDRenderers = self.logic.getRenderers(threeDRenderWindow)
+
+    self.logic.captureSliceSweep(sliceNode, -125, 75, self.numberOfImages, self.tempDir, self.imageFileNamePattern,
+      offscreenRendering=True)
+    self.verifyAndDeleteWrittenFiles()
+    self.logic.capture3dViewRotation(viewNode, -180, 180, self.numberOfImages, AXIS_YAW, self.tempDir, self.imageFileNamePattern,
+      offscreenRendering=True)
+    self.verifyAndDeleteWrittenFiles()
+
+    # renderers are moved back to the views
+    self.assertEqual(self.logic.offscreenRenderWindows, {})
+    self.assertEqual(self.logic.getRenderers(sliceRenderWindow), sliceRenderers)
+    self.assertEqual(self.logic.getRenderers(threeDRenderWindow), threeDRenderers)
+
+    # offscreen rendering cannot be used when all views are captured
+    with self.assertRaises(ValueError):
+      self.logic.captureSliceSweep(sliceNode, -125, 75, self.numberOfImages, self.tempDir, self.imageFileNamePattern,
+        captureAllViews=True, offscreenRendering=True)
+    with self.assertRaises(ValueError):
+      self.logic.capture3dViewRotation(viewNode, -180, 180, self.numberOfImages, AXIS_YAW, self.tempDir, self.imageFileNamePattern,
+        captureAllViews=True, offscreenRendering=True)
+    self.assertEqual(self.logic.getRenderers(threeDRenderWindow), threeDRenderers)
+
+    self.delayDisplay('Testing offscreen rendering completed successfully')
+
+  def test_FfmpegFrameWriter(self):
+    self.delayDisplay("Testing writing frames to ffmpeg")
+    import sys
+    import numpy as np
+    from vtk.util.numpy_support import numpy_to_vtk
+
+    # Stand-in for ffmpeg that copies the received frames into the output file.
+    # It fails if the received data is not a whole number of frames.
+    if not os.path.exists(self.tempDir):
+      os.makedirs(self.tempDir)
+    standInScriptPath = os.path.join(self.tempDir, 'FfmpegStandIn.py')
+    with open(standInScriptPath, 'w') as f:
+      f.write("""import sys
+args = sys.argv[1:]
+if '-fail' in args:
+  sys.exit(1)
+width, height = [int(size) for size in args[args.index('-s') + 1].split('x')]
+numberOfChannels = 4 if args[args.index('-pix_fmt') + 1] == 'rgba' else 3
+data = sys.stdin.buffer.read()
+if not data or len(data) % (width * height * numberOfChannels):
+  sys.stderr.write('Received %d bytes, which is not a whole number of frames' % len(data))
+  sys.exit(1)
+with open(args[-1], 'wb') as f:
+  f.write(data)
+""")
+    # sys.executable is the application in Slicer, not a Python interpreter
+    pythonExecutable = os.path.join(slicer.app.slicerHome, 'bin', 'PythonSlicer.exe' if os.name == 'nt' else 'PythonSlicer')
+    if not os.path.isfile(pythonExecutable):
+      pythonExecutable = sys.executable
+
+    class StandInFfmpegFrameWriter(FfmpegFrameWriter):
+      def getFfmpegCommand(self, width, height):
+        return [pythonExecutable, standInScriptPath] + FfmpegFrameWriter.getFfmpegCommand(self, width, height)[1:]
+
+    def createImage(pixels):
+      imageData = vtk.vtkImageData()
+      imageData.SetDimensions(pixels.shape[1], pixels.shape[0], 1)
+      imageData.GetPointData().SetScalars(numpy_to_vtk(pixels.reshape(-1, pixels.shape[2]), deep=True))
+      return imageData
+
+    outputFilePath = os.path.join(self.tempDir, 'FfmpegStandIn.out')
+    randomState = np.random.RandomState(0)
+    # odd image size is cropped to even size, RGB frames get opaque alpha channel
+    for transparentBackground, numberOfComponents in [(False, 3), (False, 4), (True, 3), (True, 4)]:
+      if os.path.exists(outputFilePath):
+        os.remove(outputFilePath)
+      frames = [randomState.randint(0, 256, (5, 7, numberOfComponents)).astype(np.uint8) for frameIndex in range(10)]
+      writer = StandInFfmpegFrameWriter('ffmpeg', 25, '', outputFilePath, transparentBackground,
+        maximumNumberOfQueuedFrames=2)
+      for frame in frames:
+        writer.writeFrame(createImage(frame))
+      writer.finish()
+      numberOfChannels = 4 if transparentBackground else 3
+      expectedFrames = []
+      for frame in frames:
+        expectedFrame = np.full((4, 6, numberOfChannels), 255, dtype=np.uint8)
+        channels = min(numberOfComponents, numberOfChannels)
+        # first row of VTK images is the bottom row
+        expectedFrame[:, :, :channels] = frame[:4, :6, :channels][::-1]
+        expectedFrames.append(expectedFrame.tobytes())
+      with open(outputFilePath, 'rb') as f:
+        self.assertEqual(f.read(), b''.join(expectedFrames))
+
+    # frame size must not change
+    writer = StandInFfmpegFrameWriter('ffmpeg', 25, '', outputFilePath)
+    writer.writeFrame(createImage(np.zeros((4, 6, 3), dtype=np.uint8)))
+    # cropping an odd size to even size results in the same frame size
+    writer.writeFrame(createImage(np.zeros((5, 7, 3), dtype=np.uint8)))
+    with self.assertRaises(ValueError):
+      writer.writeFrame(createImage(np.zeros((4, 8, 3), dtype=np.uint8)))
+    writer.abort()
+    self.assertIsNotNone(writer.process.returncode)
+
+    # images smaller than 2x2 cannot be encoded
+    writer = StandInFfmpegFrameWriter('ffmpeg', 25, '', outputFilePath)
+    with self.assertRaises(ValueError):
+      writer.writeFrame(createImage(np.zeros((1, 6, 3), dtype=np.uint8)))
+    # no frames were written
+    with self.assertRaises(ValueError):
+      writer.finish()
+    writer.abort()
+
+    # ffmpeg errors are reported
+    writer = StandInFfmpegFrameWriter('ffmpeg', 25, '-fail', outputFilePath)
+    writer.writeFrame(createImage(np.zeros((4, 6, 3), dtype=np.uint8)))
+    with self.assertRaises(ValueError):
+      writer.finish()
+
+    os.remove(outputFilePath)
+    os.remove(standInScriptPath)
+    self.delayDisplay('Testing writing frames to ffmpeg completed successfully')
@@ -137,6 +137,14 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
     # add caclulator's option widgets
     self.addPluginOptionWidgets()
 
+    # Number of workers
+    self.numberOfWorkersSpinBox = qt.QSpinBox()
+    self.numberOfWorkersSpinBox.minimum = 1
+    self.numberOfWorkersSpinBox.maximum = max(qt.QThread.idealThreadCount(), 1)
+    self.numberOfWorkersSpinBox.setToolTip("Number of segments or plugins that are computed in parallel.")
+    self.numberOfWorkersSpinBox.connect('valueChanged(int)', self.updateParameterNodeFromGui)
+    self.parametersLayout.addRow("Number of workers:", self.numberOfWorkersSpinBox)
+
     # Apply Button
     self.applyButton = qt.QPushButton("Apply")
     self.applyButton.toolTip = "Calculate Statistics."
@@ -172,6 +180,7 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
   def cleanup(self):
     if self.parameterNode and self.parameterNodeObserver:
       self.parameterNode.RemoveObserver(self.parameterNodeObserver)
+    self.logic.observeSegmentation(None)
 
   def onNodeSelectionChanged(self):
     self.applyButton.enabled = (self.segmentationSelector.currentNode() is not None and
@@ -197,7 +206,12 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
       self.logic.getParameterNode().UnsetParameter("ScalarVolume")
     self.logic.getParameterNode().SetParameter("MeasurementsTable", self.outputTableSelector.currentNode().GetID())
     # Compute statistics
-    self.logic.computeStatistics()
+    self.logic.progressCallback = self.onProgress
+    try:
+      # only segments that have changed since the previous computation are recomputed
+      self.logic.updateStatistics()
+    finally:
+      self.logic.progressCallback = None
     self.logic.exportToTable(self.outputTableSelector.currentNode())
     # Unlock GUI
     self.applyButton.setEnabled(True)
@@ -205,6 +219,11 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
 
     self.logic.showTable(self.outputTableSelector.currentNode())
 
+  def onProgress(self, completedTasks, totalTasks):
+    """Show computation progress on the apply button and keep the GUI responsive"""
+    self.applyButton.text = "Working... (%d%%)" % (100 * completedTasks // max(totalTasks, 1))
+    slicer.app.processEvents()
+
   def onEditParameters(self, pluginName=None):
     """Open dialog box to edit plugin's parameters"""
     if self.parameterNodeSelector.currentNode():
@@ -258,6 +277,11 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
         previousState = checkbox.blockSignals(True)
         checkbox.checked = value
         checkbox.blockSignals(previousState)
+    numberOfWorkers = self.logic.getNumberOfWorkers()
+    if self.numberOfWorkersSpinBox.value!=numberOfWorkers:
+      previousState = self.numberOfWorkersSpinBox.blockSignals(True)
+      self.numberOfWorkersSpinBox.value = numberOfWorkers
+      self.numberOfWorkersSpinBox.blockSignals(previousState)
 
   def updateParameterNodeFromGui(self):
     if not self.parameterNode:
@@ -267,6 +291,7 @@ class SegmentStatisticsWidget(ScriptedLoadableModuleWidget):
       parameter = pluginName+'.enabled'
       checkbox = self.pluginEnabledCheckboxes[plugin.name]
       self.parameterNode.SetParameter(parameter, str(checkbox.checked))
+    self.parameterNode.SetParameter('numberOfWorkers', str(self.numberOfWorkersSpinBox.value))
 
 
 class SegmentStatisticsParameterEditorDialog(qt.QDialog):
@@ -378,6 +403,14 @@ class SegmentStatisticsLogic(ScriptedLoadableModuleLogic):
 
     self.keys = ["Segment"]
     self.notAvailableValueString = ""
+    #: optional function that is called as progressCallback(completedTasks, totalTasks)
+    #: during computation of statistics
+    self.progressCallback = None
+
+    self.segmentModifiedTimes = {} # map from segment ID to modified time of segment when statistics were computed
+    self.computedInputState = None # inputs and parameters that were used for computing current statistics
+    self.observedSegmentation = None
+    self.segmentationObserverTags = []
     self.reset()
 
   def getParameterNode(self):
@@ -401,6 +434,15 @@ class SegmentStatisticsLogic(ScriptedLoadableModuleLogic):
       plugin.setDefaultParameters(parameterNode)
     if not parameterNode.GetParameter('visibleSegmentsOnly'):
       parameterNode.SetParameter('visibleSegmentsOnly', str(True))
+    if not parameterNode.GetParameter('numberOfWorkers'):
+      parameterNode.SetParameter('numberOfWorkers', str(1))
+
+  def getNumberOfWorkers(self):
+    """Get the number of worker threads used for computing statistics (1 means computation in the main thread)"""
+    try:
+      return max(int(self.getParameterNode().GetParameter('numberOfWorkers')), 1)
+    except ValueError:
+      return 1
 
   def getStatistics(self):
     """Get the calculated statistical measurements"""
@@ -416,11 +458,11 @@ class SegmentStatisticsLogic(ScriptedLoadableModuleLogic):
       self.keys += [plugin.toLongKey(k) for k in plugin.keys]
     params = self.getParameterNode()
     params.statistics = {"SegmentIDs":[], "MeasurementInfo": {}}
+    self.segmentModifiedTimes = {}
+    self.computedInputState = None
 
-  def computeStatistics(self):
-    """Compute statistical measures for all (visible) segments"""
-    self.reset()
-
+  def getSegmentIDsForComputation(self):
+    """Get list of IDs of segments that statistics are computed for (all or only visible segments)"""
     segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
 
     # Get segment ID list
@@ -432,38 +474,204 @@ class SegmentStatisticsLogic(ScriptedLoadableModuleLogic):
     if visibleSegmentIds.GetNumberOfValues() == 0:
       logging.debug("computeStatistics will not return any results: there are no visible segments")
 
+    return [visibleSegmentIds.GetValue(segmentIndex) for segmentIndex in range(visibleSegmentIds.GetNumberOfValues())]
+
+  def computeStatistics(self):
+    """Compute statistical measures for all (visible) segments"""
+    self.reset()
+
+    segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
+    self.observeSegmentation(segmentationNode.GetSegmentation())
+    self.computedInputState = self.getInputState()
+
     # update statistics for all segment IDs
-    for segmentIndex in range(visibleSegmentIds.GetNumberOfValues()):
-      segmentID = visibleSegmentIds.GetValue(segmentIndex)
-      self.updateStatisticsForSegment(segmentID)
+    self.updateStatisticsForSegments(self.getSegmentIDsForComputation())
+
+  def updateStatistics(self):
+    """Update statistical measures for all (visible) segments.
+    Only segments that have been added or modified since the last computation are recomputed.
+    All segments are recomputed if input volumes, transforms, or parameters have changed.
+    """
+    segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
+    if segmentationNode.GetSegmentation() != self.observedSegmentation or self.getInputState() != self.computedInputState:
+      self.computeStatistics()
+      return
+
+    segmentIDs = self.getSegmentIDsForComputation()
+    statistics = self.getStatistics()
+
+    # Remove results of segments that are removed, hidden, or need to be recomputed
+    modifiedSegmentIDs = []
+    for segmentID in segmentIDs:
+      segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
+      if (segmentID not in self.segmentModifiedTimes
+        or self.segmentModifiedTimes[segmentID] != self.getSegmentModifiedTime(segment)):
+        modifiedSegmentIDs.append(segmentID)
+    for segmentID in statistics["SegmentIDs"]:
+      if segmentID not in segmentIDs or segmentID in modifiedSegmentIDs:
+        self.removeStatisticsForSegment(segmentID)
+    statistics["SegmentIDs"] = [segmentID for segmentID in segmentIDs if segmentID not in modifiedSegmentIDs]
+
+    logging.debug("updateStatistics: recompute %d of %d segments" % (len(modifiedSegmentIDs), len(segmentIDs)))
+    self.updateStatisticsForSegments(modifiedSegmentIDs)
+
+    # Keep the order of segments in the segmentation
+    statistics["SegmentIDs"] = [segmentID for segmentID in segmentIDs if segmentID in statistics["SegmentIDs"]]
+
+  def removeStatisticsForSegment(self, segmentID):
+    """Remove all measurement results of the specified segment"""
+    statistics = self.getStatistics()
+    for key in [key for key in statistics if isinstance(key, tuple) and key[0]==segmentID]:
+      del statistics[key]
+    self.segmentModifiedTimes.pop(segmentID, None)
+
+  def getInputState(self):
+    """Get a summary of all inputs and parameters that affect measurements of all segments.
+    If the input state changes then all cached measurement results become invalid.
+    """
+    parameterNode = self.getParameterNode()
+    ignoredParameters = ["MeasurementsTable", "numberOfWorkers"]
+    parameterNames = parameterNode.GetParameterNamesAsCommaSeparatedList().split(',')
+    parameters = tuple((name, parameterNode.GetParameter(name)) for name in sorted(parameterNames)
+                       if name not in ignoredParameters)
+
+    inputState = [parameterNode.GetID(), parameters]
+    for nodeID in [parameterNode.GetParameter("Segmentation"), parameterNode.GetParameter("ScalarVolume")]:
+      node = slicer.mrmlScene.GetNodeByID(nodeID) if nodeID else None
+      if not node:
+        inputState.append(None)
+        continue
+      transformNode = node.GetParentTransformNode()
+      imageData = node.GetImageData() if node.IsA("vtkMRMLScalarVolumeNode") else None
+      inputState.append((node.GetID(),
+                         node.GetMTime() if imageData else None, # volume geometry is stored in the node
+                         imageData.GetMTime() if imageData else None,
+                         transformNode.GetMTime() if transformNode else None))
+    return tuple(inputState)
+
+  def getSegmentModifiedTime(self, segment):
+    """Get modified time of a segment and its representations that measurements are computed from"""
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    modifiedTimes = [segment.GetMTime()]
+    for representationName in [
+      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName(),
+      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()]:
+      representation = segment.GetRepresentation(representationName)
+      modifiedTimes.append(representation.GetMTime() if representation else None)
+    return tuple(modifiedTimes)
+
+  def observeSegmentation(self, segmentation):
+    """Observe segment changes to invalidate cached measurement results of modified or removed segments"""
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    if self.observedSegmentation == segmentation:
+      return
+    # Remove old observer
+    if self.observedSegmentation:
+      for tag in self.segmentationObserverTags:
+        self.observedSegmentation.RemoveObserver(tag)
+      self.segmentationObserverTags = []
+      self.observedSegmentation = None
+    self.segmentModifiedTimes = {}
+    # Add new observer
+    if segmentation is not None:
+      self.observedSegmentation = segmentation
+      observedEvents = [
+        vtkSegmentationCore.vtkSegmentation.SegmentRemoved,
+        vtkSegmentationCore.vtkSegmentation.SegmentModified ]
+      for eventId in observedEvents:
+        self.segmentationObserverTags.append(self.observedSegmentation.AddObserver(eventId, self.onSegmentModified))
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentModified(self, caller, event, segmentID):
+    if segmentID:
+      self.segmentModifiedTimes.pop(segmentID, None)
+    else:
+      self.segmentModifiedTimes = {}
 
   def updateStatisticsForSegment(self, segmentID):
     """
     Update statistical measures for specified segment.
     Note: This will not change or reset measurement results of other segments
     """
-    import vtkSegmentationCorePython as vtkSegmentationCore
-
     segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
 
     if not segmentationNode.GetSegmentation().GetSegment(segmentID):
       logging.debug("updateStatisticsForSegment will not update any results because the segment doesn't exist")
       return
 
-    segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
+    self.updateStatisticsForSegments([segmentID])
+
+  def updateStatisticsForSegments(self, segmentIDs):
+    """
+    Update statistical measures for specified segments.
+    Each plugin computes measurements for all segments at once, which allows plugins
+    to process the input data in a single pass instead of once per segment.
+    Note: This will not change or reset measurement results of other segments
+    """
+    segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
+
+    segmentIDs = [segmentID for segmentID in segmentIDs if segmentationNode.GetSegmentation().GetSegment(segmentID)]
+    if not segmentIDs:
+      logging.debug("updateStatisticsForSegments will not update any results because no specified segment exists")
+      return
+
     statistics = self.getStatistics()
-    if segmentID not in statistics["SegmentIDs"]:
-      statistics["SegmentIDs"].append(segmentID)
-    statistics[segmentID,"Segment"] = segment.GetName()
+    for segmentID in segmentIDs:
+      segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
+      self.segmentModifiedTimes[segmentID] = self.getSegmentModifiedTime(segment)
+      if segmentID not in statistics["SegmentIDs"]:
+        statistics["SegmentIDs"].append(segmentID)
+      statistics[segmentID,"Segment"] = segment.GetName()
 
     # apply all enabled plugins
-    for plugin in self.plugins:
-      pluginName = plugin.__class__.__name__
-      if self.getParameterNode().GetParameter(pluginName+'.enabled')=='True':
-        stats = plugin.computeStatistics(segmentID)
-        for key in stats:
-          statistics[segmentID,pluginName+'.'+key] = stats[key]
-          statistics["MeasurementInfo"][pluginName+'.'+key] = plugin.getMeasurementInfo(key)
+    enabledPlugins = [plugin for plugin in self.plugins
+                      if self.getParameterNode().GetParameter(plugin.__class__.__name__+'.enabled')=='True']
+    numberOfWorkers = self.getNumberOfWorkers()
+
+    # Segments are independent, therefore each plugin may process a subset of the segments in a separate task
+    numberOfChunks = min(numberOfWorkers, len(segmentIDs))
+    segmentIDChunks = [segmentIDs[chunkIndex::numberOfChunks] for chunkIndex in range(numberOfChunks)]
+    tasks = [(plugin, segmentIDChunk) for plugin in enabledPlugins for segmentIDChunk in segmentIDChunks]
+
+    if numberOfWorkers > 1 and len(tasks) > 1:
+      # The scene, MRML nodes, and VTK objects are only accessed on the main thread: plugins extract
+      # their inputs for all chunks into numpy arrays here and only these arrays are processed in
+      # worker threads. Plugins that do not support this compute their statistics on the main thread.
+      from concurrent.futures import ThreadPoolExecutor, as_completed
+      completedTasks = 0
+      with ThreadPoolExecutor(max_workers=numberOfWorkers) as executor:
+        futures = {}
+        for plugin in enabledPlugins:
+          inputsList = plugin.getStatisticsInputs(segmentIDChunks)
+          if inputsList is None:
+            for segmentIDChunk in segmentIDChunks:
+              self.addPluginStatistics(plugin, plugin.computeStatisticsForSegments(segmentIDChunk))
+              completedTasks += 1
+              self.reportProgress(completedTasks, len(tasks))
+          else:
+            for inputs in inputsList:
+              futures[executor.submit(plugin.computeStatisticsFromInputs, inputs)] = plugin
+        for future in as_completed(futures):
+          self.addPluginStatistics(futures[future], future.result())
+          completedTasks += 1
+          self.reportProgress(completedTasks, len(tasks))
+    else:
+      for taskIndex, (plugin, segmentIDChunk) in enumerate(tasks):
+        self.addPluginStatistics(plugin, plugin.computeStatisticsForSegments(segmentIDChunk))
+        self.reportProgress(taskIndex+1, len(tasks))
+
+  def addPluginStatistics(self, plugin, pluginStatistics):
+    """Store measurements computed by a plugin (dictionary mapping segment IDs to measurement results)"""
+    statistics = self.getStatistics()
+    pluginName = plugin.__class__.__name__
+    for segmentID, stats in pluginStatistics.items():
+      for key in stats:
+        statistics[segmentID,pluginName+'.'+key] = stats[key]
+        statistics["MeasurementInfo"][pluginName+'.'+key] = plugin.getMeasurementInfo(key)
+
+  def reportProgress(self, completedTasks, totalTasks):
+    if self.progressCallback:
+      self.progressCallback(completedTasks, totalTasks)
 
   def getPluginByKey(self, key):
     """Get plugin responsible for obtaining measurement value for given key"""
@@ -633,6 +841,73 @@ class SegmentStatisticsLogic(ScriptedLoadableModuleLogic):
     fp.write(self.exportToString(nonEmptyKeysOnly))
     fp.close()
 
+  def computeStatisticsForCases(self, cases, fileName):
+    """
+    Compute statistics for a cohort and write results of all cases into a single CSV file.
+    cases: iterable of (segmentation file name, scalar volume file name) pairs, the scalar volume file name
+    may be None. Cases are loaded one at a time, therefore a generator can be used for large cohorts.
+    Rows are written to the file as soon as a case is processed and all nodes that were loaded for a case
+    are removed from the scene before the next case is loaded, so memory usage does not grow with the
+    number of cases. All measurement columns are written (empty value if not available for a case).
+    Returns the number of successfully processed cases.
+    """
+    import csv
+    parameterNode = self.getParameterNode()
+    numberOfProcessedCases = 0
+    with open(fileName, "w", newline="") as fp:
+      writer = csv.writer(fp)
+      writer.writerow(["Segmentation file", "Scalar volume file"] + self.keys)
+      for caseIndex, (segmentationFileName, scalarVolumeFileName) in enumerate(cases):
+        loadedNodes = []
+        try:
+          success, segmentationNode = slicer.util.loadSegmentation(segmentationFileName, returnNode=True)
+          if not success or not segmentationNode:
+            raise IOError("Failed to load segmentation from file: " + segmentationFileName)
+          loadedNodes.append(segmentationNode)
+          parameterNode.SetParameter("Segmentation", segmentationNode.GetID())
+          if scalarVolumeFileName:
+            success, scalarVolumeNode = slicer.util.loadVolume(scalarVolumeFileName, {"show": False}, returnNode=True)
+            if not success or not scalarVolumeNode:
+              raise IOError("Failed to load scalar volume from file: " + scalarVolumeFileName)
+            loadedNodes.append(scalarVolumeNode)
+            parameterNode.SetParameter("ScalarVolume", scalarVolumeNode.GetID())
+          else:
+            parameterNode.UnsetParameter("ScalarVolume")
+
+          self.computeStatistics()
+
+          statistics = self.getStatistics()
+          for segmentID in statistics["SegmentIDs"]:
+            row = [segmentationFileName, scalarVolumeFileName if scalarVolumeFileName else ""]
+            row += [statistics[segmentID, key] if (segmentID, key) in statistics else "" for key in self.keys]
+            writer.writerow(row)
+          fp.flush()
+          numberOfProcessedCases += 1
+        except Exception as e:
+          logging.error("Failed to compute statistics for case %d (%s): %s" % (caseIndex, segmentationFileName, str(e)))
+        finally:
+          # Release all data of this case before the next one is loaded
+          self.reset()
+          self.observeSegmentation(None)
+          parameterNode.UnsetParameter("Segmentation")
+          parameterNode.UnsetParameter("ScalarVolume")
+          self.removeNodesWithAssociatedNodes(loadedNodes)
+    return numberOfProcessedCases
+
+  @staticmethod
+  def removeNodesWithAssociatedNodes(nodes):
+    """Remove nodes from the scene along with their display and storage nodes"""
+    for node in nodes:
+      associatedNodes = []
+      if node.IsA("vtkMRMLDisplayableNode"):
+        associatedNodes += [node.GetNthDisplayNode(i) for i in range(node.GetNumberOfDisplayNodes())]
+      if node.IsA("vtkMRMLStorableNode"):
+        associatedNodes += [node.GetNthStorageNode(i) for i in range(node.GetNumberOfStorageNodes())]
+      slicer.mrmlScene.RemoveNode(node)
+      for associatedNode in associatedNodes:
+        if associatedNode and associatedNode.GetScene():
+          slicer.mrmlScene.RemoveNode(associatedNode)
+
 class SegmentStatisticsTest(ScriptedLoadableModuleTest):
   """
   This is the test case for your scripted module.
@@ -654,6 +929,15 @@ class SegmentStatisticsTest(ScriptedLoadableModuleTest):
     self.setUp()
     self.test_SegmentStatisticsPlugins()
 
+    self.setUp()
+    self.test_SegmentStatisticsBatchedComputation()
+
+    self.setUp()
+    self.test_SegmentStatisticsIncrementalUpdate()
+
+    self.setUp()
+    self.test_SegmentStatisticsCohort()
+
   def test_SegmentStatisticsBasic(self):
     """
     This tests some aspects of the label statistics
@@ -875,6 +1159,183 @@ class SegmentStatisticsTest(ScriptedLoadableModuleTest):
 
     self.delayDisplay('test_SegmentStatisticsPlugins passed!')
 
+  def test_SegmentStatisticsBatchedComputation(self):
+    """
+    This tests that computing statistics for all segments at once gives the same results
+    as computing them segment by segment
+    """
+
+    self.delayDisplay("Starting test_SegmentStatisticsBatchedComputation")
+
+    import SampleData
+    from SegmentStatistics import SegmentStatisticsLogic
+
+    self.delayDisplay("Load master volume")
+
+    masterVolumeNode = SampleData.downloadSample('MRBrainTumor1')
+
+    self.delayDisplay("Create segmentation containing a few overlapping spheres")
+
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
+    segmentationNode.CreateDefaultDisplayNodes()
+    segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(masterVolumeNode)
+
+    # Geometry for each segment is defined by: radius, posX, posY, posZ
+    segmentGeometries = [[10, -6,30,28], [20, 0,65,32], [15, 1, -14, 30], [12, 0, 28, -7], [15, -6,30,28]]
+    for segmentGeometry in segmentGeometries:
+      sphereSource = vtk.vtkSphereSource()
+      sphereSource.SetRadius(segmentGeometry[0])
+      sphereSource.SetCenter(segmentGeometry[1], segmentGeometry[2], segmentGeometry[3])
+      sphereSource.Update()
+      uniqueSegmentID = segmentationNode.GetSegmentation().GenerateUniqueSegmentID("Test")
+      segmentationNode.AddSegmentFromClosedSurfaceRepresentation(sphereSource.GetOutput(), uniqueSegmentID)
+
+    self.delayDisplay("Compute statistics")
+
+    segStatLogic = SegmentStatisticsLogic()
+    segStatLogic.getParameterNode().SetParameter("Segmentation", segmentationNode.GetID())
+    segStatLogic.getParameterNode().SetParameter("ScalarVolume", masterVolumeNode.GetID())
+    segStatLogic.computeStatistics()
+    statistics = segStatLogic.getStatistics()
+
+    self.delayDisplay("Compare results to segment by segment computation")
+    for plugin in segStatLogic.plugins:
+      pluginName = plugin.__class__.__name__
+      for segmentID in statistics["SegmentIDs"]:
+        stats = plugin.computeStatistics(segmentID)
+        for key in stats:
+          self.assertAlmostEqual(statistics[segmentID, pluginName+'.'+key], stats[key], places=3)
+
+    self.delayDisplay("Compute statistics using multiple workers")
+    parallelSegStatLogic = SegmentStatisticsLogic()
+    parallelSegStatLogic.getParameterNode().SetParameter("Segmentation", segmentationNode.GetID())
+    parallelSegStatLogic.getParameterNode().SetParameter("ScalarVolume", masterVolumeNode.GetID())
+    parallelSegStatLogic.getParameterNode().SetParameter("numberOfWorkers", "4")
+    progress = []
+    parallelSegStatLogic.progressCallback = lambda completedTasks, totalTasks: progress.append(completedTasks)
+    parallelSegStatLogic.computeStatistics()
+    self.assertTrue(len(progress) > 1)
+    self.assertEqual(parallelSegStatLogic.getStatistics()["SegmentIDs"], statistics["SegmentIDs"])
+    self.assertEqual(parallelSegStatLogic.exportToString(), segStatLogic.exportToString())
+
+    self.delayDisplay('test_SegmentStatisticsBatchedComputation passed!')
+
+  def test_SegmentStatisticsIncrementalUpdate(self):
+    """
+    This tests that only modified segments are recomputed when statistics are updated
+    """
+
+    self.delayDisplay("Starting test_SegmentStatisticsIncrementalUpdate")
+
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    import SampleData
+    from SegmentStatistics import SegmentStatisticsLogic
+
+    masterVolumeNode = SampleData.downloadSample('MRBrainTumor1')
+
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
+    segmentationNode.CreateDefaultDisplayNodes()
+    segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(masterVolumeNode)
+
+    # Geometry for each segment is defined by: radius, posX, posY, posZ
+    segmentGeometries = [[10, -6,30,28], [20, 0,65,32], [15, 1, -14, 30]]
+    for segmentGeometry in segmentGeometries:
+      sphereSource = vtk.vtkSphereSource()
+      sphereSource.SetRadius(segmentGeometry[0])
+      sphereSource.SetCenter(segmentGeometry[1], segmentGeometry[2], segmentGeometry[3])
+      sphereSource.Update()
+      uniqueSegmentID = segmentationNode.GetSegmentation().GenerateUniqueSegmentID("Test")
+      segmentationNode.AddSegmentFromClosedSurfaceRepresentation(sphereSource.GetOutput(), uniqueSegmentID)
+
+    segStatLogic = SegmentStatisticsLogic()
+    segStatLogic.getParameterNode().SetParameter("Segmentation", segmentationNode.GetID())
+    segStatLogic.getParameterNode().SetParameter("ScalarVolume", masterVolumeNode.GetID())
+    segStatLogic.updateStatistics()
+    self.assertEqual(segStatLogic.getStatistics()["Test","LabelmapSegmentStatisticsPlugin.voxel_count"], 2948)
+
+    self.delayDisplay("Update without changes")
+    computedSegmentIDs = []
+    originalUpdateStatisticsForSegments = segStatLogic.updateStatisticsForSegments
+    def updateStatisticsForSegments(segmentIDs):
+      computedSegmentIDs.extend(segmentIDs)
+      originalUpdateStatisticsForSegments(segmentIDs)
+    segStatLogic.updateStatisticsForSegments = updateStatisticsForSegments
+    segStatLogic.updateStatistics()
+    self.assertEqual(computedSegmentIDs, [])
+
+    self.delayDisplay("Update after modifying a segment")
+    sphereSource = vtk.vtkSphereSource()
+    sphereSource.SetRadius(5)
+    sphereSource.SetCenter(-6, 30, 28)
+    sphereSource.Update()
+    segment = segmentationNode.GetSegmentation().GetSegment("Test")
+    segment.RemoveAllRepresentations()
+    closedSurfaceName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+    segment.AddRepresentation(closedSurfaceName, sphereSource.GetOutput())
+    segStatLogic.updateStatistics()
+    self.assertEqual(computedSegmentIDs, ["Test"])
+    self.assertTrue(segStatLogic.getStatistics()["Test","LabelmapSegmentStatisticsPlugin.voxel_count"]!=2948)
+    self.assertEqual(segStatLogic.getStatistics()["SegmentIDs"], ["Test", "Test_1", "Test_2"])
+
+    self.delayDisplay("Update after removing a segment")
+    segmentationNode.GetSegmentation().RemoveSegment("Test_1")
+    segStatLogic.updateStatistics()
+    self.assertEqual(segStatLogic.getStatistics()["SegmentIDs"], ["Test", "Test_2"])
+    with self.assertRaises(KeyError): segStatLogic.getStatistics()["Test_1","LabelmapSegmentStatisticsPlugin.voxel_count"]
+
+    self.delayDisplay('test_SegmentStatisticsIncrementalUpdate passed!')
+
+  def test_SegmentStatisticsCohort(self):
+    """
+    This tests computation of statistics for multiple cases loaded from files
+    """
+
+    self.delayDisplay("Starting test_SegmentStatisticsCohort")
+
+    import csv
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    import SampleData
+    from SegmentStatistics import SegmentStatisticsLogic
+
+    self.delayDisplay("Save segmentation and volume to files")
+
+    masterVolumeNode = SampleData.downloadSample('MRBrainTumor1')
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
+    segmentationNode.CreateDefaultDisplayNodes()
+    segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(masterVolumeNode)
+    for segmentGeometry in [[10, -6,30,28], [20, 0,65,32]]:
+      sphereSource = vtk.vtkSphereSource()
+      sphereSource.SetRadius(segmentGeometry[0])
+      sphereSource.SetCenter(segmentGeometry[1], segmentGeometry[2], segmentGeometry[3])
+      sphereSource.Update()
+      uniqueSegmentID = segmentationNode.GetSegmentation().GenerateUniqueSegmentID("Test")
+      segmentationNode.AddSegmentFromClosedSurfaceRepresentation(sphereSource.GetOutput(), uniqueSegmentID)
+    segmentationNode.CreateBinaryLabelmapRepresentation()
+    segmentationNode.GetSegmentation().SetMasterRepresentationName(
+      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName())
+    segmentationFileName = slicer.app.temporaryPath + '/SegmentStatisticsTestSegmentation.seg.nrrd'
+    volumeFileName = slicer.app.temporaryPath + '/SegmentStatisticsTestVolume.nrrd'
+    self.assertTrue(slicer.util.saveNode(segmentationNode, segmentationFileName))
+    self.assertTrue(slicer.util.saveNode(masterVolumeNode, volumeFileName))
+    slicer.mrmlScene.Clear(0)
+    numberOfNodes = slicer.mrmlScene.GetNumberOfNodes()
+
+    self.delayDisplay("Compute statistics for cohort")
+    cases = ((segmentationFileName, volumeFileName if caseIndex % 2 else None) for caseIndex in range(3))
+    outputFilename = slicer.app.temporaryPath + '/SegmentStatisticsTestCohortOutput.csv'
+    segStatLogic = SegmentStatisticsLogic()
+    self.assertEqual(segStatLogic.computeStatisticsForCases(cases, outputFilename), 3)
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodes)
+
+    with open(outputFilename) as fp:
+      rows = list(csv.DictReader(fp))
+    self.assertEqual(len(rows), 6)
+    self.assertEqual(int(rows[0]["LabelmapSegmentStatisticsPlugin.voxel_count"]), 2948)
+    self.assertEqual(rows[0]["ScalarVolumeSegmentStatisticsPlugin.voxel_count"], "")
+    self.assertTrue(rows[2]["ScalarVolumeSegmentStatisticsPlugin.voxel_count"] != "")
+
+    self.delayDisplay('test_SegmentStatisticsCohort passed!')
+
 
 class Slicelet(object):
   """A slicer slicelet is a module widget that comes up in stand alone mode
@@ -71,6 +71,50 @@ class LabelmapSegmentStatisticsPlugin(SegmentStatisticsPluginBase):
       stats["volume_cm3"] = stat.GetVoxelCount() * cubicMMPerVoxel * ccPerCubicMM
     return stats
 
+  def computeStatisticsForSegments(self, segmentIDs):
+    """Compute measurements for requested keys on all given segments.
+    Voxels are counted directly on the labelmap arrays, which avoids setting up
+    a separate threshold/stencil/accumulate pipeline for each segment.
+    """
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    import vtk.util.numpy_support
+    import numpy as np
+    requestedKeys = self.getRequestedKeys()
+
+    segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
+
+    if len(requestedKeys)==0:
+      return {}
+
+    segBinaryLabelName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+    if not segmentationNode.GetSegmentation().ContainsRepresentation(segBinaryLabelName):
+      return {}
+
+    ccPerCubicMM = 0.001
+    statistics = {}
+    for segmentID in segmentIDs:
+      segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
+      segmentLabelmap = segment.GetRepresentation(segBinaryLabelName) if segment else None
+      if (not segmentLabelmap
+        or not segmentLabelmap.GetPointData()
+        or not segmentLabelmap.GetPointData().GetScalars()):
+        # No input label data
+        statistics[segmentID] = {}
+        continue
+      # Voxels with value > 0 belong to the segment (same as the threshold used in computeStatistics)
+      labelArray = vtk.util.numpy_support.vtk_to_numpy(segmentLabelmap.GetPointData().GetScalars())
+      voxelCount = int(np.count_nonzero(labelArray > 0))
+      cubicMMPerVoxel = reduce(lambda x,y: x*y, segmentLabelmap.GetSpacing())
+      stats = {}
+      if "voxel_count" in requestedKeys:
+        stats["voxel_count"] = voxelCount
+      if "volume_mm3" in requestedKeys:
+        stats["volume_mm3"] = voxelCount * cubicMMPerVoxel
+      if "volume_cm3" in requestedKeys:
+        stats["volume_cm3"] = voxelCount * cubicMMPerVoxel * ccPerCubicMM
+      statistics[segmentID] = stats
+    return statistics
+
   def getMeasurementInfo(self, key):
     """Get information (name, description, units, ...) about the measurement for the given key"""
     info = {}
@@ -23,51 +23,21 @@ class ScalarVolumeSegmentStatisticsPlugin(SegmentStatisticsPluginBase):
     if len(requestedKeys)==0:
       return {}
 
-    containsLabelmapRepresentation = segmentationNode.GetSegmentation().ContainsRepresentation(
-      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName())
-    if not containsLabelmapRepresentation:
+    if not self.isInputValid(segmentationNode, grayscaleNode):
       return {}
 
-    if (not grayscaleNode
-      or not grayscaleNode.GetImageData()
-      or not grayscaleNode.GetImageData().GetPointData()
-      or not grayscaleNode.GetImageData().GetPointData().GetScalars()):
-      # Input grayscale node does not contain valid image data
-      return {}
-
-    # Get geometry of grayscale volume node as oriented image data
-    # reference geometry in reference node coordinate system
-    referenceGeometry_Reference = vtkSegmentationCore.vtkOrientedImageData()
-    referenceGeometry_Reference.SetExtent(grayscaleNode.GetImageData().GetExtent())
-    ijkToRasMatrix = vtk.vtkMatrix4x4()
-    grayscaleNode.GetIJKToRASMatrix(ijkToRasMatrix)
-    referenceGeometry_Reference.SetGeometryFromImageToWorldMatrix(ijkToRasMatrix)
-
-    # Get transform between grayscale volume and segmentation
-    segmentationToReferenceGeometryTransform = vtk.vtkGeneralTransform()
-    slicer.vtkMRMLTransformNode.GetTransformBetweenNodes(segmentationNode.GetParentTransformNode(),
-      grayscaleNode.GetParentTransformNode(), segmentationToReferenceGeometryTransform)
+    referenceGeometry_Reference, segmentationToReferenceGeometryTransform = self.getReferenceGeometry(
+      segmentationNode, grayscaleNode)
 
     cubicMMPerVoxel = reduce(lambda x,y: x*y, referenceGeometry_Reference.GetSpacing())
     ccPerCubicMM = 0.001
 
-    segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
-    segBinaryLabelName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
-    segmentLabelmap = segment.GetRepresentation(segBinaryLabelName)
-
-    if (not segmentLabelmap
-      or not segmentLabelmap.GetPointData()
-      or not segmentLabelmap.GetPointData().GetScalars()):
+    segmentLabelmap_Reference = self.getSegmentLabelmapInReferenceGeometry(segmentationNode, segmentID,
+      referenceGeometry_Reference, segmentationToReferenceGeometryTransform)
+    if not segmentLabelmap_Reference:
       # No input label data
       return {}
 
-    segmentLabelmap_Reference = vtkSegmentationCore.vtkOrientedImageData()
-    vtkSegmentationCore.vtkOrientedImageDataResample.ResampleOrientedImageToReferenceOrientedImage(
-      segmentLabelmap, referenceGeometry_Reference, segmentLabelmap_Reference,
-      False, # nearest neighbor interpolation
-      False, # no padding
-      segmentationToReferenceGeometryTransform)
-
     # We need to know exactly the value of the segment voxels, apply threshold to make force the selected label value
     labelValue = 1
     backgroundValue = 0
@@ -116,6 +86,238 @@ class ScalarVolumeSegmentStatisticsPlugin(SegmentStatisticsPluginBase):
         stats["median"] = medians.GetMedian()
     return stats
 
+  def computeStatisticsForSegments(self, segmentIDs):
+    """Compute measurements for requested keys on all given segments in a single pass over the scalar volume.
+    Scalar values inside all segments are gathered once and statistics of all segments are accumulated
+    together, keyed by segment index, instead of running a separate VTK pipeline for each segment.
+    Overlapping segments are supported, as each voxel is counted for every segment that contains it.
+    """
+    return self.computeStatisticsFromInputs(self.getStatisticsInputs([segmentIDs], copyScalars=False)[0])
+
+  def getStatisticsInputs(self, segmentIDChunks, copyScalars=True):
+    """Get inputs for computing statistics of each chunk of segments.
+    Only resampling of segment labelmaps to the scalar volume geometry is done here for each chunk.
+    The scalar volume is copied and its histogram binning is computed once for all chunks, and
+    voxels of the segments are found by computeStatisticsFromInputs.
+    If copyScalars is False then inputs refer to the voxels of the scalar volume instead of a copy,
+    which is only safe if statistics are computed before the scene is modified.
+    """
+    import vtk.util.numpy_support
+    import numpy as np
+    requestedKeys = self.getRequestedKeys()
+    inputsList = [{"requestedKeys": requestedKeys, "segmentIDs": [], "emptySegmentIDs": [], "labelmaps": []}
+      for segmentIDChunk in segmentIDChunks]
+
+    segmentationNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
+    grayscaleNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("ScalarVolume"))
+
+    if len(requestedKeys)==0:
+      return inputsList
+
+    if not self.isInputValid(segmentationNode, grayscaleNode):
+      return inputsList
+
+    referenceGeometry_Reference, segmentationToReferenceGeometryTransform = self.getReferenceGeometry(
+      segmentationNode, grayscaleNode)
+
+    cubicMMPerVoxel = reduce(lambda x,y: x*y, referenceGeometry_Reference.GetSpacing())
+
+    grayscaleImage = grayscaleNode.GetImageData()
+    grayscaleArray = vtk.util.numpy_support.vtk_to_numpy(grayscaleImage.GetPointData().GetScalars())
+    if grayscaleArray.ndim > 1:
+      # statistics are computed for the first scalar component only
+      grayscaleArray = grayscaleArray[:,0]
+    if copyScalars:
+      # the copy is shared by all chunks, it is only read while computing statistics
+      grayscaleArray = np.array(grayscaleArray)
+    # median is computed from the same histogram bins as vtkImageHistogramStatistics uses for the whole image
+    binOrigin, binSpacing = slicer.util.histogramBinning(grayscaleArray)
+
+    for inputs, segmentIDChunk in zip(inputsList, segmentIDChunks):
+      inputs["cubicMMPerVoxel"] = cubicMMPerVoxel
+      inputs["binOrigin"], inputs["binSpacing"] = binOrigin, binSpacing
+      inputs["scalars"] = grayscaleArray
+      inputs["extent"] = grayscaleImage.GetExtent()
+      for segmentID in segmentIDChunk:
+        segmentLabelmap_Reference = self.getSegmentLabelmapInReferenceGeometry(segmentationNode, segmentID,
+          referenceGeometry_Reference, segmentationToReferenceGeometryTransform)
+        if not segmentLabelmap_Reference:
+          # No input label data
+          inputs["emptySegmentIDs"].append(segmentID)
+          continue
+        # The resampled labelmap is not used anywhere else, therefore its voxels are not copied.
+        # The numpy array keeps the VTK array alive.
+        labelArray = vtk.util.numpy_support.vtk_to_numpy(segmentLabelmap_Reference.GetPointData().GetScalars())
+        inputs["labelmaps"].append((labelArray, segmentLabelmap_Reference.GetExtent()))
+        inputs["segmentIDs"].append(segmentID)
+    return inputsList
+
+  def computeStatisticsFromInputs(self, inputs):
+    """Compute statistics of all segments from the labelmaps and scalars collected by getStatisticsInputs"""
+    requestedKeys = inputs["requestedKeys"]
+    ccPerCubicMM = 0.001
+    statistics = {}
+    for segmentID in inputs["emptySegmentIDs"]:
+      statistics[segmentID] = {}
+    if not inputs["segmentIDs"]:
+      return statistics
+
+    import numpy as np
+    # Collect values of voxels of all segments and scan them once for all segments
+    segmentIDs = inputs["segmentIDs"]
+    voxelIndicesList = []
+    segmentIndicesList = []
+    for segmentIndex, (labelArray, labelmapExtent) in enumerate(inputs["labelmaps"]):
+      voxelIndices = self.getVoxelIndicesInImage(labelArray, labelmapExtent, inputs["extent"])
+      voxelIndicesList.append(voxelIndices)
+      segmentIndicesList.append(np.full(len(voxelIndices), segmentIndex, dtype=np.int64))
+    values = inputs["scalars"][np.concatenate(voxelIndicesList)].astype(np.float64)
+    groupedStatistics = self.computeGroupedStatistics(values, np.concatenate(segmentIndicesList), len(segmentIDs),
+      inputs["binOrigin"], inputs["binSpacing"])
+
+    cubicMMPerVoxel = inputs["cubicMMPerVoxel"]
+    for segmentIndex, segmentID in enumerate(segmentIDs):
+      voxelCount = int(groupedStatistics["count"][segmentIndex])
+      stats = {}
+      if "voxel_count" in requestedKeys:
+        stats["voxel_count"] = voxelCount
+      if "volume_mm3" in requestedKeys:
+        stats["volume_mm3"] = voxelCount * cubicMMPerVoxel
+      if "volume_cm3" in requestedKeys:
+        stats["volume_cm3"] = voxelCount * cubicMMPerVoxel * ccPerCubicMM
+      if voxelCount>0:
+        for key in ["min", "max", "mean", "median", "stdev"]:
+          if key in requestedKeys:
+            stats[key] = float(groupedStatistics[key][segmentIndex])
+      statistics[segmentID] = stats
+    return statistics
+
+  def isInputValid(self, segmentationNode, grayscaleNode):
+    """Check if the segmentation has labelmap representation and the scalar volume contains image data"""
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    containsLabelmapRepresentation = segmentationNode.GetSegmentation().ContainsRepresentation(
+      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName())
+    if not containsLabelmapRepresentation:
+      return False
+
+    if (not grayscaleNode
+      or not grayscaleNode.GetImageData()
+      or not grayscaleNode.GetImageData().GetPointData()
+      or not grayscaleNode.GetImageData().GetPointData().GetScalars()):
+      # Input grayscale node does not contain valid image data
+      return False
+
+    return True
+
+  def getReferenceGeometry(self, segmentationNode, grayscaleNode):
+    """Get geometry of grayscale volume node as oriented image data and the transform
+    from the segmentation to the grayscale volume
+    """
+    import vtkSegmentationCorePython as vtkSegmentationCore
+
+    # reference geometry in reference node coordinate system
+    referenceGeometry_Reference = vtkSegmentationCore.vtkOrientedImageData()
+    referenceGeometry_Reference.SetExtent(grayscaleNode.GetImageData().GetExtent())
+    ijkToRasMatrix = vtk.vtkMatrix4x4()
+    grayscaleNode.GetIJKToRASMatrix(ijkToRasMatrix)
+    referenceGeometry_Reference.SetGeometryFromImageToWorldMatrix(ijkToRasMatrix)
+
+    # Get transform between grayscale volume and segmentation
+    segmentationToReferenceGeometryTransform = vtk.vtkGeneralTransform()
+    slicer.vtkMRMLTransformNode.GetTransformBetweenNodes(segmentationNode.GetParentTransformNode(),
+      grayscaleNode.GetParentTransformNode(), segmentationToReferenceGeometryTransform)
+
+    return referenceGeometry_Reference, segmentationToReferenceGeometryTransform
+
+  def getSegmentLabelmapInReferenceGeometry(self, segmentationNode, segmentID, referenceGeometry_Reference,
+                                            segmentationToReferenceGeometryTransform):
+    """Resample the segment's binary labelmap into the reference geometry.
+    Returns None if the segment has no labelmap data.
+    """
+    import vtkSegmentationCorePython as vtkSegmentationCore
+    segment = segmentationNode.GetSegmentation().GetSegment(segmentID)
+    if not segment:
+      return None
+    segBinaryLabelName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+    segmentLabelmap = segment.GetRepresentation(segBinaryLabelName)
+
+    if (not segmentLabelmap
+      or not segmentLabelmap.GetPointData()
+      or not segmentLabelmap.GetPointData().GetScalars()):
+      return None
+
+    segmentLabelmap_Reference = vtkSegmentationCore.vtkOrientedImageData()
+    vtkSegmentationCore.vtkOrientedImageDataResample.ResampleOrientedImageToReferenceOrientedImage(
+      segmentLabelmap, referenceGeometry_Reference, segmentLabelmap_Reference,
+      False, # nearest neighbor interpolation
+      False, # no padding
+      segmentationToReferenceGeometryTransform)
+    return segmentLabelmap_Reference
+
+  @staticmethod
+  def getVoxelIndicesInImage(labelArray, labelmapExtent, imageExtent):
+    """Get flat point indices in image of all voxels where labelmap value is greater than zero.
+    labelArray contains the labelmap voxels in VTK point order. The labelmap must be in the same
+    geometry as the image but its extent may be different. Voxels outside the image extent are ignored.
+    """
+    import numpy as np
+    labelmapDimensions = [labelmapExtent[axis*2+1]-labelmapExtent[axis*2]+1 for axis in range(3)]
+    imageDimensions = [imageExtent[axis*2+1]-imageExtent[axis*2]+1 for axis in range(3)]
+    if min(labelmapDimensions) <= 0 or min(imageDimensions) <= 0:
+      return np.zeros(0, dtype=np.int64)
+
+    labelArray = labelArray.reshape(labelmapDimensions[2], labelmapDimensions[1], labelmapDimensions[0])
+    k, j, i = np.nonzero(labelArray > 0)
+    i = i + (labelmapExtent[0] - imageExtent[0])
+    j = j + (labelmapExtent[2] - imageExtent[2])
+    k = k + (labelmapExtent[4] - imageExtent[4])
+    insideImage = ((i >= 0) & (i < imageDimensions[0]) & (j >= 0) & (j < imageDimensions[1])
+      & (k >= 0) & (k < imageDimensions[2]))
+    return np.ravel_multi_index((k[insideImage], j[insideImage], i[insideImage]),
+      (imageDimensions[2], imageDimensions[1], imageDimensions[0])).astype(np.int64)
+
+  @staticmethod
+  def computeGroupedStatistics(values, groups, numberOfGroups, binOrigin, binSpacing):
+    """Compute count, min, max, mean, median, and stdev of values for each group in one pass.
+    groups contains the group index (0 <= index < numberOfGroups) of each value.
+    The median is computed from histogram bins of binSpacing width starting at binOrigin,
+    the same way as vtkImageHistogramStatistics computes it.
+    Returns a dictionary mapping statistic name to an array of numberOfGroups elements.
+    Values of empty groups are set to NaN (count is set to 0).
+    """
+    import numpy as np
+    counts = np.bincount(groups, minlength=numberOfGroups)
+    nonEmpty = counts > 0
+    nonEmptyCounts = counts[nonEmpty]
+    result = {"count": counts}
+    for key in ["min", "max", "mean", "median", "stdev"]:
+      result[key] = np.full(numberOfGroups, np.nan)
+    if not np.any(nonEmpty):
+      return result
+
+    # Sort values within each group, this gives min, max, and median
+    order = np.lexsort((values, groups))
+    sortedValues = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonEmpty]
+    result["min"][nonEmpty] = sortedValues[starts]
+    result["max"][nonEmpty] = sortedValues[starts + nonEmptyCounts - 1]
+    result["median"][nonEmpty] = slicer.util.histogramMedian(sortedValues[starts + nonEmptyCounts // 2],
+      binOrigin, binSpacing)
+
+    sums = np.bincount(groups, weights=values, minlength=numberOfGroups)
+    means = np.zeros(numberOfGroups)
+    means[nonEmpty] = sums[nonEmpty] / nonEmptyCounts
+    result["mean"][nonEmpty] = means[nonEmpty]
+
+    # Sample standard deviation (same as vtkImageAccumulate), computed from deviations from the mean
+    # to avoid loss of precision when summing squares of large values
+    squaredDeviationSums = np.bincount(groups, weights=(values - means[groups])**2, minlength=numberOfGroups)
+    stdevs = np.zeros(numberOfGroups)
+    multipleValues = counts > 1
+    stdevs[multipleValues] = np.sqrt(squaredDeviationSums[multipleValues] / (counts[multipleValues] - 1))
+    result["stdev"][nonEmpty] = stdevs[nonEmpty]
+    return result
+
   def getMeasurementInfo(self, key):
     """Get information (name, description, units, ...) about the measurement for the given key"""
 
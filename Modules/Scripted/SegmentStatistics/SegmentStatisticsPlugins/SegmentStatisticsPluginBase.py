@@ -55,6 +55,39 @@ class SegmentStatisticsPluginBase(object):
     """
     pass
 
+  def computeStatisticsForSegments(self, segmentIDs):
+    """Compute measurements for requested keys on all given segments and return
+    as dictionary mapping segment IDs to dictionaries of measurement results.
+    Plugins that can evaluate many segments at once (e.g., in a single pass over the input
+    volume) should override this method. The default implementation falls back to calling
+    computeStatistics for each segment.
+    """
+    statistics = {}
+    for segmentID in segmentIDs:
+      statistics[segmentID] = self.computeStatistics(segmentID)
+    return statistics
+
+  def getStatisticsInputs(self, segmentIDChunks):
+    """Get all data needed for computing measurements of each chunk (list of segment IDs) of segmentIDChunks,
+    as a list containing one inputs object for each chunk. Inputs must be Python and numpy objects that
+    are independent from the scene (arrays must be copies or private data, not views of VTK data
+    of MRML nodes). Data that is the same for all chunks should only be computed once and shared.
+    This method is called on the main thread, therefore it should only do the work that requires the
+    scene or VTK and leave the rest to computeStatisticsFromInputs. Plugins that implement it together
+    with computeStatisticsFromInputs can compute statistics in worker threads. The default implementation
+    returns None, which means that the plugin computes statistics on the main thread by calling
+    computeStatisticsForSegments for each chunk.
+    """
+    return None
+
+  def computeStatisticsFromInputs(self, inputs):
+    """Compute measurements from one inputs object returned by getStatisticsInputs and return
+    as dictionary mapping segment IDs to dictionaries of measurement results.
+    This method may be called from a worker thread, therefore it must not access the scene,
+    MRML nodes, VTK objects, or the GUI.
+    """
+    raise NotImplementedError()
+
   def getMeasurementInfo(self, key):
     """Get information (name, description, units, ...) about the measurement for the given key.
     Utilize createMeasurementInfo() to create the dictionary containing the measurement information.